@@ -0,0 +1,161 @@
+"""Local stand-in for BVG, bahnhof.de and HAFAS, serving captured fixtures.
+
+Replays what scraper.py saw in capture mode (FIXTURE_CAPTURE_DIR) so the
+scrapers and parsers run with no network. Scripts are stripped from the
+captured HTML: the DOM is served exactly as it was when captured, and no
+client-side code re-renders it or calls out to the live sites.
+
+Capture (container /tmp is the host's /tmp):
+    1. add FIXTURE_CAPTURE_DIR=/tmp/scraper-fixtures to docker-compose.yml
+    2. docker compose up -d, open the transport view once (one scrape)
+    3. cp -r /tmp/scraper-fixtures fixtures/<name>, remove the env var again
+
+Usage:
+    python fixture-server.py fixtures/sample --port 8891
+    python fixture-server.py fixtures/sample --latency 0.3   # simulate slow sites
+
+Then point the scraper at it:
+    BUS_URL=http://localhost:8891/bus SBAHN_URL=http://localhost:8891/sbahn \\
+    HAFAS_ENDPOINT=http://localhost:8891/hafas ALLOW_DOMAINS=localhost python scraper.py
+
+Endpoints:
+    GET  /bus      - bus-frame.html (the BVG departure iframe's DOM)
+    GET  /sbahn    - sbahn.html (bahnhof.de departure page DOM)
+    POST /hafas    - one svcResL entry per StationBoard in svcReqL, from
+                     hafas-<stop_id>.json (so batched requests work too)
+    GET  /status   - request counts
+
+Fixture directory:
+    meta.json                 {file: captured_at ISO} (parsers replay at that time)
+    bus-frame.html, bus-rows.json
+    sbahn.html, sbahn-rows.json
+    hafas-<stop_id>.json      raw HAFAS response
+    expected.json             parser output golden file (replay-bench.py --update)
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_SCRIPT_TAG = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.IGNORECASE | re.DOTALL)
+_STOP_LID = re.compile(r"@L=(\d+)@")
+
+
+class FixtureSite:
+    """Captured pages + HAFAS responses for one fixture directory."""
+
+    def __init__(self, fixture_dir, latency=0.0):
+        self.dir = fixture_dir
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.pages = {}
+        for path, name in (("/bus", "bus-frame.html"), ("/sbahn", "sbahn.html")):
+            html = self._read(name)
+            if html is not None:
+                self.pages[path] = _SCRIPT_TAG.sub("", html).encode()
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.dir, name), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def hafas(self, body):
+        """Answer a HAFAS gate request from hafas-<stop>.json fixtures."""
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, {"err": "PARSE"}
+        results = []
+        for svc in request.get("svcReqL", []):
+            lid = svc.get("req", {}).get("stbLoc", {}).get("lid", "")
+            match = _STOP_LID.search(lid)
+            fixture = self._read(f"hafas-{match.group(1)}.json") if match else None
+            if fixture is None:
+                results.append({"meth": svc.get("meth"), "err": "LOCATION", "res": {}})
+                continue
+            results.append(json.loads(fixture)["svcResL"][0])
+        return 200, {"ver": "1.72", "lang": "de", "err": "OK", "svcResL": results}
+
+    def handle(self, method, path, body):
+        """Returns (status, content_type, bytes)."""
+        with self.lock:
+            self.requests[f"{method} {path}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if method == "GET" and path in self.pages:
+            return 200, "text/html; charset=utf-8", self.pages[path]
+        if method == "POST" and path == "/hafas":
+            status, payload = self.hafas(body)
+            return status, "application/json", json.dumps(payload).encode()
+        if method == "GET" and path == "/status":
+            with self.lock:
+                payload = {"fixtures": self.dir, "requests": dict(self.requests)}
+            return 200, "application/json", json.dumps(payload).encode()
+        return 404, "text/plain", b"not found"
+
+
+def make_handler(site):
+    """HTTP handler bound to one FixtureSite."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _dispatch(self, method):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+            status, content_type, data = site.handle(method, self.path.split("?")[0], body)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(site, port=0):
+    """Start a fixture server in a daemon thread. Returns the server (server_port = bound port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve captured scraper fixtures locally")
+    parser.add_argument("fixture_dir", help="Fixture directory (see fixtures/)")
+    parser.add_argument("--port", type=int, default=8891, help="Port to serve on (default: 8891)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+
+    site = FixtureSite(args.fixture_dir, args.latency)
+    print(f"Fixture server: {args.fixture_dir} on http://localhost:{args.port}")
+    print(f"  Pages: {', '.join(sorted(site.pages)) or 'none'} | HAFAS: POST /hafas")
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(site))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
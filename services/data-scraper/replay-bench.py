@@ -0,0 +1,212 @@
+"""Offline replay benchmark for the transport scraper's parsers.
+
+Runs scraper.py's parsers (and optionally the full Playwright scrape) on
+captured fixtures — no network, no live BVG/bahnhof.de/HAFAS. For each
+fixture directory it reports:
+
+    - regressions     parser output vs the fixture's expected.json
+    - parse speed     µs per call and rows/s for every parser
+    - end-to-end      (--e2e) launch + navigate + extract latency per
+                      source against fixture-server.py, batched HAFAS round trip
+
+Parsers replay at the capture time from meta.json, so "minutes" are
+reproducible. fixtures/sample is hand-written to keep the harness runnable
+out of the box; capture real pages with FIXTURE_CAPTURE_DIR (see
+fixture-server.py) and commit them next to it.
+
+Usage:
+    python replay-bench.py                       # all fixtures/*/
+    python replay-bench.py fixtures/sample -n 5000
+    python replay-bench.py --update              # (re)write expected.json
+    python replay-bench.py --e2e --runs 5        # needs Chromium (playwright install)
+    python replay-bench.py --json > results.json
+
+Needs requirements.txt installed (scraper.py imports playwright); the
+browser itself is only needed for --e2e. Exit code 1 if any parser
+output differs from expected.json — run before deploying parser changes.
+"""
+
+import argparse
+import asyncio
+import glob
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Captures are Berlin local time (container TZ); departs_at epochs in
+# expected.json only match when replayed in the same zone
+os.environ["TZ"] = "Europe/Berlin"
+time.tzset()
+
+
+def _load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+scraper = _load("scraper", "scraper.py")
+fixture_server = _load("fixture_server", "fixture-server.py")
+
+
+def _read_json(fixture_dir, name):
+    try:
+        with open(os.path.join(fixture_dir, name), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def parser_cases(fixture_dir):
+    """[(case name, callable returning departures, input row count)] for one fixture."""
+    meta = _read_json(fixture_dir, "meta.json") or {}
+
+    def captured_at(name):
+        return datetime.fromisoformat(meta[name]) if name in meta else datetime.now()
+
+    cases = []
+    bus_rows = _read_json(fixture_dir, "bus-rows.json")
+    if bus_rows is not None:
+        now = captured_at("bus-rows.json")
+        cases.append(("bvg_rows", lambda: scraper.parse_bvg_rows(bus_rows, now), len(bus_rows)))
+
+    sbahn = _read_json(fixture_dir, "sbahn-rows.json")
+    if sbahn is not None:
+        now = captured_at("sbahn-rows.json")
+        cases.append(("sbahn_rows", lambda: scraper.parse_sbahn_rows(sbahn["rows"], now), len(sbahn["rows"])))
+        cases.append(("sbahn_text", lambda: scraper.parse_sbahn_text(sbahn["body"], now), 1))
+
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "hafas-*.json"))):
+        name = os.path.basename(path)
+        res = _read_json(fixture_dir, name)["svcResL"][0]["res"]
+        now = captured_at(name)
+        case = name[:-len(".json")].replace("-", "_")
+        cases.append((case, lambda res=res, now=now: scraper.parse_hafas_board(res, now), len(res.get("jnyL", []))))
+    return cases
+
+
+def bench_parsers(fixture_dir, iterations, update):
+    cases = parser_cases(fixture_dir)
+    expected_path = os.path.join(fixture_dir, "expected.json")
+    expected = _read_json(fixture_dir, "expected.json")
+    outputs, timings, failures = {}, {}, []
+
+    for name, run, rows in cases:
+        outputs[name] = run()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            run()
+        per_call = (time.perf_counter() - start) / iterations
+        timings[name] = {
+            "us_per_call": round(per_call * 1e6, 1),
+            "rows_per_s": round(rows / per_call) if per_call else None,
+            "departures": len(outputs[name]),
+        }
+        if expected is not None and not update:
+            if name not in expected:
+                failures.append(f"{name}: not in expected.json (run --update)")
+            elif expected[name] != outputs[name]:
+                failures.append(f"{name}: output differs from expected.json")
+
+    if update:
+        with open(expected_path, "w") as f:
+            json.dump(outputs, f, ensure_ascii=False, indent=1)
+    return {
+        "golden": "updated" if update else ("missing" if expected is None else "checked"),
+        "parsers": timings,
+        "failures": failures,
+    }
+
+
+async def _bench_e2e(server_url, runs):
+    """Full scrape per source against the fixture server (cold browser each run)."""
+    scraper.BUS_URL = f"{server_url}/bus"
+    scraper.SBAHN_URL = f"{server_url}/sbahn"
+    scraper.HAFAS_ENDPOINT = f"{server_url}/hafas"
+    scraper.ALLOW_DOMAINS = ["127.0.0.1"]
+
+    results = {}
+    for key in scraper.SOURCES:
+        latencies, counts = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            departures = await scraper._scrape_source(key)
+            latencies.append(time.perf_counter() - start)
+            counts.append(len(departures))
+        results[key] = {
+            "p50_s": round(statistics.median(latencies), 2),
+            "max_s": round(max(latencies), 2),
+            "departures": counts[-1],
+            "cpu_s_last": (scraper._request_stats["last_scrape"] or {}).get("cpu_seconds"),
+        }
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await asyncio.to_thread(scraper.fetch_hafas_boards, [scraper.HAFAS_BUS_STOP_ID, scraper.HAFAS_SBAHN_STOP_ID])
+        latencies.append(time.perf_counter() - start)
+    results["hafas"] = {"p50_s": round(statistics.median(latencies), 3), "max_s": round(max(latencies), 3)}
+    return results
+
+
+def bench_e2e(fixture_dir, runs, latency):
+    site = fixture_server.FixtureSite(fixture_dir, latency)
+    server = fixture_server.start_server(site)
+    try:
+        return asyncio.run(_bench_e2e(f"http://127.0.0.1:{server.server_port}", runs))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def print_report(report):
+    status = "PASS" if not report["failures"] else "FAIL"
+    print(f"[{status}] {report['fixture']} (golden: {report['golden']})")
+    for name, t in report["parsers"].items():
+        print(f"    {name:<22} {t['us_per_call']:>8} µs/call  {t['rows_per_s'] or 0:>9} rows/s  "
+              f"→ {t['departures']} departures")
+    for key, e in (report.get("e2e") or {}).items():
+        extra = f" | {e['departures']} departures, Chromium CPU {e['cpu_s_last']}s" if "departures" in e else ""
+        print(f"    e2e {key:<18} p50 {e['p50_s']}s, max {e['max_s']}s{extra}")
+    for failure in report["failures"]:
+        print(f"    ✗ {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scraper fixtures offline and benchmark the parsers")
+    parser.add_argument("fixtures", nargs="*", help="Fixture directories (default: fixtures/*/)")
+    parser.add_argument("-n", "--iterations", type=int, default=2000, help="Parser calls per case")
+    parser.add_argument("--update", action="store_true", help="Write current parser output as expected.json")
+    parser.add_argument("--e2e", action="store_true", help="Also run full Playwright scrapes (needs Chromium)")
+    parser.add_argument("--runs", type=int, default=3, help="End-to-end runs per source")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixture server latency per response (s)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    scraper.log = lambda msg: None  # keep the report readable
+    paths = args.fixtures or sorted(glob.glob(os.path.join(HERE, "fixtures", "*", "")))
+    reports = []
+    for path in paths:
+        report = {"fixture": os.path.basename(os.path.normpath(path))}
+        report.update(bench_parsers(path, args.iterations, args.update))
+        if args.e2e:
+            report["e2e"] = bench_e2e(path, args.runs, args.latency)
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+    return 1 if any(r["failures"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,29 +7,48 @@ Architecture: Launch → Scrape → Kill
 - Browser is killed immediately after scraping completes
 - Zero CPU usage between requests
 - Activity timestamp written for cleanup service monitoring
+- Opt-in PREFETCH_SCHEDULE refreshes the cache inside set windows (commute
+  hours) so the first dashboard open is served from a warm cache
+
+Concurrency: threaded HTTP front end + one dedicated scraper event loop
+- Each HTTP request gets its own thread (health/cache never wait on a scrape)
+- All Playwright work runs on a single asyncio loop in a background thread
 
 Why this architecture?
 - Previous "warm browser" approach had a bug: 5-min timeout never triggered
   because dashboard requests every 60s reset the timer.
 - Result: Browser stayed warm forever → 83% CPU → 59°C → loud fan
 - New approach: No warm browser. Launch, scrape, kill. ~40-50% avg CPU.
+- Opt-in BROWSER_MODE=warm keeps one browser, but under hard ceilings that
+  requests cannot extend: lifetime cap, max scrapes, idle kill counted from
+  the last scrape, and a CPU watchdog on the Chromium process tree.
 
 Why web scraping instead of REST APIs?
 - REST APIs (v6.bvg.transport.rest, v6.vbb.transport.rest) are unreliable
 - Frequent outages and inconsistent data availability
 - User manually verified unreliability (Jan 2026)
 - This is a non-negotiable requirement
+- Opt-in SOURCE_STRATEGY=hafas-first uses the HAFAS API for departures and
+  keeps the (slower, scheduled) scrape only for strike/cancellation text
 """
 
 import asyncio
+import collections
+import contextlib
+import contextvars
+import copy
+import gzip
+import hashlib
+import http.client
 import json
 import os
 import re
 import signal
+import threading
 import time
-import urllib.request
+import urllib.parse
 from datetime import datetime, timedelta
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 from playwright.async_api import async_playwright
 
@@ -39,9 +58,13 @@ PORT = int(os.environ.get("PORT", 8890))
 # CONFIGURATION
 # ─────────────────────────────────────────────────────────────────
 
-# URLs to scrape
-BUS_URL = "https://www.bvg.de/de/verbindungen/verbindungssuche#!P|SQ!qrCode|bvg&100050&BVG&"
-SBAHN_URL = "https://www.bahnhof.de/en/berlin-zehlendorf/departure?transport=s-bahn"
+# URLs to scrape (overridable to point at fixture-server.py for offline replay)
+BUS_URL = os.environ.get(
+    "BUS_URL", "https://www.bvg.de/de/verbindungen/verbindungssuche#!P|SQ!qrCode|bvg&100050&BVG&"
+)
+SBAHN_URL = os.environ.get(
+    "SBAHN_URL", "https://www.bahnhof.de/en/berlin-zehlendorf/departure?transport=s-bahn"
+)
 
 # Fallback links (shown when scraping fails)
 FALLBACK = {
@@ -87,10 +110,15 @@ CANCELLATION_PATTERN = re.compile(
 #   │  Used as FALLBACK when Playwright scraping fails (e.g. 403). │
 #   │  Scraper remains primary because it matches the real website │
 #   │  experience and catches visual-only info (strike banners).   │
+#   │  SOURCE_STRATEGY=hafas-first flips this: HAFAS primary,      │
+#   │  scrape only enriches cancellations (see ENRICHMENT below).  │
 #   └───────────────────────────────────────────────────────────────┘
-HAFAS_ENDPOINT = "https://bvg.hafas.cloud/apps/gate"
+HAFAS_ENDPOINT = os.environ.get("HAFAS_ENDPOINT", "https://bvg.hafas.cloud/apps/gate")
 HAFAS_BUS_STOP_ID = "900049354"       # Laehrstr. (Berlin)
 HAFAS_SBAHN_STOP_ID = "900049201"     # S Zehlendorf (Berlin)
+HAFAS_TIMEOUT = 15           # seconds per HAFAS call
+HAFAS_POOL_SIZE = 2          # idle keep-alive connections kept
+HAFAS_BATCH_REUSE = 10       # seconds a finished batch also serves the other source
 HAFAS_REQUEST_BASE = {
     "client": {"type": "WEB", "id": "VBB", "v": 10002, "name": "webapp"},
     "ext": "BVG.1",
@@ -99,34 +127,185 @@ HAFAS_REQUEST_BASE = {
     "lang": "de"
 }
 
-# Cache results for 60 seconds (matches dashboard refresh interval)
-CACHE_TTL = 60
+# Readiness waits: poll for the departure list instead of fixed sleeps
+BUS_READY_TIMEOUT = 15     # seconds after DOMContentLoaded for the BVG iframe list
+SBAHN_READY_TIMEOUT = 10   # seconds for bahnhof.de to render departure rows
+READY_POLL_INTERVAL = 0.25
+
+# Request interception for scrape contexts
+#
+#   ┌───────────────────────────────────────────────────────────────┐
+#   │  Departure text needs HTML, JS, CSS and the XHR data — not    │
+#   │  images, fonts, video, ads or telemetry. bahnhof.de telemetry │
+#   │  is what kept the network from ever going idle.               │
+#   │                                                               │
+#   │  request ──► resource type in BLOCK_RESOURCE_TYPES? → abort   │
+#   │          ──► host on BLOCK_DOMAINS (denylist)?       → abort   │
+#   │          ──► ALLOW_DOMAINS set and host not on it?   → abort   │
+#   │          ──► continue                                          │
+#   │                                                               │
+#   │  Domains match by suffix: "bvg.de" covers "www.bvg.de".       │
+#   │  ALLOW_DOMAINS="" disables the allowlist (denylist only).     │
+#   └───────────────────────────────────────────────────────────────┘
+def _env_list(name, default):
+    return [x.strip().lower() for x in os.environ.get(name, default).split(",") if x.strip()]
+
+
+BLOCK_RESOURCES = os.environ.get("BLOCK_RESOURCES", "1") == "1"
+BLOCK_RESOURCE_TYPES = set(_env_list("BLOCK_RESOURCE_TYPES", "image,media,font,ping"))
+BLOCK_DOMAINS = _env_list(
+    "BLOCK_DOMAINS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,googlesyndication.com,"
+    "adobedtm.com,omtrdc.net,demdex.net,etracker.com,etracker.de,hotjar.com,"
+    "facebook.net,facebook.com,criteo.com,criteo.net,bing.com,clarity.ms,newrelic.com,nr-data.net",
+)
+ALLOW_DOMAINS = _env_list("ALLOW_DOMAINS", "bvg.de,bahnhof.de,hafas.cloud,hafas.de,db.de")
+
+# Cache refresh interval. The cache holds absolute departure times and
+# "minutes" is recomputed on every read (project_departures), so a cached
+# board stays accurate between refreshes — the TTL only bounds how late
+# new delays/cancellations show up. Refreshes earlier if the board runs short.
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 180))
+
+# Departures shown per source; more are cached so the board stays full
+# as departures leave between refreshes
+DEPARTURES_SHOWN = 6
+DEPARTURES_CACHED = 12
+
+# Where departures come from:
+#   scrape-first: Playwright scrape, HAFAS API only when the scrape is empty
+#   hafas-first:  HAFAS on every refresh; the browser scrape runs at most every
+#                 ENRICH_INTERVAL in the background, only to flag cancellations
+SOURCE_STRATEGY = os.environ.get("SOURCE_STRATEGY", "scrape-first")
+ENRICH_INTERVAL = int(os.environ.get("ENRICH_INTERVAL", 600))
+ENRICH_MAX_AGE = 3 * ENRICH_INTERVAL
+
+# Past CACHE_TTL, cached data is still served (marked stale) while a background
+# refresh runs — up to this age. Older data is withheld and reported as an error.
+CACHE_MAX_STALE = int(os.environ.get("CACHE_MAX_STALE", 600))
+
+# Upper bound for an HTTP handler thread waiting on the scraper loop
+# (two parallel page loads at 30s goto timeout + HAFAS fallback)
+FETCH_TIMEOUT = 90
+
+# Circuit breakers per upstream (BVG, bahnhof.de, HAFAS): after
+# BREAKER_FAILURES failed/empty results in a row, or one 403/429, the
+# upstream is skipped for BREAKER_BASE_WINDOW, doubling per repeat trip
+# up to BREAKER_MAX_WINDOW. Refreshes go straight to the other source.
+BREAKER_FAILURES = 3
+BREAKER_BLOCK_STATUSES = {403, 429}
+BREAKER_BASE_WINDOW = int(os.environ.get("BREAKER_BASE_WINDOW", 300))
+BREAKER_MAX_WINDOW = int(os.environ.get("BREAKER_MAX_WINDOW", 3600))
 
 # Activity tracking for cleanup service
 ACTIVITY_FILE = "/tmp/scraper-last-activity"
 
+# Prefetch: refresh the cache before anyone asks, only inside these windows
+# (local time, TZ). "mon-fri 07:00-09:00; sat,sun 09:00-10:30". Empty = off.
+# Next window goes to PREFETCH_FILE ("start end" epoch) so scraper-cleanup.sh
+# can start the stopped container for it.
+PREFETCH_SCHEDULE = os.environ.get("PREFETCH_SCHEDULE", "")
+PREFETCH_INTERVAL = int(os.environ.get("PREFETCH_INTERVAL", 60))  # min s between refreshes per source
+PREFETCH_LEAD = 10  # s before an entry turns stale that the refresh starts
+PREFETCH_FILE = "/tmp/scraper-prefetch-window"
+
+# Capture mode: save raw scraper/API input here (latest scrape wins) for
+# offline replay with fixture-server.py / replay-bench.py. Empty = off.
+FIXTURE_CAPTURE_DIR = os.environ.get("FIXTURE_CAPTURE_DIR", "")
+
 # ─────────────────────────────────────────────────────────────────
 # BROWSER STATE (Launch → Scrape → Kill)
 # ─────────────────────────────────────────────────────────────────
 
+# cold: kill after every scrape (default)
+# warm: reuse one browser, killed by whichever ceiling trips first ↓
+BROWSER_MODE = os.environ.get("BROWSER_MODE", "cold")
+BROWSER_MAX_LIFETIME = int(os.environ.get("BROWSER_MAX_LIFETIME", 600))  # s since launch
+BROWSER_MAX_SCRAPES = int(os.environ.get("BROWSER_MAX_SCRAPES", 20))  # sessions per browser
+BROWSER_IDLE_TIMEOUT = int(os.environ.get("BROWSER_IDLE_TIMEOUT", 120))  # s since last scrape ended
+BROWSER_IDLE_CPU_LIMIT = float(os.environ.get("BROWSER_IDLE_CPU_LIMIT", 0.10))  # cores, while idle
+BROWSER_WATCHDOG_INTERVAL = 10  # s between watchdog samples
+
+# Per-scrape resource profiles (/api/profile, percentiles on /api/health)
+PROFILE_HISTORY = int(os.environ.get("PROFILE_HISTORY", 200))  # scrapes kept
+PROFILE_SAMPLE_INTERVAL = 0.5  # s between Chromium RSS samples during a scrape
+
 _playwright = None
 _browser = None
 _browser_lock = asyncio.Lock()
 _event_loop = None
+_event_loop_lock = threading.Lock()
+_inflight_refresh = {}  # {source: Task} running refresh, shared by concurrent callers
+_browser_users = 0  # Refreshes currently holding the browser (see browser_session)
+_browser_launched_at = None  # monotonic launch time of the current browser
+_browser_scrapes = 0  # Sessions served by the current browser
+_browser_last_used = None  # monotonic end of the last session (NOT touched by cache hits)
+_browser_watchdog_task = None
+_inflight_enrich = {}  # {source: Task} background enrichment scrape
+_scrape_profiles = collections.deque(maxlen=PROFILE_HISTORY)  # finished scrape profiles, newest last
+_profile_lock = threading.Lock()  # handler threads read the ring buffer
+_current_profile = contextvars.ContextVar("scrape_profile", default=None)  # set by _scrape_source
+_prefetch_attempts = {}  # {source: time.time() of the last prefetch refresh start}
+_activity_hold_until = None  # Future stamp written for a prefetch window (see hold_activity_until)
+
+# Cancellation flags from the last enrichment scrape (hafas-first strategy)
+_enrichment = {
+    "bus": {"cancelled": set(), "timestamp": 0.0},
+    "sbahn": {"cancelled": set(), "timestamp": 0.0},
+}
+
+# Circuit breaker per upstream (see breaker_allows / breaker_record), loop thread only
+_breakers = {
+    name: {"state": "closed", "failures": 0, "trips": 0, "open_until": 0.0,
+           "blocked": 0, "empty": 0, "errors": 0, "last_error": None}
+    for name in ("BVG", "bahnhof.de", "HAFAS")
+}
 
-# Cache for scraped data
+# Cache for scraped data, one entry per source (timestamp = last good refresh)
 _cache = {
-    "data": None,
-    "timestamp": None
+    "bus": {"departures": None, "source": None, "timestamp": None},
+    "sbahn": {"departures": None, "source": None, "timestamp": None},
 }
 
 # Request tracking (helps diagnose IP blocks from excessive requests)
 _request_stats = {
     "total": 0,          # Total /api/transport requests
-    "scrapes": 0,        # Actual scrapes (cache misses)
+    "scrapes": 0,        # Actual browser scrapes (per source)
+    "coalesced": 0,      # Cache misses that joined an in-flight scrape
+    "browser_launches": 0, # Chromium launches (should equal scrapes)
     "hafas_fallbacks": 0, # Times HAFAS fallback was used
+    "hafas_primary": 0,   # HAFAS refreshes in hafas-first strategy
+    "hafas_requests": 0,  # HTTP calls to HAFAS (one per batch)
+    "hafas_connections": 0, # New HAFAS connections (rest were kept-alive reuses)
+    "hafas_batch_shared": 0, # Board lookups answered by another source's batch
+    "enrichment_scrapes": 0, # Background cancellation scrapes (hafas-first)
+    "breaker_skips": 0,   # Scrapes/HAFAS calls skipped by an open circuit breaker
+    "prefetch_refreshes": 0, # Refreshes started by the prefetch schedule
+    "prefetch_window": None, # Current/next window {start, end, active}
     "started": None,      # Process start time (ISO)
+    "requests_blocked": 0, # Browser requests aborted by interception
+    "requests_allowed": 0, # Browser requests let through
+    "bytes_received": 0,   # Response bytes of allowed requests (Content-Length)
+    "last_scrape_network": {}, # {source: {blocked, allowed, bytes}} of the latest scrape
+    "browser_mode": BROWSER_MODE,
+    "serializations": 0,  # /api/transport bodies built (cache changes, not requests)
+    "not_modified": 0,    # 304 responses to If-None-Match
+    "scrape_seconds_total": 0.0,     # Wall time of browser sessions
+    "scrape_cpu_seconds_total": 0.0, # Chromium CPU during browser sessions
+    "last_scrape": None,             # {seconds, cpu_seconds, warm} of the latest session
+    "browser_kills": {"scrape_done": 0, "lifetime": 0, "max_scrapes": 0, "idle": 0, "cpu": 0},
 }
+_stats_lock = threading.Lock()  # Handler threads increment counters concurrently
+
+# HAFAS client state (see fetch_hafas_boards / hafas_board)
+_hafas_pool = []  # idle keep-alive connections
+_hafas_pool_lock = threading.Lock()
+_hafas_batch = None  # Task of the latest batched StationBoard request
+_hafas_batch_at = 0.0
+
+# Serialized /api/transport response for the current cache state (see transport_representation)
+_response_cache = {"key": None, "etag": None, "body": None, "gzip": None}
+_response_lock = threading.Lock()
 
 
 def log(msg):
@@ -158,15 +337,22 @@ def update_activity():
     │                                                              │
     │  Fix: Compare file stamp against process start time.        │
     │  If stamp predates this process, it's stale → overwrite.    │
+    │                                                              │
+    │  PREFETCH HOLD: a prefetch window stamps its END time        │
+    │  (hold_activity_until). Requests inside the window leave it; │
+    │  the first request after it starts the normal countdown.     │
     └──────────────────────────────────────────────────────────────┘
     """
     if os.path.exists(ACTIVITY_FILE):
         try:
             with open(ACTIVITY_FILE, 'r') as f:
                 stamp = float(f.read().strip())
-            if stamp >= _process_start_time:
+            if stamp == _activity_hold_until and stamp <= time.time():
+                log("Prefetch window over, starting activity countdown")
+            elif stamp >= _process_start_time:
                 return  # Written by this session, don't reset countdown
-            log(f"Stale activity file detected (age: {_process_start_time - stamp:.0f}s), overwriting")
+            else:
+                log(f"Stale activity file detected (age: {_process_start_time - stamp:.0f}s), overwriting")
         except (ValueError, IOError):
             log("Corrupt activity file, overwriting")
     try:
@@ -176,22 +362,96 @@ def update_activity():
         log(f"Failed to write activity file: {e}")
 
 
+def hold_activity_until(until):
+    """Keep the cleanup service off until `until` (epoch) — one write per prefetch window.
+
+    scraper-cleanup.sh sees a stamp in the future as "not idle", so the
+    container stays up through the window and stops 30 min after
+    it, like after a dashboard visit. Never shortens an existing later stamp.
+    """
+    global _activity_hold_until
+    try:
+        with open(ACTIVITY_FILE, 'r') as f:
+            if float(f.read().strip()) >= until:
+                return
+    except (ValueError, IOError):
+        pass
+    try:
+        with open(ACTIVITY_FILE, 'w') as f:
+            f.write(str(until))
+        _activity_hold_until = until
+    except Exception as e:
+        log(f"Failed to write activity file: {e}")
+
+
+def capture_fixture(name, content):
+    """Capture mode: write one fixture file + its capture time to meta.json.
+
+    content: str (HTML), bytes (raw API response) or JSON-serializable data.
+    Parsers replay against meta.json's timestamp, so minutes are reproducible.
+    """
+    if not FIXTURE_CAPTURE_DIR:
+        return
+    try:
+        os.makedirs(FIXTURE_CAPTURE_DIR, exist_ok=True)
+        if isinstance(content, (dict, list)):
+            content = json.dumps(content, ensure_ascii=False, indent=1)
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(os.path.join(FIXTURE_CAPTURE_DIR, name), mode) as f:
+            f.write(content)
+        meta_path = os.path.join(FIXTURE_CAPTURE_DIR, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        meta[name] = datetime.now().isoformat()
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=1, sort_keys=True)
+        log(f"Captured fixture {name}")
+    except Exception as e:
+        log(f"Fixture capture failed for {name}: {e}")
+
+
 def _get_event_loop():
-    """Get or create event loop for async operations."""
+    """Get the scraper event loop, starting its thread on first use.
+
+    ┌──────────────────────────────────────────────────────────────┐
+    │  ONE LOOP, MANY HTTP THREADS                                 │
+    │                                                              │
+    │  OLD: HTTPServer handled one request at a time and ran the   │
+    │       scrape inline (run_until_complete, 10-40s) → health    │
+    │       checks and other tabs queued behind the scrape.        │
+    │                                                              │
+    │  NEW: ThreadingHTTPServer → thread per request               │
+    │       Playwright lives on ONE loop in a background thread    │
+    │       Handlers submit coroutines via run_coroutine_threadsafe│
+    │       and block only their own thread.                       │
+    │                                                              │
+    │   GET /api/health ──► thread ──► reply (ms)                  │
+    │   GET /api/transport ► thread ──► cache hit → reply (ms)     │
+    │                           └──► loop thread ──► scrape       │
+    └──────────────────────────────────────────────────────────────┘
+    """
     global _event_loop
-    if _event_loop is None or _event_loop.is_closed():
-        _event_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(_event_loop)
-    return _event_loop
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop.is_closed():
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_event_loop.run_forever, name="scraper-loop", daemon=True
+            ).start()
+        return _event_loop
 
 
 async def get_browser():
     """Launch browser if not already running."""
-    global _playwright, _browser
+    global _playwright, _browser, _browser_launched_at, _browser_scrapes, _browser_watchdog_task
 
     async with _browser_lock:
         if _browser is None:
-            log("Launching browser...")
+            log(f"Launching browser ({BROWSER_MODE})...")
+            _request_stats["browser_launches"] += 1
+            launch_start = time.monotonic()
             _playwright = await async_playwright().start()
             _browser = await _playwright.chromium.launch(
                 headless=True,
@@ -205,15 +465,24 @@ async def get_browser():
                 ]
             )
             log("Browser ready")
+            _browser_launched_at = time.monotonic()
+            profile_note(launch_s=round(_browser_launched_at - launch_start, 2))
+            _browser_scrapes = 0
+            if BROWSER_MODE == "warm" and (_browser_watchdog_task is None or _browser_watchdog_task.done()):
+                _browser_watchdog_task = asyncio.ensure_future(_browser_watchdog())
 
         return _browser
 
 
-async def shutdown_browser_now():
-    """Kill browser immediately after scrape."""
+async def shutdown_browser_now(reason="scrape_done"):
+    """Kill browser immediately after scrape (or when a warm-mode ceiling trips)."""
     global _playwright, _browser
 
     async with _browser_lock:
+        if _browser:
+            _request_stats["browser_kills"][reason] += 1
+            if reason != "scrape_done":
+                log(f"Killing warm browser: {reason}")
         if _browser:
             try:
                 await _browser.close()
@@ -231,166 +500,516 @@ async def shutdown_browser_now():
             _playwright = None
 
 
-# ─────────────────────────────────────────────────────────────────
-# BVG BUS SCRAPING
-# ─────────────────────────────────────────────────────────────────
+def _host_matches(host, domains):
+    return any(host == d or host.endswith("." + d) for d in domains)
 
-def is_wrong_direction(direction):
-    """Filter out buses going the wrong direction."""
-    d_lower = direction.lower()
-    return any(x in d_lower for x in WRONG_DIRECTIONS)
 
+def should_block_request(url, resource_type):
+    """Decide whether a browser request is aborted (see BLOCK_* config)."""
+    if resource_type in BLOCK_RESOURCE_TYPES:
+        return True
+    host = (urllib.parse.urlsplit(url).hostname or "").lower()
+    if not host:
+        return False  # data:/blob: URLs — nothing goes over the network
+    if _host_matches(host, BLOCK_DOMAINS):
+        return True
+    return bool(ALLOW_DOMAINS) and not _host_matches(host, ALLOW_DOMAINS)
 
-async def scrape_bvg_departures():
-    """Scrape bus departures from BVG website."""
-    departures = []
-    browser = await get_browser()
 
+async def new_scrape_context():
+    """Browser context with request interception; returns (context, network counters)."""
+    browser = await get_browser()
     context = await browser.new_context(
         viewport={'width': 1280, 'height': 800},
         user_agent='Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
     )
+    network = {"blocked": 0, "allowed": 0, "bytes": 0}
+    if not BLOCK_RESOURCES:
+        return context, network
 
-    try:
-        page = await context.new_page()
+    async def route_request(route):
+        request = route.request
+        try:
+            if should_block_request(request.url, request.resource_type):
+                network["blocked"] += 1
+                await route.abort()
+            else:
+                network["allowed"] += 1
+                await route.continue_()
+        except Exception:
+            pass  # page navigated/closed while routing — nothing to do
 
-        log(f"[BUS] Navigating to BVG...")
-        await page.goto(BUS_URL, wait_until='domcontentloaded', timeout=30000)
+    def count_response(response):
+        try:
+            network["bytes"] += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    await context.route("**/*", route_request)
+    context.on("response", count_response)
+    return context, network
+
+
+def record_network_stats(source, network):
+    """Fold one scrape's interception counters into _request_stats."""
+    _request_stats["requests_blocked"] += network["blocked"]
+    _request_stats["requests_allowed"] += network["allowed"]
+    _request_stats["bytes_received"] += network["bytes"]
+    _request_stats["last_scrape_network"][source] = dict(network)
+    profile_note(bytes=network["bytes"], requests=network["allowed"], blocked=network["blocked"])
+    log(f"{SOURCES[source]['tag']} Network: {network['allowed']} requests allowed "
+        f"({network['bytes'] / 1024:.0f} KB), {network['blocked']} blocked")
+
+
+class PhaseTimer:
+    """Wall-clock time per scrape phase, logged as one line per scrape."""
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.phases = {}
+        self._start = self._last = time.monotonic()
+
+    def mark(self, phase):
+        """Close the phase that ended now (time since the previous mark)."""
+        now = time.monotonic()
+        self.phases[phase] = round(now - self._last, 2)
+        self._last = now
+
+    def log(self):
+        total = time.monotonic() - self._start
+        parts = [f"{phase} {secs:.2f}s" for phase, secs in self.phases.items()]
+        parts.append(f"total {total:.2f}s")
+        log(f"{self.tag} Timing: " + " | ".join(parts))
+        profile_note(phases=dict(self.phases), page_s=round(total, 2))
 
-        # Wait for page to fully load (BVG uses heavy JS and iframes)
-        await page.wait_for_timeout(5000)
 
-        # Dismiss cookie popup if present
+async def wait_until_ready(page, timer, tag, consent_selector, probe, timeout):
+    """Poll until probe(page) is truthy, clicking the consent button if it appears.
+
+    ┌──────────────────────────────────────────────────────────────┐
+    │  READINESS WAIT (replaces fixed wait_for_timeout sleeps)     │
+    │                                                              │
+    │  OLD: BVG 5s + 1s + up to 3×3s, bahnhof.de 3s + 0.5s —       │
+    │       paid in full even when the list rendered after 800ms   │
+    │                                                              │
+    │  NEW: every READY_POLL_INTERVAL:                             │
+    │         consent button visible? → click (once), wait hidden  │
+    │         probe(page) → departures rendered? → return now      │
+    │       until `timeout` seconds → None                         │
+    └──────────────────────────────────────────────────────────────┘
+    """
+    deadline = time.monotonic() + timeout
+    consent = page.locator(consent_selector).first
+    consent_done = False
+    while True:
+        if not consent_done:
+            try:
+                if await consent.is_visible():
+                    await consent.click(timeout=2000)
+                    await consent.wait_for(state="hidden", timeout=2000)
+                    consent_done = True
+                    timer.mark("consent")
+            except Exception as e:
+                consent_done = True  # don't retry a broken popup every poll
+                log(f"{tag} Consent click failed: {e}")
         try:
-            popup_btn = page.locator('button:has-text("Alles klar")')
-            if await popup_btn.count() > 0:
-                await popup_btn.click()
-                await page.wait_for_timeout(1000)
+            result = await probe(page)
         except Exception:
-            pass
+            result = None  # page still navigating — try again next poll
+        if result or time.monotonic() >= deadline:
+            return result
+        await asyncio.sleep(READY_POLL_INTERVAL)
 
-        # Find the iframe with departure data (retry up to 3 times)
-        frame = None
-        for attempt in range(3):
-            for f in page.frames:
-                try:
-                    tabpanel = f.locator('[role="tabpanel"]')
-                    if await tabpanel.count() > 0:
-                        frame = f
-                        break
-                except Exception:
-                    continue
-            if frame:
-                break
-            log(f"[BUS] Waiting for iframe (attempt {attempt + 1}/3)...")
-            await page.wait_for_timeout(3000)
 
-        if not frame:
-            log("[BUS] ERROR: Could not find departure frame after retries")
-            return []
+# ─────────────────────────────────────────────────────────────────
+# CHROMIUM PROCESS ACCOUNTING (/proc)
+# ─────────────────────────────────────────────────────────────────
+#
+#   python (PID 1) ─► playwright driver (node) ─► chromium ─► renderers…
+#
+#   CPU per process = utime + stime + cutime + cstime (/proc/<pid>/stat).
+#   c*time holds reaped children, so renderers that exited during a
+#   scrape still count (via the chromium parent) without double counting.
 
-        # Get all list items within the tabpanel
-        items = await frame.locator('[role="tabpanel"] li').all()
-        now = datetime.now()
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CHROMIUM_COMM = re.compile(r"chrom|headless_shell", re.IGNORECASE)
 
-        for item in items[:20]:
-            try:
-                button = item.locator('button')
-                if not await button.count():
-                    continue
 
-                button_text = await button.inner_text()
+def _proc_table():
+    """{pid: (ppid, comm, cpu_seconds, rss_bytes)} for all readable processes."""
+    table = {}
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return table
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue  # exited meanwhile
+        # comm may contain spaces/parens: split after the LAST ')'
+        comm = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()
+        ticks = sum(int(x) for x in fields[11:15])  # utime stime cutime cstime
+        table[pid] = (int(fields[1]), comm, ticks / _CLK_TCK, int(fields[21]) * _PAGE_SIZE)
+    return table
+
+
+def chromium_processes(table=None):
+    """Chromium processes descended from this process: {pid: (ppid, comm, cpu_s, rss)}."""
+    table = table if table is not None else _proc_table()
+    children = {}
+    for pid, info in table.items():
+        children.setdefault(info[0], []).append(pid)
+    found, stack = {}, list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        if _CHROMIUM_COMM.search(table[pid][1]):
+            found[pid] = table[pid]
+        stack.extend(children.get(pid, []))
+    return found
+
+
+def chromium_cpu_seconds():
+    """Total CPU seconds used by the live Chromium tree (0.0 if none / no /proc)."""
+    return sum(info[2] for info in chromium_processes().values())
+
+
+async def _browser_watchdog():
+    """Warm mode: enforce lifetime, idle and CPU ceilings while a browser lives.
 
-                time_el = item.locator('time')
-                if not await time_el.count():
-                    continue
+    ┌──────────────────────────────────────────────────────────────┐
+    │  WHY NOT A PLAIN IDLE TIMER                                  │
+    │                                                              │
+    │  The old warm browser reset its idle timer on every request  │
+    │  → dashboard polling kept it alive forever (83% CPU, 59°C).  │
+    │                                                              │
+    │  Here nothing a request does can extend the browser's life:  │
+    │    lifetime  BROWSER_MAX_LIFETIME s since launch (hard cap)  │
+    │    scrapes   BROWSER_MAX_SCRAPES sessions (browser_session)  │
+    │    idle      BROWSER_IDLE_TIMEOUT s since the last SCRAPE    │
+    │              ended — cache hits never touch it               │
+    │    cpu       Chromium tree above BROWSER_IDLE_CPU_LIMIT      │
+    │              cores while no scrape is running (runaway tab)  │
+    └──────────────────────────────────────────────────────────────┘
+    """
+    last_cpu, last_at = chromium_cpu_seconds(), time.monotonic()
+    while _browser is not None:
+        await asyncio.sleep(BROWSER_WATCHDOG_INTERVAL)
+        if _browser is None:
+            break
+        now = time.monotonic()
+        cpu = chromium_cpu_seconds()
+        cores = max(0.0, cpu - last_cpu) / max(now - last_at, 1e-6)
+        last_cpu, last_at = cpu, now
+        if _browser_users:
+            continue  # never kill mid-scrape; browser_session applies the caps after it
+
+        if now - _browser_launched_at > BROWSER_MAX_LIFETIME:
+            await shutdown_browser_now("lifetime")
+        elif _browser_last_used is not None and now - _browser_last_used > BROWSER_IDLE_TIMEOUT:
+            await shutdown_browser_now("idle")
+        elif cores > BROWSER_IDLE_CPU_LIMIT:
+            log(f"Idle Chromium using {cores:.2f} cores (limit {BROWSER_IDLE_CPU_LIMIT})")
+            await shutdown_browser_now("cpu")
+
+
+@contextlib.asynccontextmanager
+async def browser_session():
+    """Hold the browser for one refresh and account its latency and CPU.
+
+    Cold mode: the last holder out kills it — bus and S-Bahn refresh
+    independently but share one Chromium while they overlap.
+    Warm mode: the browser stays, unless this session hit a ceiling.
+    CPU is the whole Chromium tree's, so overlapping sessions share it.
+    """
+    global _browser_users, _browser_scrapes, _browser_last_used
+    warm = _browser is not None
+    start, cpu_start = time.monotonic(), chromium_cpu_seconds()
+    profile = _current_profile.get()
+    sampler = asyncio.ensure_future(_sample_peak_rss(profile)) if profile is not None else None
+    _browser_users += 1
+    try:
+        yield
+    finally:
+        if sampler is not None:
+            sampler.cancel()
+            _note_peak_rss(profile)  # last sample while the browser still runs
+        _browser_users -= 1
+        _browser_scrapes += 1
+        _browser_last_used = time.monotonic()
+        seconds = _browser_last_used - start
+        cpu_seconds = max(0.0, chromium_cpu_seconds() - cpu_start)
+        _request_stats["scrape_seconds_total"] += seconds
+        _request_stats["scrape_cpu_seconds_total"] += cpu_seconds
+        _request_stats["last_scrape"] = {
+            "seconds": round(seconds, 2),
+            "cpu_seconds": round(cpu_seconds, 2),
+            "warm": warm,
+        }
+        profile_note(session_s=round(seconds, 2), cpu_s=round(cpu_seconds, 2), warm=warm)
+        log(f"Browser session: {seconds:.1f}s, Chromium CPU {cpu_seconds:.1f}s ({'warm' if warm else 'cold start'})")
 
-                time_text = await time_el.inner_text()
-
-                # Check full item text for strike/cancellation indicators
-                #
-                #   ┌─────────────────────────────────────────────────────────┐
-                #   │  BVG STRIKE DETECTION (Feb 2026)                        │
-                #   │                                                         │
-                #   │  During strikes, BVG shows per-departure messages:      │
-                #   │  "Die BVG wird heute bestreikt"                         │
-                #   │                                                         │
-                #   │  Without this check:                                    │
-                #   │    Dashboard shows ghost departures as catchable  ✗     │
-                #   │                                                         │
-                #   │  With this check:                                       │
-                #   │    Dashboard shows "✕ Trip cancelled" + red styling ✓   │
-                #   │                                                         │
-                #   │  Uses shared CANCELLATION_PATTERN constant               │
-                #   │  (same regex for Bus + S-Bahn scrapers)                │
-                #   └─────────────────────────────────────────────────────────┘
-                item_text = await item.inner_text()
-                cancelled = bool(CANCELLATION_PATTERN.search(item_text))
-
-                # Parse time (format: "21:26 Uhr" or "21:26 Uhr +3 Minuten")
-                time_match = re.search(r'(\d{2}):(\d{2})', time_text)
-                if not time_match:
-                    continue
+        if _browser_users == 0:
+            if BROWSER_MODE != "warm":
+                await shutdown_browser_now()
+            elif _browser_scrapes >= BROWSER_MAX_SCRAPES:
+                await shutdown_browser_now("max_scrapes")
+            elif _browser_launched_at and _browser_last_used - _browser_launched_at > BROWSER_MAX_LIFETIME:
+                await shutdown_browser_now("lifetime")
+
+
+# ─────────────────────────────────────────────────────────────────
+# SCRAPE PROFILES (ring buffer → /api/profile, /api/health)
+# ─────────────────────────────────────────────────────────────────
+#
+#   One record per browser scrape, filled in by whoever measures it:
+#
+#   _scrape_source ─► profile = {at, source}   (contextvar, per task)
+#     get_browser ........ launch_s      (None = browser already up)
+#     PhaseTimer.log ..... phases {navigate, frame|render, extract,
+#                          parse}, page_s
+#     record_network ..... bytes, requests, blocked
+#     browser_session .... session_s, cpu_s, warm, peak_rss_mb
+#   └─► total_s, outcome, departures → _scrape_profiles (last N)
+#
+#   cpu_s / peak_rss_mb are the whole Chromium tree's: when bus and
+#   S-Bahn overlap, both records include the shared browser. Fan/heat
+#   regressions (see module docstring) show up as cpu_s and peak RSS
+#   percentiles moving.
 
-                hour, minute = int(time_match.group(1)), int(time_match.group(2))
+def profile_note(**fields):
+    """Add fields to the running scrape's profile (no-op outside _scrape_source)."""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.update(fields)
 
-                # Parse delay
-                delay = 0
-                delay_match = re.search(r'\+(\d+)', time_text)
-                if delay_match:
-                    delay = int(delay_match.group(1))
 
-                # Parse line number
-                line_match = re.search(r'^"?(X?\d+|N\d+)"?', button_text.strip())
-                if not line_match:
-                    continue
-                line = line_match.group(1)
+def _note_peak_rss(profile):
+    """Raise profile["peak_rss_mb"] to the Chromium tree's current RSS if higher."""
+    rss = sum(info[3] for info in chromium_processes().values())
+    profile["peak_rss_mb"] = max(profile.get("peak_rss_mb", 0.0), round(rss / 2**20, 1))
 
-                # Parse direction
-                dir_match = re.search(r'in Richtung\s+(.+?)(?:\s+Informationen|$)', button_text)
-                direction = dir_match.group(1).strip() if dir_match else "Unknown"
 
-                # Calculate minutes until departure (include delay in comparison)
-                dep_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                actual_dep_time = dep_time + timedelta(minutes=delay)
+async def _sample_peak_rss(profile):
+    """Sample the Chromium tree's RSS into `profile` until cancelled."""
+    while True:
+        _note_peak_rss(profile)
+        await asyncio.sleep(PROFILE_SAMPLE_INTERVAL)
+
+
+def record_profile(profile, outcome, departures, seconds):
+    """Close a scrape's profile and push it into the ring buffer."""
+    profile.update(outcome=outcome, departures=departures, total_s=round(seconds, 2))
+    with _profile_lock:
+        _scrape_profiles.append(profile)
 
-                # Only wrap to next day if it's truly past (e.g., 23:00 when now is 01:00)
-                # Not if it's just a few minutes ago (likely already departed)
-                if actual_dep_time < now:
-                    # Skip buses that have already left (within last hour)
-                    if (now - actual_dep_time).total_seconds() < 3600:
-                        continue
-                    # Otherwise it's probably next day (late night schedule)
-                    dep_time = dep_time + timedelta(days=1)
-                    actual_dep_time = dep_time + timedelta(minutes=delay)
 
-                minutes = int((actual_dep_time - now).total_seconds() / 60)
+def _percentiles(values):
+    ordered = sorted(values)
 
-                if minutes < 0:
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "max": ordered[-1]}
+
+
+def profile_summary():
+    """p50/p95/max per source over the buffered scrapes (launch_s: cold starts only)."""
+    with _profile_lock:
+        profiles = list(_scrape_profiles)
+    summary = {}
+    for key in SOURCES:
+        mine = [p for p in profiles if p["source"] == key]
+        if not mine:
+            continue
+        outcomes, phases = collections.Counter(p["outcome"] for p in mine), {}
+        entry = {"scrapes": len(mine), "outcomes": dict(outcomes)}
+        for field in ("total_s", "launch_s", "page_s", "cpu_s", "peak_rss_mb", "bytes"):
+            values = [p[field] for p in mine if p.get(field) is not None]
+            if values:
+                entry[field] = _percentiles(values)
+        for p in mine:
+            for phase, secs in p.get("phases", {}).items():
+                phases.setdefault(phase, []).append(secs)
+        entry["phases"] = {phase: _percentiles(values) for phase, values in phases.items()}
+        summary[key] = entry
+    return summary
+
+
+# ─────────────────────────────────────────────────────────────────
+# BVG BUS SCRAPING
+# ─────────────────────────────────────────────────────────────────
+
+def is_wrong_direction(direction):
+    """Filter out buses going the wrong direction."""
+    d_lower = direction.lower()
+    return any(x in d_lower for x in WRONG_DIRECTIONS)
+
+
+# One in-page walk over the departure list (instead of ~3 CDP round trips per row)
+_BVG_ROWS_JS = """(limit) =>
+    Array.from(document.querySelectorAll('[role="tabpanel"] li')).slice(0, limit).map(li => {
+        const button = li.querySelector('button');
+        const time = li.querySelector('time');
+        return {
+            button: button ? button.innerText : null,
+            time: time ? time.innerText : null,
+            text: li.innerText,
+        };
+    })"""
+
+
+def parse_bvg_rows(rows, now):
+    """Parse BVG departure rows ({button, time, text} dicts from _BVG_ROWS_JS)."""
+    departures = []
+    for row in rows:
+        try:
+            button_text, time_text = row["button"], row["time"]
+            if button_text is None or time_text is None:
+                continue
+
+            # Check full item text for strike/cancellation indicators
+            #
+            #   ┌─────────────────────────────────────────────────────────┐
+            #   │  BVG STRIKE DETECTION (Feb 2026)                        │
+            #   │                                                         │
+            #   │  During strikes, BVG shows per-departure messages:      │
+            #   │  "Die BVG wird heute bestreikt"                         │
+            #   │                                                         │
+            #   │  Without this check:                                    │
+            #   │    Dashboard shows ghost departures as catchable  ✗     │
+            #   │                                                         │
+            #   │  With this check:                                       │
+            #   │    Dashboard shows "✕ Trip cancelled" + red styling ✓   │
+            #   │                                                         │
+            #   │  Uses shared CANCELLATION_PATTERN constant               │
+            #   │  (same regex for Bus + S-Bahn scrapers)                │
+            #   └─────────────────────────────────────────────────────────┘
+            item_text = row["text"]
+            cancelled = bool(CANCELLATION_PATTERN.search(item_text))
+
+            # Parse time (format: "21:26 Uhr" or "21:26 Uhr +3 Minuten")
+            time_match = re.search(r'(\d{2}):(\d{2})', time_text)
+            if not time_match:
+                continue
+
+            hour, minute = int(time_match.group(1)), int(time_match.group(2))
+
+            # Parse delay
+            delay = 0
+            delay_match = re.search(r'\+(\d+)', time_text)
+            if delay_match:
+                delay = int(delay_match.group(1))
+
+            # Parse line number
+            line_match = re.search(r'^"?(X?\d+|N\d+)"?', button_text.strip())
+            if not line_match:
+                continue
+            line = line_match.group(1)
+
+            # Parse direction
+            dir_match = re.search(r'in Richtung\s+(.+?)(?:\s+Informationen|$)', button_text)
+            direction = dir_match.group(1).strip() if dir_match else "Unknown"
+
+            # Calculate minutes until departure (include delay in comparison)
+            dep_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            actual_dep_time = dep_time + timedelta(minutes=delay)
+
+            # Only wrap to next day if it's truly past (e.g., 23:00 when now is 01:00)
+            # Not if it's just a few minutes ago (likely already departed)
+            if actual_dep_time < now:
+                # Skip buses that have already left (within last hour)
+                if (now - actual_dep_time).total_seconds() < 3600:
                     continue
+                # Otherwise it's probably next day (late night schedule)
+                dep_time = dep_time + timedelta(days=1)
+                actual_dep_time = dep_time + timedelta(minutes=delay)
 
-                departures.append({
-                    "line": line,
-                    "direction": direction,
-                    "minutes": minutes,
-                    "time": f"{hour:02d}:{minute:02d}",
-                    "delay": delay,
-                    "platform": None,
-                    "cancelled": cancelled
-                })
+            minutes = int((actual_dep_time - now).total_seconds() / 60)
 
-            except Exception as e:
+            if minutes < 0:
                 continue
 
+            departures.append({
+                "line": line,
+                "direction": direction,
+                "minutes": minutes,
+                "departs_at": actual_dep_time.timestamp(),
+                "time": f"{hour:02d}:{minute:02d}",
+                "delay": delay,
+                "platform": None,
+                "cancelled": cancelled
+            })
+
+        except Exception:
+            continue
+
+    return departures
+
+
+async def _find_departure_frame(page):
+    """Return the (i)frame whose tabpanel already lists departures, else None."""
+    for f in page.frames:
+        try:
+            if await f.locator('[role="tabpanel"] li').count() > 0:
+                return f
+        except Exception:
+            continue  # frame detached/navigating — check again next poll
+    return None
+
+
+async def scrape_bvg_departures():
+    """Scrape bus departures from BVG website."""
+    departures = []
+    timer = PhaseTimer("[BUS]")
+    context, network = await new_scrape_context()
+
+    try:
+        page = await context.new_page()
+
+        log(f"[BUS] Navigating to BVG...")
+        raise_if_blocked(await page.goto(BUS_URL, wait_until='domcontentloaded', timeout=30000), "BVG")
+        timer.mark("navigate")
+
+        # BVG uses heavy JS and iframes: wait until the departure list exists
+        # (dismissing the "Alles klar" cookie popup if it shows up meanwhile)
+        frame = await wait_until_ready(
+            page, timer, "[BUS]",
+            consent_selector='button:has-text("Alles klar")',
+            probe=_find_departure_frame,
+            timeout=BUS_READY_TIMEOUT,
+        )
+        timer.mark("frame")
+
+        if not frame:
+            log(f"[BUS] ERROR: Could not find departure frame within {BUS_READY_TIMEOUT}s")
+            return []
+
+        # Read all rows in ONE round trip, then parse in Python
+        rows = await frame.evaluate(_BVG_ROWS_JS, 20)
+        timer.mark("extract")
+        if FIXTURE_CAPTURE_DIR:
+            capture_fixture("bus-frame.html", await frame.content())
+            capture_fixture("bus-rows.json", rows)
+        departures = parse_bvg_rows(rows, datetime.now())
+        timer.mark("parse")
         log(f"[BUS] Scraped {len(departures)} departures")
 
+    except SourceBlocked:
+        raise  # _scrape_source trips the breaker
+
     except Exception as e:
         log(f"[BUS] Scraping error: {e}")
         import traceback
         traceback.print_exc()
 
     finally:
+        timer.log()
         await context.close()
+        record_network_stats("bus", network)
 
     return departures
 
@@ -402,7 +1021,7 @@ def filter_bus_departures(departures):
         if dep["line"] in ALLOWED_BUS_LINES:
             if not is_wrong_direction(dep["direction"]):
                 filtered.append(dep)
-    return filtered[:6]
+    return filtered[:DEPARTURES_CACHED]
 
 
 def filter_sbahn_departures(departures):
@@ -415,21 +1034,92 @@ def filter_sbahn_departures(departures):
         direction_lower = dep["direction"].lower()
         if not any(x in direction_lower for x in WRONG_SBAHN_DIRECTIONS):
             filtered.append(dep)
-    return filtered[:6]
+    return filtered[:DEPARTURES_CACHED]
 
 
 # ─────────────────────────────────────────────────────────────────
 # HAFAS API FALLBACK
 # ─────────────────────────────────────────────────────────────────
 
-def fetch_hafas_departures(stop_id, duration=60, max_results=15):
-    """Fetch departures from HAFAS API (no browser needed).
+#   ┌───────────────────────────────────────────────────────────────┐
+#   │  BATCHED + POOLED                                             │
+#   │                                                               │
+#   │  OLD: bus board ──► new TLS connection ──► urlopen (blocking) │
+#   │       S-Bahn board ► new TLS connection ──► urlopen (blocking)│
+#   │                                                               │
+#   │  NEW: one POST, svcReqL = [StationBoard bus, StationBoard S]  │
+#   │       over a kept-alive connection from _hafas_pool,          │
+#   │       run in a worker thread (asyncio.to_thread) so the       │
+#   │       scraper loop keeps serving while HAFAS answers.         │
+#   │       Bus + S-Bahn refreshes within HAFAS_BATCH_REUSE seconds │
+#   │       share one batch (hafas_board).                          │
+#   └───────────────────────────────────────────────────────────────┘
+
+class HafasError(Exception):
+    """HAFAS answered, but not with a usable board (err != OK)."""
 
-    Fallback for when Playwright scraping fails (e.g. BVG 403).
-    Returns list of departure dicts in same format as scraper output.
+
+def _hafas_connection():
+    """Idle pooled connection to HAFAS_ENDPOINT, or a new one. Returns (conn, reused)."""
+    with _hafas_pool_lock:
+        if _hafas_pool:
+            return _hafas_pool.pop(), True
+    url = urllib.parse.urlsplit(HAFAS_ENDPOINT)
+    conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    with _stats_lock:
+        _request_stats["hafas_connections"] += 1
+    return conn_class(url.hostname, url.port, timeout=HAFAS_TIMEOUT), False
+
+
+def _hafas_post(body):
+    """POST one gate request over a pooled keep-alive connection; returns parsed JSON.
+
+    A reused connection the server already closed fails on first use —
+    that (and only that) is retried once on a fresh connection.
     """
-    now = datetime.now()
+    url = urllib.parse.urlsplit(HAFAS_ENDPOINT)
+    path = url.path + (f"?{url.query}" if url.query else "")
+    headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+    for attempt in range(2):
+        conn, reused = _hafas_connection()
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            raw = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if reused and attempt == 0:
+                continue
+            raise OSError(f"HAFAS connection failed: {e}") from e
+        except Exception:
+            conn.close()
+            raise
+        with _stats_lock:
+            _request_stats["hafas_requests"] += 1
+        if resp.getheader("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        if resp.status != 200:
+            conn.close()
+            if resp.status in BREAKER_BLOCK_STATUSES:
+                raise SourceBlocked(f"HAFAS HTTP {resp.status}")
+            raise HafasError(f"HTTP {resp.status}")
+        if resp.will_close:
+            conn.close()
+        else:
+            with _hafas_pool_lock:
+                if len(_hafas_pool) < HAFAS_POOL_SIZE:
+                    _hafas_pool.append(conn)
+                else:
+                    conn.close()
+        return json.loads(raw)
+
+
+def fetch_hafas_boards(stop_ids, duration=60, max_results=15):
+    """Fetch several stops' departure boards in ONE HAFAS call (blocking).
 
+    Returns {stop_id: [departures] or HafasError} — one stop failing
+    does not discard the others.
+    """
     request_body = {
         **HAFAS_REQUEST_BASE,
         "svcReqL": [{
@@ -440,21 +1130,65 @@ def fetch_hafas_departures(stop_id, duration=60, max_results=15):
                 "dur": duration,
                 "maxJny": max_results,
             }
-        }]
+        } for stop_id in stop_ids]
     }
 
-    body_bytes = json.dumps(request_body).encode("utf-8")
-    req = urllib.request.Request(
-        HAFAS_ENDPOINT,
-        data=body_bytes,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
+    data = _hafas_post(json.dumps(request_body).encode("utf-8"))
+    results = data.get("svcResL", [])
+    if len(results) != len(stop_ids):
+        raise HafasError(f"expected {len(stop_ids)} boards, got {len(results)} ({data.get('err')})")
 
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        data = json.loads(resp.read())
+    now = datetime.now()
+    boards = {}
+    for stop_id, svc in zip(stop_ids, results):
+        if svc.get("err", "OK") != "OK":
+            boards[stop_id] = HafasError(f"stop {stop_id}: {svc.get('err')} {svc.get('errTxt', '')}".strip())
+            continue
+        capture_fixture(f"hafas-{stop_id}.json", {"svcResL": [svc]})
+        boards[stop_id] = parse_hafas_board(svc["res"], now)
+    return boards
 
-    res = data["svcResL"][0]["res"]
+
+def _record_hafas_batch(batch):
+    """Feed a finished batch into the HAFAS breaker (per-stop errors don't count)."""
+    if batch.cancelled():
+        return
+    error = batch.exception()
+    if error is None:
+        breaker_record("HAFAS", "ok")
+    else:
+        breaker_record("HAFAS", "blocked" if isinstance(error, SourceBlocked) else "error", error)
+
+
+async def hafas_board(stop_id):
+    """Departures for one stop; callers close together share one batched request.
+
+    Loop thread only. The batch covers every configured stop, so the bus
+    refresh's request also answers the S-Bahn refresh (and vice versa).
+    """
+    global _hafas_batch, _hafas_batch_at
+    batch = _hafas_batch
+    reusable = batch is not None and (
+        not batch.done()
+        or (batch.exception() is None and time.monotonic() - _hafas_batch_at < HAFAS_BATCH_REUSE)
+    )
+    if reusable:
+        _request_stats["hafas_batch_shared"] += 1
+    else:
+        if not breaker_allows("HAFAS"):
+            raise CircuitOpen(breaker_status("HAFAS"))
+        stop_ids = [src["hafas_stop"] for src in SOURCES.values()]
+        batch = _hafas_batch = asyncio.ensure_future(asyncio.to_thread(fetch_hafas_boards, stop_ids))
+        batch.add_done_callback(_record_hafas_batch)  # once per batch, not per caller
+        _hafas_batch_at = time.monotonic()
+    board = (await asyncio.shield(batch))[stop_id]
+    if isinstance(board, Exception):
+        raise board
+    return board
+
+
+def parse_hafas_board(res, now):
+    """Parse one StationBoard result (svcResL[i].res) into departure dicts."""
     prods = res.get("common", {}).get("prodL", [])
     departures = []
 
@@ -508,6 +1242,7 @@ def fetch_hafas_departures(stop_id, duration=60, max_results=15):
                 "line": line,
                 "direction": direction,
                 "minutes": minutes,
+                "departs_at": actual_dep_time.timestamp(),
                 "time": f"{hour:02d}:{minute:02d}",
                 "delay": delay,
                 "platform": None,
@@ -523,204 +1258,236 @@ def fetch_hafas_departures(stop_id, duration=60, max_results=15):
 # S-BAHN SCRAPING (bahnhof.de)
 # ─────────────────────────────────────────────────────────────────
 
-async def scrape_sbahn_departures():
-    """Scrape S-Bahn departures from bahnhof.de."""
-    departures = []
-    browser = await get_browser()
-
-    context = await browser.new_context(
-        viewport={'width': 1280, 'height': 800},
-        user_agent='Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
-    )
+SBAHN_ROW_SELECTOR = '[data-testid="departure-row"], .departure-row, [class*="Departure"]'
+SBAHN_ALT_ROW_SELECTOR = 'article, [role="listitem"]'
+_SBAHN_LINE_TEXT = re.compile(r'\bS\d+\b')
 
-    try:
-        page = await context.new_page()
 
-        log(f"[S-BAHN] Navigating to bahnhof.de...")
-        # Use domcontentloaded, not networkidle - bahnhof.de has background
-        # telemetry/ads that prevent network from going idle, causing 100% timeout.
-        await page.goto(SBAHN_URL, wait_until='domcontentloaded', timeout=30000)
+# One in-page read of row texts + body text (body is the fallback parser's input)
+_SBAHN_ROWS_JS = """([primary, alternative, limit]) => {
+    let nodes = document.querySelectorAll(primary);
+    if (!nodes.length) nodes = document.querySelectorAll(alternative);
+    return {
+        rows: Array.from(nodes).slice(0, limit).map(n => n.innerText),
+        body: document.body ? document.body.innerText : '',
+    };
+}"""
 
-        # Wait for Next.js hydration
-        await page.wait_for_timeout(3000)
 
-        # Accept cookies if dialog appears
+def parse_sbahn_rows(texts, now):
+    """Parse bahnhof.de departure rows (innerText of each row element)."""
+    departures = []
+    for text in texts:
         try:
-            accept_btn = page.locator('button:has-text("Accept")')
-            if await accept_btn.count() > 0:
-                await accept_btn.first.click()
-                await page.wait_for_timeout(500)
-        except Exception:
-            pass
+            # Look for S-Bahn lines (S1, S7, etc.)
+            line_match = re.search(r'\b(S\d+)\b', text)
+            if not line_match:
+                continue
 
-        # Find departure entries - bahnhof.de uses aria-labels for departures
-        # Look for time elements and departure info
-        departure_items = await page.locator('[data-testid="departure-row"], .departure-row, [class*="Departure"]').all()
+            line = line_match.group(1)
 
-        if not departure_items:
-            # Try alternative selectors
-            departure_items = await page.locator('article, [role="listitem"]').all()
+            # Look for time patterns (HH:MM)
+            time_match = re.search(r'(\d{1,2}):(\d{2})', text)
+            if not time_match:
+                continue
 
-        now = datetime.now()
+            hour, minute = int(time_match.group(1)), int(time_match.group(2))
+
+            # Look for direction/destination
+            # Pattern on bahnhof.de: "to Berlin-Wannsee." or "to Oranienburg."
+            direction = "Unknown"
+            dir_patterns = [
+                r'to\s+(Berlin-)?([A-Za-zäöüÄÖÜß\-]+)\.',  # "to Berlin-Wannsee." or "to Oranienburg."
+                r'(?:Richtung|nach)\s+([A-Za-zäöüÄÖÜß\s\-]+?)(?:\s*\d|$|\n)',
+                r'(Wannsee|Oranienburg|Frohnau|Potsdam)',  # Fallback: known destinations
+            ]
+            for pattern in dir_patterns:
+                dir_match = re.search(pattern, text, re.IGNORECASE)
+                if dir_match:
+                    # Get the last group (handles optional Berlin- prefix)
+                    groups = [g for g in dir_match.groups() if g]
+                    direction = groups[-1].strip() if groups else "Unknown"
+                    break
+
+            # Look for platform
+            platform = None
+            plat_match = re.search(r'(?:Gleis|Platform|Pl\.?)\s*(\d+)', text, re.IGNORECASE)
+            if plat_match:
+                platform = plat_match.group(1)
+
+            # Look for delay
+            delay = 0
+            delay_match = re.search(r'\+(\d+)', text)
+            if delay_match:
+                delay = int(delay_match.group(1))
 
-        for item in departure_items[:10]:
-            try:
-                text = await item.inner_text()
+            # Check for cancelled/strike trip (uses shared CANCELLATION_PATTERN)
+            cancelled = bool(CANCELLATION_PATTERN.search(text))
 
-                # Look for S-Bahn lines (S1, S7, etc.)
-                line_match = re.search(r'\b(S\d+)\b', text)
-                if not line_match:
+            # Calculate minutes until departure (include delay in comparison)
+            dep_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            actual_dep_time = dep_time + timedelta(minutes=delay)
+
+            # Only wrap to next day if it's truly past (e.g., 23:00 when now is 01:00)
+            # Not if it's just a few minutes ago (likely already departed)
+            if actual_dep_time < now:
+                # Skip trains that have already left (within last hour)
+                if (now - actual_dep_time).total_seconds() < 3600:
                     continue
+                # Otherwise it's probably next day (late night schedule)
+                dep_time = dep_time + timedelta(days=1)
+                actual_dep_time = dep_time + timedelta(minutes=delay)
 
-                line = line_match.group(1)
+            minutes = int((actual_dep_time - now).total_seconds() / 60)
 
-                # Look for time patterns (HH:MM)
-                time_match = re.search(r'(\d{1,2}):(\d{2})', text)
-                if not time_match:
-                    continue
+            if minutes < 0:
+                continue
 
-                hour, minute = int(time_match.group(1)), int(time_match.group(2))
+            departures.append({
+                "line": line,
+                "direction": direction,
+                "minutes": minutes,
+                "departs_at": actual_dep_time.timestamp(),
+                "time": f"{hour:02d}:{minute:02d}",
+                "delay": delay,
+                "platform": platform,
+                "cancelled": cancelled
+            })
 
-                # Look for direction/destination
-                # Pattern on bahnhof.de: "to Berlin-Wannsee." or "to Oranienburg."
-                direction = "Unknown"
-                dir_patterns = [
-                    r'to\s+(Berlin-)?([A-Za-zäöüÄÖÜß\-]+)\.',  # "to Berlin-Wannsee." or "to Oranienburg."
-                    r'(?:Richtung|nach)\s+([A-Za-zäöüÄÖÜß\s\-]+?)(?:\s*\d|$|\n)',
-                    r'(Wannsee|Oranienburg|Frohnau|Potsdam)',  # Fallback: known destinations
-                ]
-                for pattern in dir_patterns:
-                    dir_match = re.search(pattern, text, re.IGNORECASE)
-                    if dir_match:
-                        # Get the last group (handles optional Berlin- prefix)
-                        groups = [g for g in dir_match.groups() if g]
-                        direction = groups[-1].strip() if groups else "Unknown"
-                        break
-
-                # Look for platform
-                platform = None
-                plat_match = re.search(r'(?:Gleis|Platform|Pl\.?)\s*(\d+)', text, re.IGNORECASE)
-                if plat_match:
-                    platform = plat_match.group(1)
-
-                # Look for delay
-                delay = 0
-                delay_match = re.search(r'\+(\d+)', text)
-                if delay_match:
-                    delay = int(delay_match.group(1))
-
-                # Check for cancelled/strike trip (uses shared CANCELLATION_PATTERN)
-                cancelled = bool(CANCELLATION_PATTERN.search(text))
-
-                # Calculate minutes until departure (include delay in comparison)
-                dep_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                actual_dep_time = dep_time + timedelta(minutes=delay)
+        except Exception:
+            continue
 
-                # Only wrap to next day if it's truly past (e.g., 23:00 when now is 01:00)
-                # Not if it's just a few minutes ago (likely already departed)
-                if actual_dep_time < now:
-                    # Skip trains that have already left (within last hour)
-                    if (now - actual_dep_time).total_seconds() < 3600:
-                        continue
-                    # Otherwise it's probably next day (late night schedule)
-                    dep_time = dep_time + timedelta(days=1)
-                    actual_dep_time = dep_time + timedelta(minutes=delay)
+    return departures
+
+
+def parse_sbahn_text(all_text, now):
+    """Fallback: parse departures from the page's whole body text."""
+    departures = []
+    # Pattern: S1 followed by "to DESTINATION." followed by time
+    # Example: "S1\nto Berlin-Wannsee.\nplanned 10 52...\n10:52"
+    pattern = r'(S\d+)\s*\nto\s+([^.]+)\.\s*.*?(\d{1,2}):(\d{2})'
+
+    # Collect all matches first for bounded cancellation detection
+    #
+    #   ┌──────────────────────────────────────────────────────┐
+    #   │  BOUNDED WINDOWS (prev match end .. next match start)│
+    #   │                                                      │
+    #   │  OLD: Fixed 100-char backward window bled across     │
+    #   │  adjacent departures. "Trip cancelled" from the      │
+    #   │  Wannsee entry leaked into Oranienburg's window.     │
+    #   │                                                      │
+    #   │  NEW: Each departure's window is bounded by its      │
+    #   │  neighbors. Cancellation text is only attributed     │
+    #   │  to the departure it belongs to.                     │
+    #   │                                                      │
+    #   │  ...[prev match end] .. cancel? .. [match] .. [next] │
+    #   │       ▲ window_start               window_end ▲      │
+    #   └──────────────────────────────────────────────────────┘
+    all_matches = list(re.finditer(pattern, all_text, re.DOTALL))
+
+    for i, match in enumerate(all_matches):
+        try:
+            line = match.group(1)
+            direction_raw = match.group(2).strip()
+            hour = int(match.group(3))
+            minute = int(match.group(4))
+
+            # Clean up direction (remove "Berlin-" prefix for cleaner display)
+            direction = direction_raw.replace("Berlin-", "").strip()
 
-                minutes = int((actual_dep_time - now).total_seconds() / 60)
+            # Calculate minutes until departure
+            dep_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
 
-                if minutes < 0:
+            # Only wrap to next day if it's truly past (e.g., 23:00 when now is 01:00)
+            # Not if it's just a few minutes ago (likely already departed)
+            if dep_time < now:
+                # Skip trains that have already left (within last hour)
+                if (now - dep_time).total_seconds() < 3600:
                     continue
+                # Otherwise it's probably next day (late night schedule)
+                dep_time = dep_time + timedelta(days=1)
 
-                departures.append({
-                    "line": line,
-                    "direction": direction,
-                    "minutes": minutes,
-                    "time": f"{hour:02d}:{minute:02d}",
-                    "delay": delay,
-                    "platform": platform,
-                    "cancelled": cancelled
-                })
+            minutes = int((dep_time - now).total_seconds() / 60)
 
-            except Exception as e:
+            if minutes < 0 or minutes > 120:
                 continue
 
+            # Bounded window: from end of previous match to start of next match
+            window_start = all_matches[i-1].end() if i > 0 else 0
+            window_end = all_matches[i+1].start() if i < len(all_matches) - 1 else len(all_text)
+            nearby_text = all_text[window_start:window_end]
+
+            platform = None
+            plat_match = re.search(r'Platform\s+(\d+)', nearby_text)
+            if plat_match:
+                platform = plat_match.group(1)
+
+            cancelled = bool(CANCELLATION_PATTERN.search(nearby_text))
+
+            departures.append({
+                "line": line,
+                "direction": direction,
+                "minutes": minutes,
+                "departs_at": dep_time.timestamp(),
+                "time": f"{hour:02d}:{minute:02d}",
+                "delay": 0,
+                "platform": platform,
+                "cancelled": cancelled
+            })
+        except Exception:
+            continue
+
+    return departures
+
+
+async def _sbahn_rows_ready(page):
+    """True once departure rows (or S-line text in fallback rows) are rendered."""
+    if await page.locator(SBAHN_ROW_SELECTOR).count() > 0:
+        return True
+    return await page.locator(SBAHN_ALT_ROW_SELECTOR).filter(has_text=_SBAHN_LINE_TEXT).count() > 0
+
+
+async def scrape_sbahn_departures():
+    """Scrape S-Bahn departures from bahnhof.de."""
+    departures = []
+    timer = PhaseTimer("[S-BAHN]")
+    context, network = await new_scrape_context()
+
+    try:
+        page = await context.new_page()
+
+        log(f"[S-BAHN] Navigating to bahnhof.de...")
+        # Use domcontentloaded, not networkidle - bahnhof.de has background
+        # telemetry/ads that prevent network from going idle, causing 100% timeout.
+        raise_if_blocked(await page.goto(SBAHN_URL, wait_until='domcontentloaded', timeout=30000), "bahnhof.de")
+        timer.mark("navigate")
+
+        # Wait for Next.js to render departures (accepting cookies if asked).
+        # Not fatal on timeout: the body-text fallback below may still match.
+        if not await wait_until_ready(
+            page, timer, "[S-BAHN]",
+            consent_selector='button:has-text("Accept")',
+            probe=_sbahn_rows_ready,
+            timeout=SBAHN_READY_TIMEOUT,
+        ):
+            log(f"[S-BAHN] Departure rows not rendered within {SBAHN_READY_TIMEOUT}s")
+        timer.mark("render")
+
+        # Read rows + body text in ONE round trip, then parse in Python
+        page_text = await page.evaluate(
+            _SBAHN_ROWS_JS, [SBAHN_ROW_SELECTOR, SBAHN_ALT_ROW_SELECTOR, 10]
+        )
+        timer.mark("extract")
+        if FIXTURE_CAPTURE_DIR:
+            capture_fixture("sbahn.html", await page.content())
+            capture_fixture("sbahn-rows.json", page_text)
+        now = datetime.now()
+        departures = parse_sbahn_rows(page_text["rows"], now)
+
         # If structured parsing failed, try a simpler approach
         if not departures:
             log("[S-BAHN] Structured parsing failed, trying simple text extraction...")
-            all_text = await page.inner_text('body')
-
-            # Pattern: S1 followed by "to DESTINATION." followed by time
-            # Example: "S1\nto Berlin-Wannsee.\nplanned 10 52...\n10:52"
-            pattern = r'(S\d+)\s*\nto\s+([^.]+)\.\s*.*?(\d{1,2}):(\d{2})'
-
-            # Collect all matches first for bounded cancellation detection
-            #
-            #   ┌──────────────────────────────────────────────────────┐
-            #   │  BOUNDED WINDOWS (prev match end .. next match start)│
-            #   │                                                      │
-            #   │  OLD: Fixed 100-char backward window bled across     │
-            #   │  adjacent departures. "Trip cancelled" from the      │
-            #   │  Wannsee entry leaked into Oranienburg's window.     │
-            #   │                                                      │
-            #   │  NEW: Each departure's window is bounded by its      │
-            #   │  neighbors. Cancellation text is only attributed     │
-            #   │  to the departure it belongs to.                     │
-            #   │                                                      │
-            #   │  ...[prev match end] .. cancel? .. [match] .. [next] │
-            #   │       ▲ window_start               window_end ▲      │
-            #   └──────────────────────────────────────────────────────┘
-            all_matches = list(re.finditer(pattern, all_text, re.DOTALL))
-
-            for i, match in enumerate(all_matches):
-                try:
-                    line = match.group(1)
-                    direction_raw = match.group(2).strip()
-                    hour = int(match.group(3))
-                    minute = int(match.group(4))
-
-                    # Clean up direction (remove "Berlin-" prefix for cleaner display)
-                    direction = direction_raw.replace("Berlin-", "").strip()
-
-                    # Calculate minutes until departure
-                    dep_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-
-                    # Only wrap to next day if it's truly past (e.g., 23:00 when now is 01:00)
-                    # Not if it's just a few minutes ago (likely already departed)
-                    if dep_time < now:
-                        # Skip trains that have already left (within last hour)
-                        if (now - dep_time).total_seconds() < 3600:
-                            continue
-                        # Otherwise it's probably next day (late night schedule)
-                        dep_time = dep_time + timedelta(days=1)
-
-                    minutes = int((dep_time - now).total_seconds() / 60)
-
-                    if minutes < 0 or minutes > 120:
-                        continue
-
-                    # Bounded window: from end of previous match to start of next match
-                    window_start = all_matches[i-1].end() if i > 0 else 0
-                    window_end = all_matches[i+1].start() if i < len(all_matches) - 1 else len(all_text)
-                    nearby_text = all_text[window_start:window_end]
-
-                    platform = None
-                    plat_match = re.search(r'Platform\s+(\d+)', nearby_text)
-                    if plat_match:
-                        platform = plat_match.group(1)
-
-                    cancelled = bool(CANCELLATION_PATTERN.search(nearby_text))
-
-                    departures.append({
-                        "line": line,
-                        "direction": direction,
-                        "minutes": minutes,
-                        "time": f"{hour:02d}:{minute:02d}",
-                        "delay": 0,
-                        "platform": platform,
-                        "cancelled": cancelled
-                    })
-                except Exception:
-                    continue
+            departures = parse_sbahn_text(page_text["body"], now)
 
         # Deduplicate and sort
         seen = set()
@@ -731,130 +1498,655 @@ async def scrape_sbahn_departures():
                 seen.add(key)
                 unique_deps.append(dep)
 
-        departures = sorted(unique_deps, key=lambda x: x["minutes"])[:6]
+        departures = sorted(unique_deps, key=lambda x: x["minutes"])[:DEPARTURES_CACHED]
 
+        timer.mark("parse")
         log(f"[S-BAHN] Scraped {len(departures)} departures")
 
+    except SourceBlocked:
+        raise  # _scrape_source trips the breaker
+
     except Exception as e:
         log(f"[S-BAHN] Scraping error: {e}")
         import traceback
         traceback.print_exc()
 
     finally:
+        timer.log()
         await context.close()
+        record_network_stats("sbahn", network)
 
     return departures
 
 
+# ─────────────────────────────────────────────────────────────────
+# CIRCUIT BREAKERS (BVG, bahnhof.de, HAFAS)
+# ─────────────────────────────────────────────────────────────────
+#
+#   ┌───────────────────────────────────────────────────────────────┐
+#   │  STOP KNOCKING ON A DOOR THAT IS SHUT                         │
+#   │                                                               │
+#   │  OLD: BVG answers 403 → every refresh still launches Chromium │
+#   │       (~10s CPU), gets 403 again, then asks HAFAS             │
+#   │       → more requests from a flagged IP, block lasts longer   │
+#   │                                                               │
+#   │  NEW:  closed ──3 failed/empty in a row, or 403/429──► open   │
+#   │          ▲                                             │      │
+#   │          │ success             skip upstream for window│      │
+#   │          │                    (5m, 10m, 20m … max 1h)  ▼      │
+#   │          └─────────────────── half-open ◄── window over       │
+#   │                           (trial call; failure → open, ×2)    │
+#   │                                                               │
+#   │  While open, refreshes go straight to the fallback source.    │
+#   └───────────────────────────────────────────────────────────────┘
+
+class SourceBlocked(Exception):
+    """Upstream refused us (HTTP 403/429) — likely an IP block."""
+
+
+class CircuitOpen(Exception):
+    """Upstream skipped: its circuit breaker is open."""
+
+
+def raise_if_blocked(response, name):
+    """Raise SourceBlocked if a page navigation got a block status."""
+    if response is not None and response.status in BREAKER_BLOCK_STATUSES:
+        raise SourceBlocked(f"{name} HTTP {response.status}")
+
+
+def breaker_allows(name):
+    """True if `name` may be called now; moves an expired open breaker to half-open."""
+    breaker = _breakers[name]
+    if breaker["state"] == "open":
+        if time.time() < breaker["open_until"]:
+            _request_stats["breaker_skips"] += 1
+            return False
+        breaker["state"] = "half-open"
+        log(f"[BREAKER] {name} half-open, trying it again")
+    return True
+
+
+def breaker_record(name, outcome, error=None):
+    """Feed one call's outcome ('ok', 'empty', 'error', 'blocked') into `name`'s breaker."""
+    breaker = _breakers[name]
+    if outcome == "ok":
+        if breaker["state"] != "closed":
+            log(f"[BREAKER] {name} closed (recovered)")
+        breaker.update(state="closed", failures=0, trips=0)
+        return
+
+    breaker["failures"] += 1
+    breaker[{"empty": "empty", "error": "errors", "blocked": "blocked"}[outcome]] += 1
+    breaker["last_error"] = f"{outcome}: {error}" if error else outcome
+    if (outcome == "blocked" or breaker["state"] == "half-open"
+            or breaker["failures"] >= BREAKER_FAILURES):
+        window = min(BREAKER_BASE_WINDOW * 2 ** breaker["trips"], BREAKER_MAX_WINDOW)
+        breaker.update(state="open", open_until=time.time() + window, trips=breaker["trips"] + 1, failures=0)
+        log(f"[BREAKER] {name} OPEN for {window}s after {breaker['last_error']} (trip #{breaker['trips']})")
+
+
+def breaker_status(name):
+    """One-line reason for a skipped call (logs, CircuitOpen message)."""
+    return f"{name} circuit open for {max(0.0, _breakers[name]['open_until'] - time.time()):.0f}s"
+
+
+def breakers_snapshot():
+    """Breaker state for /api/health (open_for = seconds until the next trial)."""
+    now = time.time()
+    return {
+        name: {**b, "open_for": round(max(0.0, b["open_until"] - now)) if b["state"] == "open" else 0}
+        for name, b in _breakers.items()
+    }
+
+
 # ─────────────────────────────────────────────────────────────────
 # MAIN FETCH FUNCTION
 # ─────────────────────────────────────────────────────────────────
+#
+#   ┌───────────────────────────────────────────────────────────────┐
+#   │  STALE-WHILE-REVALIDATE (per source: bus, sbahn)              │
+#   │                                                               │
+#   │  age < CACHE_TTL ............ fresh  → serve                  │
+#   │  age < CACHE_MAX_STALE ...... stale  → serve now + "stale",   │
+#   │                                        refresh in background  │
+#   │  no data / older ............ wait for the refresh; if it     │
+#   │                               fails too → error, no ghosts    │
+#   │                                                               │
+#   │  Bus and S-Bahn are cached and refreshed independently:       │
+#   │  a slow BVG page never holds back fresh S-Bahn data.          │
+#   │  Only a refresh that produced data counts as "last good" —    │
+#   │  a failed scrape keeps serving the previous result.           │
+#   └───────────────────────────────────────────────────────────────┘
 
-async def fetch_transport_async():
-    """Fetch transport data - scrapes both Bus and S-Bahn in parallel.
+SOURCES = {
+    "bus": {
+        "label": "Bus",
+        "tag": "[BUS]",
+        "name": "BVG",
+        "scrape": scrape_bvg_departures,
+        "filter": filter_bus_departures,
+        "hafas_stop": HAFAS_BUS_STOP_ID,
+    },
+    "sbahn": {
+        "label": "S-Bahn",
+        "tag": "[S-BAHN]",
+        "name": "bahnhof.de",
+        "scrape": scrape_sbahn_departures,
+        "filter": filter_sbahn_departures,
+        "hafas_stop": HAFAS_SBAHN_STOP_ID,
+    },
+}
 
-    Architecture: Launch → Scrape → Kill
-    Browser is launched, scraping happens, then browser is killed immediately.
-    """
-    # Check cache first
-    if _cache["data"] and _cache["timestamp"]:
-        age = (datetime.now() - _cache["timestamp"]).total_seconds()
-        if age < CACHE_TTL:
-            log(f"Returning cached data (age: {age:.1f}s)")
-            return _cache["data"]
 
-    _request_stats["scrapes"] += 1
-    log("Fetching fresh transport data...")
+async def _scrape_source(key):
+    """Browser-scrape one source. Returns raw (unfiltered) departures, [] on failure.
 
+    Skipped (no browser launch) while the source's breaker is open.
+    """
+    src = SOURCES[key]
+    if not breaker_allows(src["name"]):
+        log(f"{src['tag']} Skipping scrape: {breaker_status(src['name'])}")
+        return []
+    _request_stats["scrapes"] += 1
+    profile = {"at": datetime.now().isoformat(timespec="seconds"), "source": key, "launch_s": None}
+    token = _current_profile.set(profile)
+    start = time.monotonic()
+    departures, error = [], None
     try:
-        # Scrape both sources in parallel
-        bus_task = asyncio.create_task(scrape_bvg_departures())
-        sbahn_task = asyncio.create_task(scrape_sbahn_departures())
+        async with browser_session():
+            departures = await src["scrape"]()
+        # The scrapers log and swallow page errors, so [] covers failures too
+        outcome = "ok" if departures else "empty"
+    except SourceBlocked as e:
+        log(f"{src['tag']} Blocked: {e}")
+        outcome, error = "blocked", e
+    except Exception as e:
+        log(f"{src['tag']} Scraping failed: {e}")
+        outcome, error = "error", e
+    finally:
+        _current_profile.reset(token)
+    breaker_record(src["name"], outcome, error)
+    record_profile(profile, outcome, len(departures), time.monotonic() - start)
+    return departures
 
-        bus_result, sbahn_result = await asyncio.gather(
-            bus_task, sbahn_task,
-            return_exceptions=True
-        )
 
-        # Handle exceptions
-        bus_departures = [] if isinstance(bus_result, Exception) else bus_result
-        sbahn_departures = [] if isinstance(sbahn_result, Exception) else sbahn_result
+async def _fetch_hafas_source(key):
+    """HAFAS departures for one source (filtered). Raises on API failure."""
+    src = SOURCES[key]
+    departures = src["filter"](await hafas_board(src["hafas_stop"]))
+    log(f"{src['tag']} HAFAS returned {len(departures)} departures")
+    return departures
 
-        # Filter departures
-        bus_departures = filter_bus_departures(bus_departures)
-        sbahn_departures = filter_sbahn_departures(sbahn_departures)
 
-        # Track data source per transport type
-        bus_source = "BVG" if bus_departures else None
-        sbahn_source = "bahnhof.de" if sbahn_departures else None
+async def _refresh_source(key):
+    """Refresh one source per SOURCE_STRATEGY and store it in the cache.
 
-        # HAFAS fallback: if scraping returned no bus departures, try the API
-        if not bus_departures:
-            try:
-                log("[BUS] Scraper returned 0 results, trying HAFAS API fallback...")
-                hafas_bus = fetch_hafas_departures(HAFAS_BUS_STOP_ID)
-                bus_departures = filter_bus_departures(hafas_bus)
-                log(f"[BUS] HAFAS fallback returned {len(bus_departures)} departures")
-                _request_stats["hafas_fallbacks"] += 1
-                bus_source = "HAFAS"
-            except Exception as he:
-                log(f"[BUS] HAFAS fallback also failed: {he}")
-
-        # HAFAS fallback: if scraping returned no S-Bahn departures, try the API
-        if not sbahn_departures:
-            try:
-                log("[S-BAHN] Scraper returned 0 results, trying HAFAS API fallback...")
-                hafas_sbahn = fetch_hafas_departures(HAFAS_SBAHN_STOP_ID)
-                sbahn_departures = filter_sbahn_departures(hafas_sbahn)
-                log(f"[S-BAHN] HAFAS fallback returned {len(sbahn_departures)} departures")
-                _request_stats["hafas_fallbacks"] += 1
-                sbahn_source = "HAFAS"
-            except Exception as he:
-                log(f"[S-BAHN] HAFAS fallback also failed: {he}")
-
-        log(f"OK: {len(sbahn_departures)} S-Bahn ({sbahn_source}), {len(bus_departures)} bus ({bus_source})")
-
-        result = {
-            "sbahn": sbahn_departures,
-            "bus": bus_departures,
-            "updated": datetime.now().strftime("%H:%M"),
-            "error": None,
-            "fallback": FALLBACK,
-            "source": {"bus": bus_source, "sbahn": sbahn_source},
-        }
+    Architecture: Launch → Scrape → Kill
+    The browser is shared while both sources refresh, and killed as soon
+    as the last one finishes (browser_session).
+    """
+    src = SOURCES[key]
+    log(f"{src['tag']} Fetching fresh departures ({SOURCE_STRATEGY})...")
+    departures, source = [], None
 
-        # Update cache
-        _cache["data"] = result
-        _cache["timestamp"] = datetime.now()
+    if SOURCE_STRATEGY == "hafas-first":
+        try:
+            departures = await _fetch_hafas_source(key)
+            _request_stats["hafas_primary"] += 1
+            source = "HAFAS"  # empty board is a valid answer (e.g. at night)
+            _schedule_enrichment(key)
+            departures = apply_enrichment(key, departures)
+        except Exception as he:
+            log(f"{src['tag']} HAFAS failed ({he}), falling back to scraper...")
+
+    if source is None:
+        departures = src["filter"](await _scrape_source(key))
+        if departures:
+            source = src["name"]
+
+    # HAFAS fallback: if scraping returned no departures, try the API
+    if source is None and SOURCE_STRATEGY != "hafas-first":
+        try:
+            log(f"{src['tag']} Scraper returned 0 results, trying HAFAS API fallback...")
+            departures = await _fetch_hafas_source(key)
+            _request_stats["hafas_fallbacks"] += 1
+            source = "HAFAS"
+        except Exception as he:
+            log(f"{src['tag']} HAFAS fallback also failed: {he}")
 
-        return result
+    log(f"{src['tag']} OK: {len(departures)} departures ({source})")
+    if source:
+        _cache[key] = {"departures": departures, "source": source, "timestamp": time.time()}
 
-    except Exception as e:
-        log(f"ERROR: {e}")
-        return {
-            "sbahn": [],
-            "bus": [],
-            "updated": None,
-            "error": str(e),
-            "fallback": FALLBACK,
-            "source": None,
+
+# ─────────────────────────────────────────────────────────────────
+# CANCELLATION ENRICHMENT (hafas-first strategy)
+# ─────────────────────────────────────────────────────────────────
+#
+#   ┌───────────────────────────────────────────────────────────────┐
+#   │  HAFAS: structured departures, ~200ms, no browser             │
+#   │  Website: strike banners / "fällt aus" text HAFAS may lack    │
+#   │                                                               │
+#   │  every request ──► HAFAS ──────────────┐                      │
+#   │  every ENRICH_INTERVAL ──► browser ────┤ merge per departure  │
+#   │    (background, never blocks a reply)  │ key: (line, HH:MM)   │
+#   │                                        ▼                      │
+#   │          cancelled = HAFAS dCncl OR website CANCELLATION_PATTERN
+#   │                                                               │
+#   │  Enrichment older than ENRICH_MAX_AGE is ignored — a strike   │
+#   │  flag from this morning must not cancel tonight's buses.      │
+#   └───────────────────────────────────────────────────────────────┘
+
+def _departure_key(dep):
+    return (dep["line"].strip().upper(), dep["time"])
+
+
+def _schedule_enrichment(key):
+    """Start a background enrichment scrape if the last one is due (loop thread only)."""
+    task = _inflight_enrich.get(key)
+    if task is not None and not task.done():
+        return
+    if time.time() - _enrichment[key]["timestamp"] < ENRICH_INTERVAL:
+        return
+    _inflight_enrich[key] = asyncio.ensure_future(_enrich_source(key))
+
+
+async def _enrich_source(key):
+    """Scrape the website and remember which departures it shows as cancelled."""
+    src = SOURCES[key]
+    log(f"{src['tag']} Enrichment scrape (cancellation/strike text)...")
+    _request_stats["enrichment_scrapes"] += 1
+    scraped = await _scrape_source(key)
+    # Empty scrape (blocked, layout change) keeps the previous enrichment
+    if scraped:
+        _enrichment[key] = {
+            "cancelled": {_departure_key(d) for d in scraped if d["cancelled"]},
+            "timestamp": time.time(),
         }
+        log(f"{src['tag']} Enrichment: {len(_enrichment[key]['cancelled'])} cancelled of {len(scraped)}")
+    else:
+        # Retry at the next interval, not on every request
+        _enrichment[key]["timestamp"] = time.time() - ENRICH_INTERVAL / 2
+
+
+def apply_enrichment(key, departures):
+    """Merge website cancellation flags into HAFAS departures."""
+    enrichment = _enrichment[key]
+    if not enrichment["cancelled"] or time.time() - enrichment["timestamp"] > ENRICH_MAX_AGE:
+        return departures
+    merged = []
+    for dep in departures:
+        if not dep["cancelled"] and _departure_key(dep) in enrichment["cancelled"]:
+            dep = {**dep, "cancelled": True}
+        merged.append(dep)
+    return merged
 
-    finally:
-        # ALWAYS kill browser after scrape (Launch → Scrape → Kill architecture)
-        await shutdown_browser_now()
+
+def _start_refresh(key):
+    """Start a refresh for `key`, or join the one already running (loop thread only)."""
+    task = _inflight_refresh.get(key)
+    if task is not None and not task.done():
+        _request_stats["coalesced"] += 1
+        log(f"{SOURCES[key]['tag']} Scrape already in flight, joining it")
+        return task
+    task = asyncio.ensure_future(_refresh_source(key))
+    _inflight_refresh[key] = task
+    return task
+
+
+def project_departures(departures, now):
+    """Cached departures as of `now`: minutes recomputed, departed dropped.
+
+    ┌──────────────────────────────────────────────────────────────┐
+    │  PROJECTION INSTEAD OF RE-SCRAPING                           │
+    │                                                              │
+    │  OLD: cache {"minutes": 7} at 07:40:10 → still "7" at        │
+    │       07:40:59, bus gone but listed until the next scrape    │
+    │                                                              │
+    │  NEW: cache {"departs_at": 07:47:00} → every read:           │
+    │       minutes = floor((departs_at - now) / 60), < now → drop │
+    └──────────────────────────────────────────────────────────────┘
+    """
+    projected = []
+    for dep in departures:
+        departs_at = dep.get("departs_at")
+        if departs_at is None:
+            projected.append(dep)
+            continue
+        if departs_at < now:
+            continue
+        public = {k: v for k, v in dep.items() if k != "departs_at"}
+        public["minutes"] = int((departs_at - now) / 60)
+        projected.append(public)
+        if len(projected) == DEPARTURES_SHOWN:
+            break
+    return projected
+
+
+def _cache_state(key, now=None):
+    """Classify a cache entry: 'fresh', 'stale' (servable) or 'expired'.
+
+    A fresh entry turns stale early once departures leaving have dropped
+    its board below DEPARTURES_SHOWN.
+    """
+    entry = _cache[key]
+    timestamp = entry["timestamp"]
+    if timestamp is None:
+        return "expired"
+    now = now or time.time()
+    age = now - timestamp
+    if age < CACHE_TTL:
+        departures = entry["departures"]
+        left = sum(1 for dep in departures if dep.get("departs_at", now) < now)
+        if left and len(departures) - left < DEPARTURES_SHOWN:
+            return "stale"
+        return "fresh"
+    return "stale" if age < CACHE_MAX_STALE else "expired"
+
+
+async def _revalidate_async():
+    """Start refreshes for stale entries; wait only for expired ones.
+
+    ┌──────────────────────────────────────────────────────────────┐
+    │  SINGLE-FLIGHT                                               │
+    │                                                              │
+    │  Cache expires, kiosk + phone poll at the same second:       │
+    │                                                              │
+    │  OLD: caller A ──► launch browser ──► scrape                 │
+    │       caller B ──► launch browser ──► scrape   (2× CPU)      │
+    │                                                              │
+    │  NEW: caller A ──► start refresh task ─┐                     │
+    │       caller B ──► await same task ────┴─► 1 launch, 1 scrape│
+    │                    (counted as "coalesced", not "scrapes")   │
+    │                                                              │
+    │  Runs only on the scraper loop thread → no lock needed.      │
+    │  shield(): a caller timing out never cancels the shared task.│
+    └──────────────────────────────────────────────────────────────┘
+    """
+    waiting = []
+    for key in SOURCES:
+        state = _cache_state(key)
+        if state == "stale":
+            _start_refresh(key)  # background: caller gets stale data now
+        elif state == "expired":
+            waiting.append(asyncio.shield(_start_refresh(key)))
+    if waiting:
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+
+def build_transport_response(now=None):
+    """Assemble the /api/transport payload from the per-source cache.
+
+    Everything in it is fixed until the cache changes or the clock enters
+    a new minute (departure times are whole minutes, so "minutes" only
+    changes then; fetched_at is an absolute epoch, not a running age).
+    """
+    now = now or time.time()
+    result = {"fallback": FALLBACK, "source": {}, "fetched_at": {}, "stale": {}}
+    errors = []
+    oldest = None
+    for key, src in SOURCES.items():
+        entry = _cache[key]
+        state = _cache_state(key, now)
+        if state == "expired":
+            result[key] = []
+            result["source"][key] = None
+            result["fetched_at"][key] = entry["timestamp"]
+            result["stale"][key] = True
+            if entry["timestamp"] is None:
+                errors.append(f"{src['label']} unavailable")
+            else:
+                errors.append(f"{src['label']} data too old ({now - entry['timestamp']:.0f}s)")
+            continue
+        result[key] = project_departures(entry["departures"], now)
+        result["source"][key] = entry["source"]
+        result["fetched_at"][key] = round(entry["timestamp"], 1)
+        result["stale"][key] = state == "stale"
+        oldest = entry["timestamp"] if oldest is None else min(oldest, entry["timestamp"])
+
+    result["updated"] = datetime.fromtimestamp(oldest).strftime("%H:%M") if oldest else None
+    result["error"] = "; ".join(errors) or None
+    return result
 
 
 def fetch_transport():
-    """Synchronous wrapper for async fetch."""
-    loop = _get_event_loop()
-    return loop.run_until_complete(fetch_transport_async())
+    """Synchronous fetch for HTTP handler threads → (etag, body, gzip_body).
+
+    All-fresh requests never touch the scraper loop; otherwise the
+    request is handed to it. Stale entries return at once (refresh
+    continues in the background); only expired entries wait.
+    """
+    if not all(_cache_state(key) == "fresh" for key in SOURCES):
+        future = asyncio.run_coroutine_threadsafe(_revalidate_async(), _get_event_loop())
+        future.result(timeout=FETCH_TIMEOUT)
+    return transport_representation()
+
+
+async def _health_async():
+    """Loop-thread part of /api/health: copies of state only the loop mutates."""
+    return {
+        "status": "ok",
+        "browser_active": _browser is not None,
+        "browser_mode": BROWSER_MODE,
+        "breakers": breakers_snapshot(),
+        "stats": copy.deepcopy(_request_stats),
+    }
+
+
+def health_snapshot():
+    """/api/health payload for handler threads.
+
+    The scraper loop adds and replaces nested entries of _request_stats
+    (browser_kills, last_scrape_network, prefetch_window, ...), so
+    serializing the live dict from a handler thread can fail mid-iteration.
+    The copy is taken on the loop itself, between two of its steps.
+    """
+    future = asyncio.run_coroutine_threadsafe(_health_async(), _get_event_loop())
+    health = future.result(timeout=5)
+    health["profile"] = profile_summary()  # ring buffer has its own lock
+    return health
+
+
+def transport_representation():
+    """Serialized /api/transport response, rebuilt only when the cache changes.
+
+    ┌──────────────────────────────────────────────────────────────┐
+    │  ONE REPRESENTATION PER CACHE STATE                          │
+    │                                                              │
+    │  key = (refresh timestamp, fresh/stale/expired) per source   │
+    │        + current minute (projected "minutes" change with it) │
+    │                                                              │
+    │  key unchanged → reuse body bytes, gzip bytes and ETag       │
+    │                  (no json.dumps, no gzip per request)        │
+    │  key changed   → build, serialize, ETag = sha1(body)         │
+    │                                                              │
+    │  "stats" are a snapshot taken when the body is built: the    │
+    │  same ETag must always mean the same bytes.                  │
+    └──────────────────────────────────────────────────────────────┘
+    """
+    now = time.time()
+    key = (int(now // 60),) + tuple((k, _cache[k]["timestamp"], _cache_state(k, now)) for k in SOURCES)
+    with _response_lock:
+        if _response_cache["key"] != key:
+            result = build_transport_response(now)
+            # Include request stats in response for dashboard visibility
+            result["stats"] = {
+                "total_requests": _request_stats["total"],
+                "scrapes": _request_stats["scrapes"],
+                "coalesced": _request_stats["coalesced"],
+                "hafas_fallbacks": _request_stats["hafas_fallbacks"],
+                "started": _request_stats["started"],
+            }
+            body = json.dumps(result).encode()
+            _response_cache.update(
+                key=key,
+                etag=f'"{hashlib.sha1(body).hexdigest()[:20]}"',
+                body=body,
+                gzip=None,
+            )
+            _request_stats["serializations"] += 1
+        if _response_cache["gzip"] is None:
+            _response_cache["gzip"] = gzip.compress(_response_cache["body"], compresslevel=6, mtime=0)
+        return _response_cache["etag"], _response_cache["body"], _response_cache["gzip"]
+
+
+# ─────────────────────────────────────────────────────────────────
+# PREFETCH SCHEDULE
+# ─────────────────────────────────────────────────────────────────
+#
+#   ┌───────────────────────────────────────────────────────────────┐
+#   │  WARM FIRST PAINT, ONLY WHEN IT MATTERS                       │
+#   │                                                               │
+#   │  OLD: container stopped by scraper-cleanup.sh → first open    │
+#   │       pays container start + browser launch + scrape          │
+#   │                                                               │
+#   │  NEW: PREFETCH_SCHEDULE="mon-fri 07:00-09:00"                 │
+#   │                                                               │
+#   │   06:55 ─ cleanup.sh sees PREFETCH_FILE window → docker start │
+#   │   07:00 ─ stamp activity = 09:00, refresh before stale ─┐     │
+#   │   07:12 ─ dashboard opens → cache fresh → reply (ms)    │     │
+#   │   09:00 ─ window closes, loop sleeps until next window ─┘     │
+#   │   09:30 ─ cleanup.sh: idle 30 min past stamp → docker stop    │
+#   │                                                               │
+#   │  Outside windows the loop is one sleeping coroutine: 0 CPU.   │
+#   └───────────────────────────────────────────────────────────────┘
+
+_WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def parse_prefetch_schedule(spec):
+    """"mon-fri 07:00-09:00; sun 09:00-10:00" → [(weekday set, start min, end min)].
+
+    Days: names, ranges and commas, or omitted for every day. Windows may not
+    cross midnight (split them instead). Raises ValueError on bad input.
+    """
+    windows = []
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        fields = part.split()
+        if len(fields) == 1:
+            days, hours = set(range(7)), fields[0]
+        elif len(fields) == 2:
+            days, hours = set(), fields[1]
+            for item in fields[0].lower().split(","):
+                first, _, last = item.partition("-")
+                if first not in _WEEKDAYS or (last and last not in _WEEKDAYS):
+                    raise ValueError(f"unknown day in {item!r} (mon..sun)")
+                start_day = _WEEKDAYS.index(first)
+                end_day = _WEEKDAYS.index(last) if last else start_day
+                days.update(d % 7 for d in range(start_day, start_day + (end_day - start_day) % 7 + 1))
+        else:
+            raise ValueError(f"bad prefetch window {part!r}")
+        start, _, end = hours.partition("-")
+        minutes = []
+        for hhmm in (start, end):
+            hh, mm = hhmm.split(":")
+            minutes.append(int(hh) * 60 + int(mm))
+        if not 0 <= minutes[0] < minutes[1] <= 24 * 60:
+            raise ValueError(f"bad prefetch hours {hours!r} (start < end, same day)")
+        windows.append((days, minutes[0], minutes[1]))
+    return windows
+
+
+def next_prefetch_window(windows, now):
+    """(start, end) datetimes of the window containing `now`, else the next one; None if no windows."""
+    best = None
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(8):
+        day = midnight + timedelta(days=offset)
+        for days, start, end in windows:
+            if day.weekday() not in days:
+                continue
+            window = (day + timedelta(minutes=start), day + timedelta(minutes=end))
+            if window[1] > now and (best is None or window[0] < best[0]):
+                best = window
+        if best is not None:
+            return best
+    return None
+
+
+def _publish_prefetch_window(window):
+    """Tell scraper-cleanup.sh (host) when the container is next wanted."""
+    start, end = window
+    _request_stats["prefetch_window"] = {
+        "start": start.isoformat(), "end": end.isoformat(), "active": start <= datetime.now(),
+    }
+    try:
+        with open(PREFETCH_FILE, "w") as f:
+            f.write(f"{start.timestamp():.0f} {end.timestamp():.0f}\n")
+    except Exception as e:
+        log(f"Failed to write prefetch file: {e}")
+
+
+def _prefetch_due_at(key):
+    """Epoch when `key` needs its next prefetch refresh."""
+    attempted = _prefetch_attempts.get(key, 0.0)
+    if _cache_state(key) != "fresh":
+        return attempted + PREFETCH_INTERVAL  # aged out or board ran short
+    return max(_cache[key]["timestamp"] + CACHE_TTL - PREFETCH_LEAD, attempted + PREFETCH_INTERVAL)
+
+
+async def _prefetch_loop(windows):
+    """Sleep until the next window, keep the cache fresh through it, repeat (loop thread)."""
+    while True:
+        window = next_prefetch_window(windows, datetime.now())
+        if window is None:
+            return
+        _publish_prefetch_window(window)
+        start, end = window
+        wait = (start - datetime.now()).total_seconds()
+        if wait > 0:
+            log(f"Prefetch: next window {start:%a %H:%M}-{end:%H:%M}")
+            await asyncio.sleep(min(wait, 3600))  # re-check hourly (DST, clock steps)
+            continue
+
+        log(f"Prefetch: window open until {end:%H:%M}")
+        hold_activity_until(end.timestamp())
+        while datetime.now() < end:
+            now = time.time()
+            due = [key for key in SOURCES if _prefetch_due_at(key) <= now]
+            for key in due:
+                _prefetch_attempts[key] = now
+                _request_stats["prefetch_refreshes"] += 1
+            if due:
+                await asyncio.gather(*(_start_refresh(key) for key in due), return_exceptions=True)
+                continue
+            next_due = min(_prefetch_due_at(key) for key in SOURCES)
+            # Wake at least every PREFETCH_INTERVAL: departures leaving can shorten a board early
+            wait = min(next_due - now, PREFETCH_INTERVAL, (end - datetime.now()).total_seconds())
+            await asyncio.sleep(max(1.0, wait))
+        log("Prefetch: window closed")
+
+
+def start_prefetch():
+    """Start the prefetch loop on the scraper loop (no-op without a schedule)."""
+    windows = parse_prefetch_schedule(PREFETCH_SCHEDULE)
+    if not windows:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(PREFETCH_FILE)  # no stale window for scraper-cleanup.sh
+        return
+    asyncio.run_coroutine_threadsafe(_prefetch_loop(windows), _get_event_loop())
 
 
 # ─────────────────────────────────────────────────────────────────
 # HTTP SERVER
 # ─────────────────────────────────────────────────────────────────
 
+def _parse_etags(header):
+    """Entity tags listed in an If-None-Match header (weak W/ prefix ignored)."""
+    if header.strip() == "*":
+        return {"*"}
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+def _accepts_gzip(header):
+    """True if Accept-Encoding allows gzip (q=0 means refused)."""
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
 class Handler(BaseHTTPRequestHandler):
     def log_message(self, *args):
         pass
@@ -866,26 +2158,68 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
 
+    def send_representation(self, etag, body, gzip_body):
+        """Send pre-serialized JSON: 304 on matching If-None-Match, gzip if accepted."""
+        if etag in _parse_etags(self.headers.get("If-None-Match", "")):
+            with _stats_lock:
+                _request_stats["not_modified"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        if _accepts_gzip(self.headers.get("Accept-Encoding", "")):
+            body = gzip_body
+            encoding = "gzip"
+        else:
+            encoding = None
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        # no-cache = store, but revalidate every time → ETag round trip, 304 if unchanged
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_GET(self):
         if self.path == "/api/transport":
-            _request_stats["total"] += 1
-            result = fetch_transport()
-            # Include request stats in response for dashboard visibility
-            result["stats"] = {
-                "total_requests": _request_stats["total"],
-                "scrapes": _request_stats["scrapes"],
-                "hafas_fallbacks": _request_stats["hafas_fallbacks"],
-                "started": _request_stats["started"],
-            }
+            with _stats_lock:
+                _request_stats["total"] += 1
             # Update activity timestamp for cleanup service
             update_activity()
-            self.send_json(result)
+            try:
+                etag, body, gzip_body = fetch_transport()
+            except Exception as e:
+                log(f"ERROR: transport fetch failed: {e!r}")
+                self.send_json({
+                    "sbahn": [],
+                    "bus": [],
+                    "updated": None,
+                    "error": str(e) or type(e).__name__,
+                    "fallback": FALLBACK,
+                    "source": None,
+                })
+                return
+            self.send_representation(etag, body, gzip_body)
         elif self.path == "/api/health":
             # Health check doesn't start browser
+            try:
+                self.send_json(health_snapshot())
+            except Exception as e:
+                self.send_json({"status": "error", "error": str(e) or type(e).__name__}, 503)
+        elif self.path == "/api/profile":
+            with _profile_lock:
+                scrapes = list(_scrape_profiles)
             self.send_json({
-                "status": "ok",
-                "browser_active": _browser is not None,
-                "stats": _request_stats,
+                "history": PROFILE_HISTORY,
+                "summary": profile_summary(),
+                "scrapes": scrapes,
             })
         else:
             self.send_json({"error": "not found"}, 404)
@@ -893,15 +2227,37 @@ class Handler(BaseHTTPRequestHandler):
 
 def main():
     """Start server - browser will launch fresh for each request."""
+    if SOURCE_STRATEGY not in ("scrape-first", "hafas-first"):
+        raise SystemExit(f"Invalid SOURCE_STRATEGY={SOURCE_STRATEGY!r} (scrape-first | hafas-first)")
+    if BROWSER_MODE not in ("cold", "warm"):
+        raise SystemExit(f"Invalid BROWSER_MODE={BROWSER_MODE!r} (cold | warm)")
+    try:
+        parse_prefetch_schedule(PREFETCH_SCHEDULE)
+    except ValueError as e:
+        raise SystemExit(f"Invalid PREFETCH_SCHEDULE={PREFETCH_SCHEDULE!r}: {e}")
     # Auto-reap zombie child processes (Python as PID 1 doesn't do this by default)
     signal.signal(signal.SIGCHLD, signal.SIG_IGN)
 
     _request_stats["started"] = datetime.now().isoformat()
     log(f"Starting transport scraper on port {PORT}")
-    log(f"Architecture: Launch → Scrape → Kill (browser killed after each request)")
-    log(f"Cache TTL: {CACHE_TTL}s | Activity file: {ACTIVITY_FILE}")
+    if BROWSER_MODE == "warm":
+        log(f"Architecture: bounded warm browser (lifetime {BROWSER_MAX_LIFETIME}s, "
+            f"{BROWSER_MAX_SCRAPES} scrapes, idle {BROWSER_IDLE_TIMEOUT}s, "
+            f"idle CPU limit {BROWSER_IDLE_CPU_LIMIT} cores)")
+    else:
+        log(f"Architecture: Launch → Scrape → Kill (browser killed after each request)")
+    log(f"Source strategy: {SOURCE_STRATEGY}"
+        + (f" (enrichment scrape every {ENRICH_INTERVAL}s)" if SOURCE_STRATEGY == "hafas-first" else ""))
+    log(f"Cache TTL: {CACHE_TTL}s (serve stale up to {CACHE_MAX_STALE}s) | Activity file: {ACTIVITY_FILE}")
     log(f"URLs: Bus={BUS_URL[:50]}... | S-Bahn={SBAHN_URL[:50]}...")
-    HTTPServer(("0.0.0.0", PORT), Handler).serve_forever()
+    if FIXTURE_CAPTURE_DIR:
+        log(f"Fixture capture ON: {FIXTURE_CAPTURE_DIR}")
+    log(f"Prefetch: {PREFETCH_SCHEDULE} every {PREFETCH_INTERVAL}s" if PREFETCH_SCHEDULE else "Prefetch: off")
+    _get_event_loop()
+    start_prefetch()
+    server = ThreadingHTTPServer(("0.0.0.0", PORT), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
 
 
 if __name__ == "__main__":
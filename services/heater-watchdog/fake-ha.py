@@ -0,0 +1,354 @@
+"""Fake Home Assistant REST API for offline heater-watchdog testing.
+
+Serves the subset of HA's REST API the watchdog uses, driven by a scripted
+scenario file (see scenarios/*.json). No real HA, TRVs or network needed.
+
+Usage:
+    python fake-ha.py --scenario scenarios/window-open-while-heating.json
+    python fake-ha.py --scenario scenarios/trv-stuck-idle.json --port 8124 --speed 60
+
+Then point the watchdog at it:
+    HA_URL=http://localhost:8123 HA_TOKEN=fake CHECK_INTERVAL=5 python heater-watchdog.py
+
+Endpoints (same paths as HA):
+    GET  /api/                      - API running message
+    GET  /api/states                - all entity states (bulk snapshot)
+    GET  /api/states/<entity_id>    - one entity
+    POST /api/services/<d>/<s>      - service call (climate, input_*, mqtt, notify)
+    GET  /fake/status               - JSON with sim time, request counts, service log
+
+Scenario file format:
+    {
+      "name": "...", "description": "...",
+      "duration": 3600,                      # sim seconds (used by replay-bench.py)
+      "check_interval": 300,                 # watchdog CHECK_INTERVAL for the replay
+      "adaptive_interval": true,             # optional: override ADAPTIVE_INTERVAL
+      "initial": {"climate.bed_thermostat": {"current_temperature": 15, "stuck": true}},
+      "events": [{"at": 600, "entity_id": "binary_sensor.x", "state": "on"}],
+      "faults": [{"from": 0, "to": 900, "status": 502}, {"latency": 5.0}],
+      "reaction": {"from": 600, "until": "all_off", "max": 400}
+    }
+
+TRV model: hvac_action = "off" in off mode, "heating" while current < setpoint,
+else "idle". A TRV with "stuck": true reports "idle" in heat mode until it is
+unstuck by a service call named in "unstick_on" (default: set_hvac_mode, i.e.
+the Phase 2 off/heat cycle).
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Entity IDs come from the watchdog itself (single source of truth)
+_spec = importlib.util.spec_from_file_location(
+    "heater_watchdog", os.path.join(os.path.dirname(os.path.abspath(__file__)), "heater-watchdog.py")
+)
+watchdog = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(watchdog)
+
+SIM_EPOCH = datetime(2026, 1, 15, 6, 0, 0, tzinfo=timezone.utc).timestamp()
+
+
+class SimClock:
+    """Simulated wall clock.
+
+    manual=True: only advances when told to (replay-bench.py jumps ahead).
+    manual=False: follows real time scaled by speed (standalone server).
+    """
+
+    def __init__(self, manual=True, speed=1.0):
+        self.manual = manual
+        self.speed = speed
+        self._offset = 0.0
+        self._real_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """Sim seconds since scenario start."""
+        if self.manual:
+            with self._lock:
+                return self._offset
+        return (time.monotonic() - self._real_start) * self.speed
+
+    def now(self):
+        return SIM_EPOCH + self.elapsed()
+
+    def advance(self, seconds):
+        """Move the clock forward (simulated sleep / HA latency)."""
+        if seconds <= 0:
+            return
+        if self.manual:
+            with self._lock:
+                self._offset += seconds
+        else:
+            time.sleep(seconds / self.speed)
+
+    def advance_to(self, elapsed):
+        """Move the clock to `elapsed` unless it is already past it."""
+        if self.manual:
+            with self._lock:
+                self._offset = max(self._offset, elapsed)
+        else:
+            self.advance(elapsed - self.elapsed())
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class FakeHA:
+    """Entity state store + scenario timeline + fault injection."""
+
+    def __init__(self, scenario, clock):
+        self.scenario = scenario
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.states = {}  # {entity_id: {"state", "attributes", "last_changed"}}
+        self.trv = {}  # {entity_id: {"stuck": bool, "unstick_on": str}}
+        self.events = sorted(scenario.get("events", []), key=lambda e: e["at"])
+        self.faults = scenario.get("faults", [])
+        self.request_count = 0
+        self.fault_count = 0
+        self.service_log = []  # [(elapsed, "domain.service", data)]
+        self._build_initial_states()
+
+    # ─── State model ───
+
+    def _set(self, entity_id, state, attributes=None):
+        old = self.states.get(entity_id)
+        changed = old is None or old["state"] != state
+        self.states[entity_id] = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": attributes if attributes is not None else (old or {}).get("attributes", {}),
+            "last_changed": _iso(self.clock.now()) if changed else old["last_changed"],
+        }
+
+    def _build_initial_states(self):
+        overrides = self.scenario.get("initial", {})
+        now = self.clock.now()
+        for sensor in watchdog.WINDOW_SENSORS + watchdog.DOOR_SENSORS:
+            self._set(sensor, overrides.get(sensor, {}).get("state", "off"))
+        for flag in (watchdog.GUARD_FLAG_ENTITY, watchdog.CO2_GUARD_FLAG):
+            self._set(flag, overrides.get(flag, {}).get("state", "off"))
+
+        for thermostat in watchdog.THERMOSTATS:
+            cfg = {"state": "heat", "temperature": 20.0, "current_temperature": 20.5}
+            cfg.update(overrides.get(thermostat, {}))
+            self.trv[thermostat] = {
+                "stuck": cfg.pop("stuck", False),
+                "unstick_on": cfg.pop("unstick_on", "set_hvac_mode"),
+            }
+            mode = cfg.pop("state")
+            self._set(thermostat, mode, cfg)
+            self._refresh_hvac_action(thermostat)
+
+            bool_entity, number_entity = watchdog.THERMOSTAT_HELPERS[thermostat]
+            self._set(bool_entity, overrides.get(bool_entity, {}).get("state", "off"))
+            self._set(number_entity, str(overrides.get(number_entity, {}).get("state", 18.0)))
+            ext_entity = watchdog.EXTERNAL_TEMP_ENTITIES[thermostat]
+            self._set(ext_entity, str(overrides.get(ext_entity, {}).get("state", 0)))
+            volt_entity = watchdog.VALVE_VOLTAGE_ENTITIES[thermostat]
+            self._set(volt_entity, str(overrides.get(volt_entity, {}).get("state", 2050)))
+
+        # Anything else listed in "initial" (extra sensors etc.)
+        for entity_id, cfg in overrides.items():
+            if entity_id not in self.states:
+                self._set(entity_id, str(cfg.get("state", "unknown")), cfg.get("attributes", {}))
+
+        # Pretend everything has been in its state for an hour
+        for state in self.states.values():
+            state["last_changed"] = _iso(now - 3600)
+
+    def _refresh_hvac_action(self, thermostat):
+        state = self.states[thermostat]
+        attrs = dict(state["attributes"])
+        if state["state"] == "off":
+            action = "off"
+        elif self.trv[thermostat]["stuck"]:
+            action = "idle"
+        else:
+            action = "heating" if attrs["current_temperature"] < attrs["temperature"] else "idle"
+        attrs["hvac_action"] = action
+        state["attributes"] = attrs
+
+    # ─── Timeline ───
+
+    def next_event_at(self):
+        """Sim elapsed time of the next pending scripted event (None if done)."""
+        with self.lock:
+            return self.events[0]["at"] if self.events else None
+
+    def tick(self):
+        """Apply all scripted events that are due."""
+        with self.lock:
+            elapsed = self.clock.elapsed()
+            while self.events and self.events[0]["at"] <= elapsed:
+                event = self.events.pop(0)
+                entity_id = event["entity_id"]
+                current = self.states.get(entity_id, {"state": "unknown", "attributes": {}})
+                attrs = dict(current["attributes"])
+                attrs.update(event.get("attributes", {}))
+                self._set(entity_id, event.get("state", current["state"]), attrs)
+                if entity_id in self.trv:
+                    if "stuck" in event:
+                        self.trv[entity_id]["stuck"] = event["stuck"]
+                    self._refresh_hvac_action(entity_id)
+
+    def _active_fault(self):
+        elapsed = self.clock.elapsed()
+        for fault in self.faults:
+            if fault.get("from", 0) <= elapsed < fault.get("to", float("inf")):
+                every = fault.get("every", 1)
+                if self.request_count % every == 0:
+                    return fault
+        return None
+
+    # ─── Request handling ───
+
+    def handle(self, method, path, body):
+        """Returns (status, payload_dict)."""
+        arrived = self.clock.elapsed()
+        with self.lock:
+            self.request_count += 1
+            fault = self._active_fault()
+        if fault and fault.get("latency"):
+            # advance_to, not advance: parallel requests overlap instead of adding up
+            self.clock.advance_to(arrived + fault["latency"])
+        if fault and fault.get("status"):
+            with self.lock:
+                self.fault_count += 1
+            return fault["status"], {"message": "Injected fault"}
+
+        self.tick()
+        with self.lock:
+            if path in ("/api/", "/api"):
+                return 200, {"message": "API running."}
+            if path == "/api/states" and method == "GET":
+                return 200, list(self.states.values())
+            if path.startswith("/api/states/") and method == "GET":
+                state = self.states.get(path[len("/api/states/"):])
+                return (200, state) if state else (404, {"message": "Entity not found."})
+            if path.startswith("/api/services/") and method == "POST":
+                domain, service = path[len("/api/services/"):].split("/", 1)
+                self._call_service(domain, service, json.loads(body or b"{}"))
+                return 200, []
+            if path == "/fake/status":
+                return 200, self.status_json()
+        return 404, {"message": "Not found"}
+
+    def _call_service(self, domain, service, data):
+        self.service_log.append((self.clock.elapsed(), f"{domain}.{service}", data))
+        entity_ids = data.get("entity_id", [])
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        for entity_id in entity_ids:
+            if entity_id not in self.states:
+                continue
+            attrs = dict(self.states[entity_id]["attributes"])
+            if domain == "climate" and entity_id in self.trv:
+                if service == "set_hvac_mode":
+                    self._set(entity_id, data["hvac_mode"], attrs)
+                elif service == "set_temperature":
+                    attrs["temperature"] = float(data["temperature"])
+                    self._set(entity_id, self.states[entity_id]["state"], attrs)
+                if self.trv[entity_id]["unstick_on"] == service and self.states[entity_id]["state"] == "heat":
+                    self.trv[entity_id]["stuck"] = False
+                self._refresh_hvac_action(entity_id)
+            elif domain == "input_boolean":
+                self._set(entity_id, "on" if service == "turn_on" else "off", attrs)
+            elif domain == "input_number" and service == "set_value":
+                self._set(entity_id, str(float(data["value"])), attrs)
+
+    def notifications(self):
+        return [entry for entry in self.service_log if entry[1].startswith("notify.")]
+
+    def status_json(self):
+        return {
+            "scenario": self.scenario.get("name"),
+            "sim_time": _iso(self.clock.now()),
+            "elapsed": round(self.clock.elapsed(), 1),
+            "requests": self.request_count,
+            "faults_injected": self.fault_count,
+            "pending_events": len(self.events),
+            "service_calls": [
+                {"at": round(at, 1), "service": service, "data": data}
+                for at, service, data in self.service_log
+            ],
+        }
+
+
+def make_handler(fake):
+    """HTTP handler bound to one FakeHA instance (keep-alive, like HA)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = 65536  # headers + body in one send
+        disable_nagle_algorithm = True
+
+        def _dispatch(self, method):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+            status, payload = fake.handle(method, self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass  # polls every cycle — too noisy
+
+    return Handler
+
+
+def start_server(fake, port=0):
+    """Start a FakeHA server in a daemon thread. Returns the server (server_port = bound port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_scenario(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Home Assistant REST API for heater-watchdog")
+    parser.add_argument("--scenario", required=True, help="Scenario JSON file")
+    parser.add_argument("--port", type=int, default=8123, help="Port to serve on (default: 8123)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Sim seconds per real second (default: 1)")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    fake = FakeHA(scenario, SimClock(manual=False, speed=args.speed))
+
+    print(f"Fake HA: scenario '{scenario.get('name')}' at {args.speed}x on http://localhost:{args.port}/api/")
+    print(f"  {scenario.get('description', '')}")
+    print(f"  Status: http://localhost:{args.port}/fake/status")
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(fake))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
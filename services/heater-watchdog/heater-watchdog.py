@@ -17,13 +17,29 @@ WHY NOT JUST USE HA AUTOMATIONS?
   4. Runs outside HA container (survives HA restarts)
 """
 
+import base64
+import bisect
+import hashlib
+import heapq
+import http.client
 import json
+import math
+import operator
 import os
+import random
+import select
+import socket
+import sqlite3
+import struct
+import threading
 import time
-import urllib.request
+import urllib.parse
 import urllib.error
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 # =============================================================================
 # CONFIGURATION
@@ -36,6 +52,13 @@ HA_TOKEN = os.environ.get("HA_TOKEN", "")  # REQUIRED: Long-lived access token
 # Check interval (seconds)
 CHECK_INTERVAL = int(os.environ.get("CHECK_INTERVAL", 300))  # 5 minutes
 
+# Adaptive interval: faster while risk is high, back off when everything is off
+# (see ADAPTIVE CHECK INTERVAL). The bounds widen to include CHECK_INTERVAL, so
+# a short CHECK_INTERVAL (testing) is never stretched to the floor.
+ADAPTIVE_INTERVAL = os.environ.get("ADAPTIVE_INTERVAL", "1").lower() in ("1", "true", "yes")
+CHECK_INTERVAL_MIN = int(os.environ.get("CHECK_INTERVAL_MIN", 60))  # floor: contact open
+CHECK_INTERVAL_MAX = int(os.environ.get("CHECK_INTERVAL_MAX", 900))  # ceiling: all TRVs off
+
 # Notification service in Home Assistant
 NOTIFY_SERVICE = os.environ.get("NOTIFY_SERVICE", "notify.mobile_app_22111317pg")
 
@@ -60,6 +83,15 @@ DOOR_SENSORS = [
 # NOTE: With 5-min poll interval, worst-case response time = CHECK_INTERVAL + DOOR_OPEN_DELAY
 DOOR_OPEN_DELAY = int(os.environ.get("DOOR_OPEN_DELAY", 120))  # Default: 2 minutes
 
+# Event-driven mode: subscribe to state_changed over HA's WebSocket API and
+# evaluate the violation rule within ~1s of a change. The poll loop keeps
+# running every CHECK_INTERVAL as a consistency sweep.
+EVENT_MODE = os.environ.get("EVENT_MODE", "0").lower() in ("1", "true", "yes")
+EVENT_VIOLATION_COOLDOWN = 60  # s — let TRVs report "off" before re-firing on events
+EVENT_RECONNECT_MAX = 300  # s — cap for WebSocket reconnect backoff
+EVENT_PING_INTERVAL = 30  # s of silence before we ping HA over the WebSocket
+EVENT_PONG_TIMEOUT = 10  # s to wait for the pong before treating the link as dead
+
 # Friendly names for logging
 CONTACT_NAMES = {
     "binary_sensor.bath_window_contact_sensor_contact": "Bathroom Window",
@@ -271,35 +303,480 @@ def log_banner():
     )
 
 
+# =============================================================================
+# METRICS (Prometheus text exposition)
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  GET http://<pi>:METRICS_PORT/metrics — alert on a slow or stalled     │
+# │  watchdog instead of grepping the journal.                             │
+# │                                                                         │
+# │  watchdog_check_duration_seconds{check}       histogram per check     │
+# │  watchdog_cycle_duration_seconds              whole safety check      │
+# │  watchdog_ha_requests_total{endpoint,status}  from the HA client      │
+# │  watchdog_ha_request_duration_seconds{endpoint} histogram             │
+# │  watchdog_violations_total{source}            poll | event            │
+# │  watchdog_recoveries_total{phase}             phase1/phase2/failed/…  │
+# │  watchdog_rate_limit_hits_total{check}                                 │
+# │  watchdog_last_successful_cycle_age_seconds   stalled-loop alarm      │
+# │                                                                         │
+# │  Stdlib-only registry + exporter thread. METRICS_PORT=0 disables it.  │
+# └─────────────────────────────────────────────────────────────────────────┘
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9110))
+
+CHECK_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_HELP = {
+    "watchdog_check_duration_seconds": ("histogram", "Duration of each individual check"),
+    "watchdog_cycle_duration_seconds": ("histogram", "Duration of a full safety check cycle"),
+    "watchdog_checks_total": ("counter", "Safety check cycles run, by result"),
+    "watchdog_violations_total": ("counter", "Window+heating violations acted on, by detection path"),
+    "watchdog_recoveries_total": ("counter", "Stuck-idle recovery outcomes, by phase"),
+    "watchdog_rate_limit_hits_total": ("counter", "Actions skipped by a rate limit or cooldown"),
+}
+
+_metrics_lock = threading.Lock()
+_metric_counters = defaultdict(float)  # {(name, labels): value}
+_metric_histograms = {}  # {(name, labels): {"buckets": [...], "sum": float, "count": int}}
+_last_successful_cycle = None  # time.time() of last cycle that completed without error
+
+
+def metric_inc(name, labels=(), value=1):
+    """Increment a counter. labels: tuple of (key, value) pairs."""
+    with _metrics_lock:
+        _metric_counters[(name, labels)] += value
+
+
+def metric_observe(name, seconds, labels=()):
+    """Record one observation in a histogram."""
+    with _metrics_lock:
+        hist = _metric_histograms.setdefault(
+            (name, labels), {"buckets": [0] * len(CHECK_DURATION_BUCKETS), "sum": 0.0, "count": 0}
+        )
+        for i, bound in enumerate(CHECK_DURATION_BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+
+def timed_check(check, fn, *args):
+    """Run one check and record its duration under watchdog_check_duration_seconds{check}."""
+    start = time.monotonic()
+    try:
+        return fn(*args)
+    finally:
+        metric_observe("watchdog_check_duration_seconds", time.monotonic() - start, (("check", check),))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def render_metrics():
+    """Render all metrics in Prometheus text format 0.0.4."""
+    lines = []
+    with _metrics_lock:
+        counters = dict(_metric_counters)
+        histograms = {k: dict(v, buckets=list(v["buckets"])) for k, v in _metric_histograms.items()}
+
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            continue
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(CHECK_DURATION_BUCKETS, hist["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+    # HA client stats (kept by ha_request for the Stats block as well)
+    with _ha_stats_lock:
+        lines.append("# HELP watchdog_ha_requests_total Home Assistant API requests, by endpoint and status")
+        lines.append("# TYPE watchdog_ha_requests_total counter")
+        for (endpoint, status), count in sorted(_ha_status_counts.items(), key=str):
+            labels = (("endpoint", endpoint), ("status", status))
+            lines.append(f"watchdog_ha_requests_total{_format_labels(labels)} {count}")
+        lines.append("# HELP watchdog_ha_request_duration_seconds Home Assistant API request latency incl. retries")
+        lines.append("# TYPE watchdog_ha_request_duration_seconds histogram")
+        for endpoint, stats in sorted(_ha_stats.items()):
+            running = 0
+            for bound, count in zip(HA_LATENCY_BUCKETS_MS, stats["buckets"]):
+                running += count
+                labels = (("endpoint", endpoint), ("le", f"{bound / 1000:g}"))
+                lines.append(f"watchdog_ha_request_duration_seconds_bucket{_format_labels(labels)} {running}")
+            labels = (("endpoint", endpoint),)
+            lines.append(
+                f"watchdog_ha_request_duration_seconds_bucket{_format_labels(labels + (('le', '+Inf'),))} {stats['count']}"
+            )
+            lines.append(f"watchdog_ha_request_duration_seconds_sum{_format_labels(labels)} {stats['total_ms'] / 1000:.6f}")
+            lines.append(f"watchdog_ha_request_duration_seconds_count{_format_labels(labels)} {stats['count']}")
+
+    lines.append("# HELP watchdog_last_successful_cycle_age_seconds Seconds since the last error-free safety check")
+    lines.append("# TYPE watchdog_last_successful_cycle_age_seconds gauge")
+    if _last_successful_cycle is not None:
+        lines.append(f"watchdog_last_successful_cycle_age_seconds {time.time() - _last_successful_cycle:.1f}")
+    lines.append("# HELP watchdog_valve_days_to_threshold Forecast days until valve voltage crosses the absolute minimum")
+    lines.append("# TYPE watchdog_valve_days_to_threshold gauge")
+    now = time.time()
+    for entity_id in VALVE_VOLTAGE_ENTITIES:
+        trend = valve_voltage_trend(entity_id, now)
+        if trend and trend["days_to_threshold"] is not None:
+            labels = (("trv", THERMOSTAT_NAMES.get(entity_id, entity_id)),)
+            lines.append(f"watchdog_valve_days_to_threshold{_format_labels(labels)} {trend['days_to_threshold']}")
+    lines.append("# HELP watchdog_check_interval_seconds Interval chosen for the next safety check")
+    lines.append("# TYPE watchdog_check_interval_seconds gauge")
+    lines.append(f"watchdog_check_interval_seconds {_current_interval}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/metrics":
+            body = render_metrics().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif url.path == "/valve-history":
+            query = urllib.parse.parse_qs(url.query)
+            try:
+                days = min(max(int(query.get("days", ["30"])[0]), 1), 366)
+            except ValueError:
+                self.send_error(400, "days must be an integer")
+                return
+            body = json.dumps(valve_history_json(days)).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")  # dashboard is served from another port
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scraped every 15-60s — too noisy for the audit log
+
+
+def start_metrics_server():
+    """Serve /metrics from a daemon thread. Returns the server or None."""
+    if not METRICS_PORT:
+        return None
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), _MetricsHandler)
+    except OSError as e:
+        log(f"Metrics endpoint disabled: cannot bind port {METRICS_PORT}: {e}", "WARN")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
 # =============================================================================
 # HOME ASSISTANT API
 # =============================================================================
 
 
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  POOLED KEEP-ALIVE CLIENT                                              │
+# │                                                                         │
+# │  Old: urllib.request.urlopen per call → new TCP connection every time, │
+# │  one 30s timeout covering connect + read, no retries.                  │
+# │                                                                         │
+# │  New: idle http.client connections are kept in a small pool and        │
+# │  reused (HA keeps them alive). Connect and read timeouts are separate. │
+# │  HA's aiohttp server drops idle keep-alives after ~75s, so a socket    │
+# │  idle longer than HA_POOL_IDLE_MAX is closed instead of reused.        │
+# │                                                                         │
+# │  Dead pooled socket (reset / disconnect before ANY response byte):     │
+# │  HA never saw the request → resend at once on a NEW connection, any   │
+# │  method, no backoff, not counted as a retry (also when degraded).     │
+# │  Other transient failures retry with exponential backoff + jitter:     │
+# │    - GET: connection errors, timeouts, 502/503/504                     │
+# │    - POST: never — not after a timeout (HA got the call and is still  │
+# │      running it) and not once HA answered — a duplicate               │
+# │      turn_off/notification is worse than a failure.                   │
+# │  Every call is capped at HA_CALL_BUDGET s including retries, and while │
+# │  the cycle's bulk /api/states failed (HA degraded) GETs don't retry,  │
+# │  so the per-entity fallback can't multiply the wait.                   │
+# │                                                                         │
+# │  Errors surface as urllib.error.HTTPError / URLError like before, so   │
+# │  callers and log lines are unchanged.                                  │
+# └─────────────────────────────────────────────────────────────────────────┘
+HA_CONNECT_TIMEOUT = 5  # s — HA on the same host, connect should be instant
+HA_READ_TIMEOUT = 30  # s — /api/states can be slow while HA is busy
+HA_MAX_RETRIES = 2  # extra attempts after the first
+HA_RETRY_BACKOFF = 0.5  # s — base delay, doubled per attempt, plus jitter
+HA_POOL_SIZE = 8  # max idle connections kept (shutoff fan-out runs in parallel)
+HA_POOL_IDLE_MAX = 30  # s — discard pooled sockets idle longer (HA closes them at ~75s)
+HA_RETRY_STATUSES = (502, 503, 504)
+HA_CALL_BUDGET = 40  # s — max wall time of one ha_request, all attempts + backoff
+# Errors meaning a pooled socket was already dead (safe to resend a POST if
+# raised before any response byte; socket.timeout is deliberately NOT here)
+HA_STALE_SOCKET_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+# Latency histogram bucket upper bounds (ms), last bucket = +Inf
+HA_LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_ha_url = urllib.parse.urlparse(HA_URL)
+_ha_pool = []  # idle (http.client connection, monotonic last-used time)
+_ha_pool_lock = threading.Lock()
+_ha_stats_lock = threading.Lock()
+_ha_stats = {}  # {endpoint_key: {"count", "errors", "retries", "total_ms", "buckets"}}
+_ha_status_counts = defaultdict(int)  # {(endpoint_key, status_code or "conn_error"): count}
+_ha_conn_stats = {"opened": 0, "reused": 0}
+_ha_degraded = False  # bulk state fetch failed this cycle → GETs make one attempt
+
+
+def _ha_endpoint_key(endpoint):
+    """Group endpoints for stats: states/<entity> → states/{entity_id}."""
+    if endpoint.startswith("states/"):
+        return "states/{entity_id}"
+    return endpoint or "/"
+
+
+def _ha_record(endpoint, status, elapsed_ms, retries):
+    """Record one finished request (success or final failure)."""
+    key = _ha_endpoint_key(endpoint)
+    with _ha_stats_lock:
+        stats = _ha_stats.setdefault(
+            key,
+            {"count": 0, "errors": 0, "retries": 0, "total_ms": 0.0,
+             "buckets": [0] * (len(HA_LATENCY_BUCKETS_MS) + 1)},
+        )
+        stats["count"] += 1
+        stats["retries"] += retries
+        stats["total_ms"] += elapsed_ms
+        if not isinstance(status, int) or status >= 400:
+            stats["errors"] += 1
+        bucket = len(HA_LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(HA_LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                bucket = i
+                break
+        stats["buckets"][bucket] += 1
+        _ha_status_counts[(key, status)] += 1
+
+
+def _ha_percentile_bound(buckets, fraction):
+    """Upper bucket bound (ms) containing the given fraction of requests."""
+    total = sum(buckets)
+    target = total * fraction
+    running = 0
+    for i, count in enumerate(buckets):
+        running += count
+        if running >= target and count:
+            return HA_LATENCY_BUCKETS_MS[i] if i < len(HA_LATENCY_BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+def ha_stats_lines():
+    """Per-endpoint request counts and latency for the periodic Stats block."""
+    lines = [
+        f"HA connections: {_ha_conn_stats['opened']} opened, {_ha_conn_stats['reused']} reused (keep-alive)"
+    ]
+    with _ha_stats_lock:
+        for key in sorted(_ha_stats):
+            stats = _ha_stats[key]
+            avg = stats["total_ms"] / stats["count"] if stats["count"] else 0
+            p50 = _ha_percentile_bound(stats["buckets"], 0.50)
+            p95 = _ha_percentile_bound(stats["buckets"], 0.95)
+            lines.append(
+                f"HA {key}: {stats['count']} req | {stats['errors']} err | {stats['retries']} retries | "
+                f"avg {avg:.0f}ms | p50<={p50:.0f}ms | p95<={p95:.0f}ms"
+            )
+    return lines
+
+
+def _ha_get_connection(fresh=False):
+    """Take an idle pooled connection or open a new one. Returns (conn, reused).
+
+    Pooled sockets idle longer than HA_POOL_IDLE_MAX are closed, not reused.
+    fresh=True skips the pool entirely.
+    """
+    conn = None
+    with _ha_pool_lock:
+        cutoff = time.monotonic() - HA_POOL_IDLE_MAX
+        expired = [pooled for pooled, last_used in _ha_pool if last_used < cutoff]
+        _ha_pool[:] = [entry for entry in _ha_pool if entry[1] >= cutoff]
+        if _ha_pool and not fresh:
+            _ha_conn_stats["reused"] += 1
+            conn = _ha_pool.pop()[0]  # most recently used
+    for pooled in expired:
+        pooled.close()
+    if conn is not None:
+        return conn, True
+
+    conn_cls = http.client.HTTPSConnection if _ha_url.scheme == "https" else http.client.HTTPConnection
+    conn = conn_cls(_ha_url.hostname, _ha_url.port, timeout=HA_CONNECT_TIMEOUT)
+    conn.connect()
+    conn.sock.settimeout(HA_READ_TIMEOUT)
+    with _ha_pool_lock:
+        _ha_conn_stats["opened"] += 1
+    return conn, False
+
+
+def _ha_release_connection(conn, reusable):
+    """Return a connection to the pool (stamped with its last-used time), or close it."""
+    if reusable:
+        with _ha_pool_lock:
+            if len(_ha_pool) < HA_POOL_SIZE:
+                _ha_pool.append((conn, time.monotonic()))
+                return
+    conn.close()
+
+
 def ha_request(endpoint, method="GET", data=None):
-    """Make authenticated request to Home Assistant API."""
+    """Make authenticated request to Home Assistant API (pooled, with retries)."""
     url = f"{HA_URL}/api/{endpoint}"
+    path = f"{_ha_url.path.rstrip('/')}/api/{endpoint}"
     headers = {
         "Authorization": f"Bearer {HA_TOKEN}",
         "Content-Type": "application/json",
     }
-
     body = json.dumps(data).encode() if data else None
-    req = urllib.request.Request(url, data=body, headers=headers, method=method)
+    max_retries = 0 if method == "GET" and _ha_degraded else HA_MAX_RETRIES
+
+    started = time.monotonic()
+    deadline = started + HA_CALL_BUDGET
+    attempt = 0
+    fresh = False  # set once a pooled socket turned out dead → bypass the pool
+    while True:
+        conn = None
+        reused = False
+        responded = False
+        try:
+            conn, reused = _ha_get_connection(fresh)
+            conn.sock.settimeout(max(0.1, min(HA_READ_TIMEOUT, deadline - time.monotonic())))
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            responded = True
+            payload = resp.read()
+            _ha_release_connection(conn, not resp.will_close)
+            conn = None
+
+            if resp.status >= 400:
+                if method == "GET" and resp.status in HA_RETRY_STATUSES and attempt < max_retries:
+                    raise _RetryableStatus(resp.status)
+                _ha_record(endpoint, resp.status, (time.monotonic() - started) * 1000, attempt)
+                log(f"HTTP error {resp.status}: {resp.reason}", "ERROR")
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+
+            _ha_record(endpoint, resp.status, (time.monotonic() - started) * 1000, attempt)
+            return json.loads(payload) if payload else {}
+
+        except urllib.error.HTTPError:
+            raise
+        except _RetryableStatus as e:
+            reason = f"HTTP {e.status}"
+        except (http.client.HTTPException, OSError) as e:
+            if conn is not None:
+                conn.close()
+            # Only a pooled socket the server had already closed is known to have
+            # failed before HA saw the request → the one case a POST may be resent.
+            # Resend at once on a new connection: no backoff, not a retry.
+            if reused and not responded and isinstance(e, HA_STALE_SOCKET_ERRORS):
+                if time.monotonic() < deadline:
+                    fresh = True
+                    continue
+            if attempt >= max_retries or method != "GET":
+                _ha_record(endpoint, "conn_error", (time.monotonic() - started) * 1000, attempt)
+                log(f"URL error: {e}", "ERROR")
+                raise urllib.error.URLError(e) from e
+            reason = f"{type(e).__name__}: {e}"
+
+        attempt += 1
+        delay = HA_RETRY_BACKOFF * (2 ** (attempt - 1)) + random.uniform(0, HA_RETRY_BACKOFF)
+        if time.monotonic() + delay >= deadline:
+            _ha_record(endpoint, "conn_error", (time.monotonic() - started) * 1000, attempt - 1)
+            log(f"HA {method} {endpoint or '/'} failed ({reason}) — call budget {HA_CALL_BUDGET}s spent", "ERROR")
+            raise urllib.error.URLError(reason)
+        log(f"HA {method} {endpoint or '/'} failed ({reason}) — retry {attempt}/{max_retries} in {delay:.1f}s", "WARN")
+        time.sleep(delay)
 
+
+class _RetryableStatus(Exception):
+    """Internal: retryable HTTP status on an idempotent request."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+# =============================================================================
+# PER-CYCLE STATE SNAPSHOT
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  One GET /api/states per safety check instead of one GET per entity.   │
+# │                                                                         │
+# │  Before: windows (6) + doors (2) + thermostats (4) + ghost temp (8)   │
+# │          + stuck-idle (4) + guard flags + valve voltages (4) + ...     │
+# │          → dozens of serial round trips to HA every cycle             │
+# │  After:  1 bulk request, indexed by entity_id, served to every check  │
+# │                                                                         │
+# │  Snapshot lives for ONE cycle only (cleared in perform_safety_check). │
+# │  Post-action verification (did the TRV actually start heating?)       │
+# │  must bypass it → get_entity_state(entity_id, fresh=True).            │
+# │  If the bulk fetch fails we fall back to per-entity requests.         │
+# └─────────────────────────────────────────────────────────────────────────┘
+_state_snapshot = None  # {entity_id: state_dict} while a cycle is running
+
+
+def take_state_snapshot():
+    """Fetch all entity states in one request and index them by entity_id.
+
+    Returns: number of entities in the snapshot (0 if bulk fetch failed)
+    """
+    global _state_snapshot, _ha_degraded
+    _ha_degraded = False
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return json.loads(resp.read())
-    except urllib.error.HTTPError as e:
-        log(f"HTTP error {e.code}: {e.reason}", "ERROR")
-        raise
-    except urllib.error.URLError as e:
-        log(f"URL error: {e.reason}", "ERROR")
-        raise
-
-
-def get_entity_state(entity_id):
-    """Get current state of an entity."""
+        states = ha_request("states")
+        _state_snapshot = {s["entity_id"]: s for s in states if "entity_id" in s}
+        return len(_state_snapshot)
+    except Exception as e:
+        log(f"Bulk state fetch failed: {e} — falling back to per-entity requests (no retries)", "WARN")
+        _state_snapshot = None
+        _ha_degraded = True  # already retried once this cycle; don't retry per entity
+        return 0
+
+
+def clear_state_snapshot():
+    """Drop the per-cycle snapshot so stale state never leaks into the next cycle."""
+    global _state_snapshot, _ha_degraded
+    _state_snapshot = None
+    _ha_degraded = False
+
+
+def invalidate_snapshot_entity(entity_id):
+    """Drop one entity from the snapshot after we changed it via a service call.
+
+    Later checks in the same cycle then re-read it from HA instead of
+    acting on pre-action state.
+    """
+    if _state_snapshot is not None:
+        _state_snapshot.pop(entity_id, None)
+
+
+def get_entity_state(entity_id, fresh=False):
+    """Get current state of an entity.
+
+    Served from the per-cycle snapshot when one is active. Pass fresh=True
+    to always go to HA (post-action verification).
+    """
+    if not fresh and _state_snapshot is not None:
+        state = _state_snapshot.get(entity_id)
+        if state is not None:
+            return state
     return ha_request(f"states/{entity_id}")
 
 
@@ -335,48 +812,42 @@ def call_service(domain, service, data=None):
 # =============================================================================
 
 
-def save_heater_states():
+def build_save_calls(thermostat_states):
     """
-    Save current state of all thermostats in heat mode to input helpers.
-    This is BEST EFFORT - failures don't block safety action.
-    Returns: (success_count, fail_count)
-    """
-    success = 0
-    fail = 0
-
-    for thermostat in THERMOSTATS:
-        try:
-            state = get_entity_state(thermostat)
-            attrs = state.get("attributes", {})
-            hvac_mode = state.get("state")  # 'heat', 'off', etc.
-            setpoint = attrs.get("temperature", 18)
-
-            # Only save if heater was in heat mode
-            if hvac_mode == "heat":
-                bool_entity, number_entity = THERMOSTAT_HELPERS[thermostat]
-                name = THERMOSTAT_NAMES.get(thermostat, thermostat)
-
-                # Save "was on" state
-                call_service(
-                    "input_boolean",
-                    "turn_on",
-                    {"entity_id": bool_entity},
-                )
+    Build the service calls that save every thermostat in heat mode to its
+    input helpers. This is BEST EFFORT - failures don't block safety action.
 
-                # Save setpoint
-                call_service(
-                    "input_number",
-                    "set_value",
-                    {"entity_id": number_entity, "value": float(setpoint)},
-                )
-
-                log(f"  Saved state: {name} (setpoint={setpoint}°C)", "INFO")
-                success += 1
-        except Exception as e:
-            fail += 1
-            log(f"  Failed to save state for {thermostat}: {e}", "WARN")
+    Args:
+        thermostat_states: {entity_id: state_dict} captured BEFORE shutoff
 
-    return success, fail
+    Returns: list of (label, domain, service, data)
+    """
+    calls = []
+    for thermostat, state in thermostat_states.items():
+        attrs = state.get("attributes", {})
+        hvac_mode = state.get("state")  # 'heat', 'off', etc.
+        setpoint = attrs.get("temperature", 18)
+
+        # Only save if heater was in heat mode
+        if hvac_mode != "heat":
+            continue
+        bool_entity, number_entity = THERMOSTAT_HELPERS[thermostat]
+        name = THERMOSTAT_NAMES.get(thermostat, thermostat)
+
+        # Save "was on" state
+        calls.append(
+            (f"save {name} was_on", "input_boolean", "turn_on", {"entity_id": bool_entity})
+        )
+        # Save setpoint
+        calls.append(
+            (
+                f"save {name} setpoint={setpoint}°C",
+                "input_number",
+                "set_value",
+                {"entity_id": number_entity, "value": float(setpoint)},
+            )
+        )
+    return calls
 
 
 def set_guard_flag(value, max_retries=3):
@@ -530,7 +1001,7 @@ def send_notification(title, message, importance="max"):
 # │    Phase 2: off → heat → MQTT reset → setpoint (aggressive)           │
 # └─────────────────────────────────────────────────────────────────────────┘
 
-# In-memory tracking (reset on container restart — acceptable for Layer 2/3)
+# In-memory tracking (survives restarts via STATE_DB — see TRACKER PERSISTENCE)
 stuck_idle_tracker = {}  # {entity_id: first_seen_timestamp}
 anomalous_setpoint_tracker = defaultdict(list)  # {entity_id: [correction_timestamps]}
 recovery_tracker = defaultdict(list)  # {entity_id: [timestamp, ...]}
@@ -575,13 +1046,40 @@ def publish_mqtt_via_ha(topic, payload):
         return False
 
 
-def recover_stuck_idle_thermostat(entity_id):
-    """Two-phase recovery for a stuck-idle thermostat.
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  NON-BLOCKING RECOVERY STATE MACHINE                                   │
+# │                                                                         │
+# │  Old: time.sleep(60) + 2× time.sleep(5) inside the main loop → window  │
+# │  safety frozen for 70s per stuck TRV (several TRVs > CHECK_INTERVAL).  │
+# │                                                                         │
+# │  New: one job per thermostat, each step has a deadline. The main loop  │
+# │  wakes for the earliest deadline and advances due jobs, then goes back │
+# │  to sleep — safety checks keep running, TRVs recover in parallel.     │
+# │                                                                         │
+# │  phase1_pending ──60s──► verify ──heating──► done (phase1)            │
+# │   (MQTT reset +           │                                            │
+# │    setpoint sent)         └──still idle──► phase2 (off)               │
+# │                                              ──5s──► heat + MQTT reset │
+# │                                              ──5s──► setpoint          │
+# │                                              ──────► done (phase2)     │
+# │                                                                         │
+# │  A violation (or active guard flag before Phase 2) aborts the job —   │
+# │  recovery must never switch a TRV back to heat with a window open.    │
+# └─────────────────────────────────────────────────────────────────────────┘
+RECOVERY_PHASE1_WAIT = 60  # s — let the gentle reset take effect before verifying
+RECOVERY_PHASE2_STEP = 5  # s — between off → heat → setpoint
+
+active_recoveries = {}  # {entity_id: job dict} — see start_stuck_idle_recovery()
+
+
+def start_stuck_idle_recovery(entity_id, context):
+    """Send Phase 1 (gentle) and schedule verification.
 
     Phase 1: Reset open_window flag + re-poke setpoint (gentle)
     Phase 2: Full off/heat cycle (aggressive, only if Phase 1 fails)
 
-    Returns: 'phase1' | 'phase2' | 'failed'
+    Args:
+        context: dict with current_temp, setpoint, duration, tier_name (for the notification)
     """
     name = THERMOSTAT_NAMES.get(entity_id, entity_id)
     mqtt_topic = THERMOSTAT_MQTT_TOPICS.get(entity_id)
@@ -610,65 +1108,146 @@ def recover_stuck_idle_thermostat(entity_id):
     except Exception as e:
         log(f"  Phase 1 setpoint re-poke failed for {name}: {e}", "WARN")
 
-    # Wait for Phase 1 to take effect
-    log(f"  Waiting 60s for Phase 1 to take effect on {name}...", "INFO")
-    time.sleep(60)
+    invalidate_snapshot_entity(entity_id)
 
-    # Re-check — if HA unreachable, don't blindly escalate to Phase 2
-    try:
-        state = get_entity_state(entity_id)
-        attrs = state.get("attributes", {})
-        if attrs.get("hvac_action") != "idle":
-            recovery_tracker[entity_id].append(time.time())
-            log(f"  Phase 1 SUCCESS: {name} is now {attrs.get('hvac_action')}", "INFO")
-            return "phase1"
-    except Exception as e:
-        log(f"  Phase 1 re-check failed for {name}: {e} — skipping Phase 2 (can't confirm state)", "WARN")
-        recovery_tracker[entity_id].append(time.time())
-        return "phase1"  # Assume Phase 1 worked rather than escalate blindly
+    active_recoveries[entity_id] = {
+        "phase": "phase1_pending",
+        "due": time.monotonic() + RECOVERY_PHASE1_WAIT,
+        "setpoint": setpoint,
+        "context": context,
+    }
+    log(f"  Phase 1 sent for {name} — verifying in {RECOVERY_PHASE1_WAIT}s (non-blocking)", "INFO")
 
-    # ─── Phase 2: Aggressive (off → heat → MQTT reset → setpoint) ───
-    log(f"  Phase 2 (aggressive): Off→heat cycle for {name}", "WARN")
 
-    try:
-        # Off
-        call_service(
-            "climate",
-            "set_hvac_mode",
-            {"entity_id": entity_id, "hvac_mode": "off"},
-        )
-        time.sleep(5)
+def _advance_recovery(entity_id, job):
+    """Run the next step of one recovery job. Returns 'phase1' | 'phase2' | 'failed' when done, else None."""
+    name = THERMOSTAT_NAMES.get(entity_id, entity_id)
+    mqtt_topic = THERMOSTAT_MQTT_TOPICS.get(entity_id)
+    setpoint = job["setpoint"]
 
-        # Heat
-        call_service(
-            "climate",
-            "set_hvac_mode",
-            {"entity_id": entity_id, "hvac_mode": "heat"},
-        )
+    if job["phase"] == "phase1_pending":
+        job["phase"] = "verify"
 
-        # Reset open_window flag (TRVZB sets this when mode=off)
-        if mqtt_topic:
-            if not publish_mqtt_via_ha(mqtt_topic, json.dumps({"open_window": "OFF"})):
-                log(f"  WARNING: MQTT reset failed for {name} in Phase 2", "WARN")
-        time.sleep(5)
+    if job["phase"] == "verify":
+        # Re-check — if HA unreachable, don't blindly escalate to Phase 2
+        # (fresh=True: any snapshot predates the Phase 1 actions)
+        try:
+            state = get_entity_state(entity_id, fresh=True)
+            attrs = state.get("attributes", {})
+            if attrs.get("hvac_action") != "idle":
+                log(f"  Phase 1 SUCCESS: {name} is now {attrs.get('hvac_action')}", "INFO")
+                return "phase1"
+        except Exception as e:
+            log(f"  Phase 1 re-check failed for {name}: {e} — skipping Phase 2 (can't confirm state)", "WARN")
+            return "phase1"  # Assume Phase 1 worked rather than escalate blindly
 
-        # Restore setpoint
-        call_service(
-            "climate",
-            "set_temperature",
-            {"entity_id": entity_id, "temperature": setpoint},
-        )
+        # Window may have opened during the wait — never cycle to heat then
+        if is_guard_flag_active():
+            log(f"  Phase 2 aborted for {name}: guard flag active", "WARN")
+            return "failed"
 
-        # Track recovery for rate limiting
-        recovery_tracker[entity_id].append(time.time())
+        # ─── Phase 2: Aggressive (off → heat → MQTT reset → setpoint) ───
+        log(f"  Phase 2 (aggressive): Off→heat cycle for {name}", "WARN")
+        job["phase"] = "phase2"
+        job["step"] = 0
 
-        log(f"  Phase 2 complete for {name} (setpoint={setpoint}°C)", "INFO")
-        return "phase2"
+    try:
+        if job["step"] == 0:
+            # Off
+            call_service(
+                "climate",
+                "set_hvac_mode",
+                {"entity_id": entity_id, "hvac_mode": "off"},
+            )
+        elif job["step"] == 1:
+            # Heat
+            call_service(
+                "climate",
+                "set_hvac_mode",
+                {"entity_id": entity_id, "hvac_mode": "heat"},
+            )
 
+            # Reset open_window flag (TRVZB sets this when mode=off)
+            if mqtt_topic:
+                if not publish_mqtt_via_ha(mqtt_topic, json.dumps({"open_window": "OFF"})):
+                    log(f"  WARNING: MQTT reset failed for {name} in Phase 2", "WARN")
+        else:
+            # Restore setpoint
+            call_service(
+                "climate",
+                "set_temperature",
+                {"entity_id": entity_id, "temperature": setpoint},
+            )
+            log(f"  Phase 2 complete for {name} (setpoint={setpoint}°C)", "INFO")
+            return "phase2"
     except Exception as e:
         log(f"  Phase 2 FAILED for {name}: {e}", "ERROR")
         return "failed"
 
+    job["step"] += 1
+    job["due"] = time.monotonic() + RECOVERY_PHASE2_STEP
+    return None
+
+
+def _finish_recovery(entity_id, job, result):
+    """Record the outcome of a finished recovery job and notify."""
+    name = THERMOSTAT_NAMES.get(entity_id, entity_id)
+    ctx = job["context"]
+    metric_inc("watchdog_recoveries_total", (("phase", result),))
+
+    if result in ("phase1", "phase2"):
+        # Track recovery for rate limiting
+        recovery_tracker[entity_id].append(time.time())
+        stuck_idle_tracker.pop(entity_id, None)
+        phase_desc = "MQTT reset" if result == "phase1" else "off/heat cycle"
+        send_notification(
+            title=f"WATCHDOG: Stuck-Idle Recovery ({name})",
+            message=(
+                f"Recovered {name} via {phase_desc}.\n"
+                f"Was: {ctx['current_temp']}°C (target {ctx['setpoint']}°C)\n"
+                f"Stuck for {ctx['duration'] / 60:.0f} minutes.\n"
+                f"Tier: {ctx['tier_name']}"
+            ),
+            importance="high",
+        )
+    else:
+        log(f"  Recovery FAILED for {name} — will retry next cycle", "ERROR")
+
+
+def advance_recoveries():
+    """Advance every recovery job whose deadline has passed (called from the main loop)."""
+    now = time.monotonic()
+    for entity_id in [eid for eid, job in active_recoveries.items() if job["due"] <= now]:
+        # Serialized with handle_violation(): a violation aborts jobs mid-flight
+        with _violation_lock:
+            job = active_recoveries.get(entity_id)
+            if job is None:
+                continue
+            try:
+                result = _advance_recovery(entity_id, job)
+            except Exception as e:
+                log(f"Error advancing recovery for {entity_id}: {e}", "WARN")
+                result = "failed"
+            if result is None:
+                continue
+            del active_recoveries[entity_id]
+        _finish_recovery(entity_id, job, result)
+
+
+def next_recovery_due():
+    """Monotonic deadline of the earliest pending recovery step (None if idle)."""
+    if not active_recoveries:
+        return None
+    return min(job["due"] for job in active_recoveries.values())
+
+
+def abort_recoveries(reason):
+    """Drop all in-flight recoveries (caller holds _violation_lock)."""
+    for entity_id in list(active_recoveries):
+        log(f"  Recovery aborted for {THERMOSTAT_NAMES.get(entity_id, entity_id)}: {reason}", "WARN")
+        metric_inc("watchdog_recoveries_total", (("phase", "aborted"),))
+        del active_recoveries[entity_id]
+
 
 def check_stuck_idle():
     """Check for and recover stuck-idle thermostats (Layer 2 backup).
@@ -708,6 +1287,10 @@ def check_stuck_idle():
             current_temp = attrs.get("current_temperature")
             name = THERMOSTAT_NAMES.get(entity_id, entity_id)
 
+            # Recovery already in flight — main loop advances it
+            if entity_id in active_recoveries:
+                continue
+
             # ─── Fix 5: Only clear tracker when TRV actually recovers ───
             # NOT when deficit drops (ambient warming masks the real problem)
             if entity_id in stuck_idle_tracker:
@@ -753,6 +1336,7 @@ def check_stuck_idle():
             log(f"  Stuck-idle {tier_name}: {name}", "WARN")
 
             if not can_recover(entity_id):
+                metric_inc("watchdog_rate_limit_hits_total", (("check", "stuck_idle"),))
                 log(
                     f"  Rate limit hit for {name} "
                     f"({STUCK_IDLE_MAX_RECOVERIES} recoveries/hour) — skipping",
@@ -760,24 +1344,16 @@ def check_stuck_idle():
                 )
                 continue
 
-            # Attempt recovery
-            result = recover_stuck_idle_thermostat(entity_id)
-
-            if result in ("phase1", "phase2"):
-                stuck_idle_tracker.pop(entity_id, None)
-                phase_desc = "MQTT reset" if result == "phase1" else "off/heat cycle"
-                send_notification(
-                    title=f"WATCHDOG: Stuck-Idle Recovery ({name})",
-                    message=(
-                        f"Recovered {name} via {phase_desc}.\n"
-                        f"Was: {current_temp}°C (target {setpoint}°C)\n"
-                        f"Stuck for {duration / 60:.0f} minutes.\n"
-                        f"Tier: {tier_name}"
-                    ),
-                    importance="high",
-                )
-            else:
-                log(f"  Recovery FAILED for {name} — will retry next cycle", "ERROR")
+            # Attempt recovery (Phase 1 now, later steps from the main loop)
+            start_stuck_idle_recovery(
+                entity_id,
+                {
+                    "current_temp": current_temp,
+                    "setpoint": setpoint,
+                    "duration": duration,
+                    "tier_name": tier_name,
+                },
+            )
 
         except Exception as e:
             log(f"Error checking stuck-idle for {entity_id}: {e}", "WARN")
@@ -847,6 +1423,7 @@ def check_ghost_external_temps():
 
                 # Rate limit check
                 if not can_clear_ghost_temp(entity_id):
+                    metric_inc("watchdog_rate_limit_hits_total", (("check", "ghost_temp"),))
                     log(
                         f"  Rate limit hit for {name} "
                         f"({GHOST_TEMP_MAX_CLEARS} clears/hour) — automation may be re-setting it",
@@ -945,6 +1522,11 @@ def check_valve_voltages():
 
     now = time.time()
 
+    # Keep the reading (trend history) and warn days before a crossing
+    for entity_id, voltage in voltages.items():
+        record_valve_voltage(entity_id, voltage, now)
+    check_valve_forecasts(now)
+
     for entity_id, voltage in voltages.items():
         name = THERMOSTAT_NAMES.get(entity_id, entity_id)
         alerts = []
@@ -971,6 +1553,7 @@ def check_valve_voltages():
             # Rate limit: 12h cooldown per TRV
             last_alert = valve_voltage_alert_tracker.get(entity_id, 0)
             if now - last_alert < VALVE_VOLTAGE_ALERT_COOLDOWN:
+                metric_inc("watchdog_rate_limit_hits_total", (("check", "valve_voltage"),))
                 log(f"  Valve voltage alert suppressed for {name} (cooldown)", "INFO")
                 continue
 
@@ -994,6 +1577,219 @@ def check_valve_voltages():
             )
 
 
+# =============================================================================
+# VALVE VOLTAGE HISTORY & DEGRADATION FORECAST
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  check_valve_voltages() only sees today's reading — by the time a TRV  │
+# │  drops below 1550 mV the valve may already be stuck.                   │
+# │                                                                         │
+# │  STORE: one file per TRV, fixed 8-byte records <uint32 ts, float32 mV>│
+# │    1 sample/hour × 1 year = ~70 KB per TRV, append-only.               │
+# │    Compacted to the newest VALVE_HISTORY_CAPACITY records once it      │
+# │    grows 25% past that (tmp file + atomic rename). Torn tail dropped.  │
+# │    Loaded into array columns at startup — queries never touch disk.    │
+# │                                                                         │
+# │  FORECAST: least-squares line over the last 30 days                   │
+# │    mV(t) = a + b·t   →   days until mV(t) = VALVE_VOLTAGE_ABS_MIN      │
+# │    crossing within VALVE_FORECAST_ALERT_DAYS → early notification     │
+# │                                                                         │
+# │       2070 ─●●●●●─●                                                    │
+# │              ●●─●●─●●                                                  │
+# │                    ●─●●─●·····                                         │
+# │       1550 ───────────────────·····X  ← predicted crossing            │
+# │                                                                         │
+# │  Dashboard: GET :METRICS_PORT/valve-history?days=30 (JSON, CORS)      │
+# └─────────────────────────────────────────────────────────────────────────┘
+VALVE_HISTORY_DIR = os.environ.get("VALVE_HISTORY_DIR", "/data/valve-history")
+VALVE_HISTORY_SAMPLE_INTERVAL = 3600  # seconds — voltage drifts over weeks, hourly is plenty
+VALVE_HISTORY_CAPACITY = 24 * 365  # records kept per TRV (1 year hourly)
+VALVE_TREND_WINDOW_DAYS = 30  # fit the trend over this much history
+VALVE_TREND_MIN_SAMPLES = 48  # don't forecast from a handful of readings
+VALVE_TREND_MIN_SPAN_DAYS = 7  # ...or from less than a week of data
+VALVE_FORECAST_ALERT_DAYS = 14  # alert if the crossing is predicted within this many days
+VALVE_FORECAST_ALERT_COOLDOWN = 3600 * 24  # one forecast alert per TRV per day
+
+_VALVE_RECORD = struct.Struct("<If")
+_valve_history = {}  # {entity_id: (array("d") timestamps, array("f") millivolts)}
+# Main loop appends/compacts; the dashboard server thread reads. Readers must
+# copy their slice under the lock or they can see the two arrays mid-update.
+_valve_history_lock = threading.Lock()
+_valve_history_on_disk = False
+valve_forecast_alert_tracker = {}  # {entity_id: last_alert_timestamp}
+
+
+def _valve_history_path(entity_id):
+    return os.path.join(VALVE_HISTORY_DIR, f"{entity_id}.bin")
+
+
+def load_valve_history():
+    """Load per-TRV history files into memory. Returns total sample count."""
+    global _valve_history_on_disk
+    try:
+        os.makedirs(VALVE_HISTORY_DIR, exist_ok=True)
+        _valve_history_on_disk = True
+    except OSError as e:
+        log(f"Valve history dir unavailable ({VALVE_HISTORY_DIR}): {e} — in-memory only", "WARN")
+
+    total = 0
+    for entity_id in VALVE_VOLTAGE_ENTITIES:
+        timestamps, millivolts = array("d"), array("f")
+        if _valve_history_on_disk:
+            path = _valve_history_path(entity_id)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                usable = len(data) - len(data) % _VALVE_RECORD.size
+                if usable != len(data):
+                    # Torn write from a crash — drop the partial record
+                    with open(path, "r+b") as f:
+                        f.truncate(usable)
+                for ts, mv in _VALVE_RECORD.iter_unpack(data[:usable]):
+                    timestamps.append(ts)
+                    millivolts.append(mv)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log(f"  Cannot read valve history for {entity_id}: {e}", "WARN")
+        del timestamps[:-VALVE_HISTORY_CAPACITY]
+        del millivolts[:-VALVE_HISTORY_CAPACITY]
+        _valve_history[entity_id] = (timestamps, millivolts)
+        total += len(timestamps)
+    return total
+
+
+def record_valve_voltage(entity_id, voltage, now):
+    """Append a reading if the last stored sample is older than the sample interval."""
+    with _valve_history_lock:
+        timestamps, millivolts = _valve_history.setdefault(entity_id, (array("d"), array("f")))
+        if timestamps and now - timestamps[-1] < VALVE_HISTORY_SAMPLE_INTERVAL:
+            return
+        timestamps.append(int(now))
+        millivolts.append(voltage)
+        compact = len(timestamps) > VALVE_HISTORY_CAPACITY * 1.25
+        if compact:
+            del timestamps[:-VALVE_HISTORY_CAPACITY]
+            del millivolts[:-VALVE_HISTORY_CAPACITY]
+
+    # File I/O outside the lock — this thread is the only writer
+    _write_valve_history(entity_id, rewrite=compact)
+
+
+def _write_valve_history(entity_id, rewrite):
+    """Append the newest record, or rewrite the whole (compacted) file atomically."""
+    if not _valve_history_on_disk:
+        return
+    timestamps, millivolts = _valve_history[entity_id]
+    path = _valve_history_path(entity_id)
+    try:
+        if rewrite:
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(b"".join(_VALVE_RECORD.pack(int(ts), mv) for ts, mv in zip(timestamps, millivolts)))
+            os.replace(tmp, path)
+        else:
+            with open(path, "ab") as f:
+                f.write(_VALVE_RECORD.pack(int(timestamps[-1]), millivolts[-1]))
+    except OSError as e:
+        log(f"Failed to write valve history for {entity_id}: {e}", "WARN")
+
+
+def _valve_history_window(entity_id, since):
+    """Consistent (timestamps, millivolts) copies of the samples newer than `since`."""
+    with _valve_history_lock:
+        timestamps, millivolts = _valve_history.get(entity_id, ((), ()))
+        start = bisect.bisect_left(timestamps, since)
+        return timestamps[start:], millivolts[start:]
+
+
+def valve_voltage_trend(entity_id, now):
+    """Least-squares trend over the last VALVE_TREND_WINDOW_DAYS.
+
+    Returns dict (slope_mv_per_day, fitted_mv, days_to_threshold, samples),
+    or None if there isn't enough history to say anything.
+    """
+    timestamps, millivolts = _valve_history_window(entity_id, now - VALVE_TREND_WINDOW_DAYS * 86400)
+    xs = [(ts - now) / 86400 for ts in timestamps]  # days, 0 = now
+    ys = millivolts
+    n = len(xs)
+    if n < VALVE_TREND_MIN_SAMPLES or xs[-1] - xs[0] < VALVE_TREND_MIN_SPAN_DAYS:
+        return None
+
+    sum_x, sum_y = math.fsum(xs), math.fsum(ys)
+    sum_xx = math.fsum(map(operator.mul, xs, xs))
+    sum_xy = math.fsum(map(operator.mul, xs, ys))
+    denom = n * sum_xx - sum_x * sum_x
+    if denom == 0:
+        return None
+    slope = (n * sum_xy - sum_x * sum_y) / denom  # mV per day
+    fitted = (sum_y - slope * sum_x) / n  # intercept at x=0 → fitted value now
+
+    days_to_threshold = None
+    if fitted <= VALVE_VOLTAGE_ABS_MIN:
+        days_to_threshold = 0.0
+    elif slope < 0:
+        days_to_threshold = (fitted - VALVE_VOLTAGE_ABS_MIN) / -slope
+    return {
+        "slope_mv_per_day": round(slope, 2),
+        "fitted_mv": round(fitted, 1),
+        "days_to_threshold": None if days_to_threshold is None else round(days_to_threshold, 1),
+        "samples": n,
+    }
+
+
+def check_valve_forecasts(now):
+    """Alert when a TRV's trend predicts crossing VALVE_VOLTAGE_ABS_MIN soon."""
+    for entity_id in VALVE_VOLTAGE_ENTITIES:
+        trend = valve_voltage_trend(entity_id, now)
+        if not trend or trend["days_to_threshold"] is None:
+            continue
+        days = trend["days_to_threshold"]
+        # Already below: check_valve_voltages() alerts on the absolute floor itself
+        if days <= 0 or days > VALVE_FORECAST_ALERT_DAYS:
+            continue
+
+        name = THERMOSTAT_NAMES.get(entity_id, entity_id)
+        if now - valve_forecast_alert_tracker.get(entity_id, 0) < VALVE_FORECAST_ALERT_COOLDOWN:
+            metric_inc("watchdog_rate_limit_hits_total", (("check", "valve_forecast"),))
+            log(f"  Valve forecast alert suppressed for {name} (cooldown)", "INFO")
+            continue
+
+        valve_forecast_alert_tracker[entity_id] = now
+        log(
+            f"  VALVE VOLTAGE FORECAST: {name} trending {trend['slope_mv_per_day']:+.1f} mV/day "
+            f"(now ~{trend['fitted_mv']:.0f} mV) — crosses {VALVE_VOLTAGE_ABS_MIN} mV in ~{days:.0f} days",
+            "WARN",
+        )
+        send_notification(
+            title=f"WATCHDOG: Valve Degrading ({name})",
+            message=(
+                f"TRV {name} valve voltage is falling {-trend['slope_mv_per_day']:.1f} mV/day.\n"
+                f"Now ~{trend['fitted_mv']:.0f} mV, predicted below {VALVE_VOLTAGE_ABS_MIN} mV "
+                f"in ~{days:.0f} days ({trend['samples']} samples, {VALVE_TREND_WINDOW_DAYS}-day fit).\n"
+                f"Consider: replace battery or off/heat cycle before the valve sticks."
+            ),
+            importance="high",
+        )
+
+
+def valve_history_json(days=30, max_points=500):
+    """History + forecast per TRV for the dashboard (downsampled to ~max_points)."""
+    now = time.time()
+    trvs = {}
+    for entity_id in VALVE_VOLTAGE_ENTITIES:
+        timestamps, millivolts = _valve_history_window(entity_id, now - days * 86400)
+        step = max(1, len(timestamps) // max_points)
+        trvs[entity_id] = {
+            "name": THERMOSTAT_NAMES.get(entity_id, entity_id),
+            "samples": [
+                [int(timestamps[i]), round(millivolts[i], 1)] for i in range(0, len(timestamps), step)
+            ],
+            "forecast": valve_voltage_trend(entity_id, now),
+        }
+    return {"threshold_mv": VALVE_VOLTAGE_ABS_MIN, "days": days, "trvs": trvs}
+
+
 # =============================================================================
 # ANOMALOUS SETPOINT DETECTION (Layer 3 Backup)
 # =============================================================================
@@ -1048,6 +1844,7 @@ def check_anomalous_setpoints():
             )
 
             if not can_correct_anomalous_setpoint(entity_id):
+                metric_inc("watchdog_rate_limit_hits_total", (("check", "anomalous_setpoint"),))
                 log(
                     f"  Rate limit hit for {name} "
                     f"({ANOMALOUS_SETPOINT_MAX_CORRECTIONS}/hour) — skipping",
@@ -1107,56 +1904,210 @@ def check_anomalous_setpoints():
             log(f"Error checking anomalous setpoint for {entity_id}: {e}", "WARN")
 
 
-def perform_safety_check():
+# =============================================================================
+# EMERGENCY SHUTOFF FAN-OUT
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  Old: save (2 calls × N TRVs) → guard flag → turn off, all serial with  │
+# │  a 30s timeout each. Slow HA + 4 TRVs = heaters off tens of s late.    │
+# │                                                                         │
+# │  New: every call goes to a thread pool, running in parallel:          │
+# │                                                                         │
+# │    t=0  ┬─ read state of TRVs missing from snapshot / event mirror     │
+# │         │  (submitted BEFORE the off calls so it can't read a TRV      │
+# │         │  we already turned off as "was off"; ≤ STATE_SAVE_TIMEOUT)   │
+# │         ├─ off: Study ──┬─ off: Living Inner ─┬─ ...                   │
+# │         ├─ guard flag   │                     │                        │
+# │         └─ save: was_on / setpoint per heating TRV (once states known) │
+# │    wait for all, up to SHUTOFF_DEADLINE in total                       │
+# │                                                                         │
+# │  Any TRV whose off call failed → one serial bulk turn_off_all_heaters  │
+# │  retry (core safety action MUST succeed). Per-call results go into the │
+# │  notification; detection → all-off time is logged every violation.    │
+# └─────────────────────────────────────────────────────────────────────────┘
+SHUTOFF_DEADLINE = 20  # s — total budget for the whole fan-out
+
+_shutoff_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="shutoff")
+_violation_lock = threading.Lock()
+_last_violation_action = 0.0  # time.time() of last emergency shutoff (any path)
+_last_shutoff_done = None  # time.monotonic() when the last SUCCESSFUL shutoff finished
+
+
+def _timed_call(fn, *args):
+    """Run fn(*args) and return (result, monotonic completion time)."""
+    result = fn(*args)
+    return result, time.monotonic()
+
+
+def _submit_state_reads(thermostat_states):
+    """Start reading thermostat states not provided by the caller (snapshot first, HA in parallel).
+
+    Returns: {future: entity_id} for _collect_thermostat_states
     """
-    Main safety check logic with HYBRID APPROACH:
-    1. CORE SAFETY: Turn off heaters FIRST (must succeed)
-    2. BEST EFFORT: Try to save state (won't block safety action)
-    3. NOTIFICATION: Clearly indicate if manual intervention needed
+    missing = [t for t in THERMOSTATS if t not in (thermostat_states or {})]
+    return {_shutoff_executor.submit(get_entity_state, t): t for t in missing}
+
+
+def _collect_thermostat_states(thermostat_states, futures):
+    """Merge the reads started by _submit_state_reads into the caller's states."""
+    states = dict(thermostat_states or {})
+    if not futures:
+        return states
+    done, _ = wait(futures, timeout=STATE_SAVE_TIMEOUT)
+    for future in done:
+        try:
+            states[futures[future]] = future.result()
+        except Exception as e:
+            log(f"  Failed to read state for {futures[future]}: {e}", "WARN")
+    return states
+
+
+def emergency_shutoff(thermostat_states, detected_at):
+    """Issue turn-off, guard flag and state-save calls concurrently.
+
+    thermostat_states may be partial (no snapshot): the missing ones are read
+    from HA alongside the off calls, submitted just ahead of them.
+
+    Returns: dict with heaters_off, state_saved, guard_set, report (label → outcome),
+             off_latency (s from detection to all-off, None if not all off)
     """
-    log("=" * 60)
-    log("Performing safety check...")
+    deadline = time.monotonic() + SHUTOFF_DEADLINE
+    futures = {}  # future → (kind, label, entity_id)
 
-    # Step 1: Get open windows
-    open_windows = get_open_windows()
-    log(
-        f"Open windows/doors: {len(open_windows)} - {open_windows if open_windows else 'None'}"
-    )
+    # 0. Pre-shutoff state reads go out ahead of the off calls they overlap
+    state_reads = _submit_state_reads(thermostat_states)
 
-    # Step 2: Get heating thermostats
-    heating = get_heating_thermostats()
-    log(
-        f"Heaters actively heating: {len(heating)} - {heating if heating else 'None'}"
-    )
+    # 1. CORE SAFETY: one off call per thermostat: one off call per thermostat, in parallel
+    for thermostat in THERMOSTATS:
+        name = THERMOSTAT_NAMES.get(thermostat, thermostat)
+        future = _shutoff_executor.submit(
+            _timed_call,
+            call_service,
+            "climate",
+            "set_hvac_mode",
+            {"entity_id": thermostat, "hvac_mode": "off"},
+        )
+        futures[future] = ("off", f"off {name}", thermostat)
+
+    # 2. BEST EFFORT: guard flag (has its own retries)
+    futures[_shutoff_executor.submit(_timed_call, set_guard_flag, True)] = ("guard", "guard flag", None)
+
+    # 3. BEST EFFORT: save heater states (from pre-shutoff states)
+    thermostat_states = _collect_thermostat_states(thermostat_states, state_reads)
+    save_calls = build_save_calls(thermostat_states)
+    unreadable = [t for t in THERMOSTATS if t not in thermostat_states]
+    for label, domain, service, data in save_calls:
+        future = _shutoff_executor.submit(_timed_call, call_service, domain, service, data)
+        futures[future] = ("save", label, None)
+
+    done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+    report = {}
+    failed_off = []
+    off_completed_at = []
+    guard_set = False
+    save_fail = len(unreadable)
+    for future, (kind, label, entity_id) in futures.items():
+        if future in not_done:
+            report[label] = f"timeout (> {SHUTOFF_DEADLINE}s)"
+            ok = False
+        else:
+            try:
+                result, completed_at = future.result()
+                ok = result is not False  # set_guard_flag returns False on failure
+                report[label] = "ok" if ok else "failed"
+            except Exception as e:
+                ok = False
+                report[label] = f"error: {e}"
+        if kind == "off":
+            if ok:
+                off_completed_at.append(completed_at)
+            else:
+                failed_off.append(entity_id)
+        elif kind == "guard":
+            guard_set = ok
+        elif not ok:
+            save_fail += 1
+
+    for label in [f"save {THERMOSTAT_NAMES.get(t, t)}" for t in unreadable]:
+        report[label] = "state unreadable"
+
+    for label, outcome in report.items():
+        log(f"  {label}: {outcome}", "INFO" if outcome == "ok" else "WARN")
+
+    heaters_off = not failed_off
+    if failed_off:
+        log(f"  {len(failed_off)} per-thermostat off call(s) failed — retrying with bulk off", "ERROR")
+        heaters_off = turn_off_all_heaters()
+        if heaters_off:
+            off_completed_at.append(time.monotonic())
+
+    off_latency = None
+    if heaters_off and off_completed_at:
+        off_latency = max(off_completed_at) - detected_at
+
+    return {
+        "heaters_off": heaters_off,
+        "state_saved": save_fail == 0 and len(save_calls) > 0,
+        "guard_set": guard_set,
+        "report": report,
+        "off_latency": off_latency,
+    }
+
+
+def handle_violation(open_windows, heating, thermostat_states=None, detected_at=None):
+    """Emergency shutoff for a window+heating violation.
+
+    Shared by the poll loop and the event listener. Serialized through
+    _violation_lock so both paths never shut off concurrently.
+
+    Args:
+        thermostat_states: pre-shutoff {entity_id: state} if the caller has them
+                           (event mirror); otherwise read from snapshot / HA
+        detected_at: time.monotonic() when the violation was detected
+
+    Returns: True if this call acted (shutoff attempted — outcome is in the log
+             and notification), False if an earlier shutoff already covered it
+    """
+    global _last_violation_action, _last_shutoff_done
+    if detected_at is None:
+        detected_at = time.monotonic()
+
+    with _violation_lock:
+        # Queued behind the other path's shutoff: detected before that one
+        # finished → it saw the same heating, which is off now
+        if _last_shutoff_done is not None and detected_at <= _last_shutoff_done:
+            log("Violation already handled by the shutoff that just finished — skipping", "INFO")
+            return False
 
-    # Step 3: Check for violation
-    if open_windows and heating:
         # VIOLATION DETECTED
         log("!" * 60, "WARN")
         log("SAFETY VIOLATION: Windows open AND heaters running!", "WARN")
         log("!" * 60, "WARN")
 
+        # A pending Phase 2 would switch a TRV back to heat — cancel first
+        abort_recoveries("safety violation")
+
         # =================================================================
         # HYBRID APPROACH: Safety first, state save is best-effort
         # =================================================================
 
-        # 1. BEST EFFORT: Try to save heater states FIRST
-        #    (So we capture setpoints before they drop to 7°C)
-        log("Attempting to save heater states (best-effort)...", "INFO")
-        save_success, save_fail = save_heater_states()
-        state_saved = save_fail == 0 and save_success > 0
-
-        # 2. BEST EFFORT: Try to set guard flag
-        log("Attempting to set guard flag (best-effort)...", "INFO")
-        guard_set = set_guard_flag(True)
+        # State reads, turn-off calls and guard flag run in parallel; save follows the reads
+        log("CORE SAFETY: Turning off all heaters (parallel, state save best-effort)...", "WARN")
+        outcome = emergency_shutoff(thermostat_states, detected_at)
+        turn_off_result = outcome["heaters_off"]
+        state_saved = outcome["state_saved"]
+        guard_set = outcome["guard_set"]
 
-        # 3. CORE SAFETY: Turn off all heaters (MUST succeed)
-        log("CORE SAFETY: Turning off all heaters...", "WARN")
-        turn_off_result = turn_off_all_heaters()
+        if outcome["off_latency"] is not None:
+            log(f"Detection → all heaters off: {outcome['off_latency']:.2f}s", "INFO")
+        else:
+            log("Detection → all heaters off: NOT CONFIRMED", "ERROR")
 
-        # 4. Build notification message based on state save status
+        # Build notification message based on state save status
         open_list = ", ".join(open_windows)
         heating_list = ", ".join(heating)
+        failures = [f"{label}: {result}" for label, result in outcome["report"].items() if result != "ok"]
 
         if state_saved and guard_set:
             # Full success: state saved, will auto-resume
@@ -1179,6 +2130,13 @@ def perform_safety_check():
             )
             log("STATE SAVE FAILED - manual intervention required!", "WARN")
 
+        if not turn_off_result:
+            message = message.replace("All heaters turned off.", "❌ Heaters could NOT all be turned off!")
+        if outcome["off_latency"] is not None:
+            message += f"\nOff in {outcome['off_latency']:.1f}s."
+        if failures:
+            message += "\nFailed calls: " + "; ".join(failures)
+
         send_notification(
             title="WATCHDOG: Heaters Emergency Off",
             message=message,
@@ -1189,7 +2147,116 @@ def perform_safety_check():
             f"Action summary: heaters_off={turn_off_result}, state_saved={state_saved}, guard_set={guard_set}",
             "INFO",
         )
-        return "VIOLATION"
+        _last_violation_action = time.time()
+        if turn_off_result:
+            _last_shutoff_done = time.monotonic()
+        return True
+
+
+# =============================================================================
+# ADAPTIVE CHECK INTERVAL
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  Fixed 5 min: wasted calls in summer, too slow with a window open.    │
+# │  The next interval is picked from the snapshot the cycle just used:   │
+# │                                                                         │
+# │  Risk      │ Condition                           │ Next check          │
+# │  ──────────┼─────────────────────────────────────┼──────────────────── │
+# │  HIGH      │ any window/door open                │ floor (below)       │
+# │  ELEVATED  │ TRV heating / stuck-tracked /       │ CHECK_INTERVAL / 2  │
+# │            │ recovery in flight                  │                     │
+# │  NORMAL    │ anything else (or no snapshot)      │ CHECK_INTERVAL      │
+# │  IDLE      │ every thermostat "off"              │ ×1.5 per cycle, up  │
+# │            │                                     │ to ceiling (below)  │
+# │                                                                         │
+# │  floor   = min(CHECK_INTERVAL_MIN, CHECK_INTERVAL)                     │
+# │  ceiling = max(CHECK_INTERVAL_MAX, CHECK_INTERVAL)                     │
+# │  → the operator's CHECK_INTERVAL is never made longer, only shorter    │
+# │    while risk is high / longer while everything is off.                │
+# │  ADAPTIVE_INTERVAL=0 → always CHECK_INTERVAL (old behaviour).         │
+# └─────────────────────────────────────────────────────────────────────────┘
+IDLE_BACKOFF_FACTOR = 1.5
+CHECK_INTERVAL_FLOOR = min(CHECK_INTERVAL_MIN, CHECK_INTERVAL)
+CHECK_INTERVAL_CEILING = max(CHECK_INTERVAL_MAX, CHECK_INTERVAL)
+
+_current_interval = CHECK_INTERVAL  # last chosen interval (logs + metrics)
+
+
+def choose_check_interval(states, previous):
+    """Pick the next check interval from a state snapshot.
+
+    Args:
+        states: {entity_id: state_dict} from the cycle, or None if unavailable
+        previous: interval chosen last time (for idle back-off)
+
+    Returns: (interval_seconds, reason)
+    """
+    if not ADAPTIVE_INTERVAL:
+        return CHECK_INTERVAL, "fixed"
+    if states is None:
+        return CHECK_INTERVAL, "normal (no snapshot)"
+
+    def clamp(seconds):
+        return int(min(max(seconds, CHECK_INTERVAL_FLOOR), CHECK_INTERVAL_CEILING))
+
+    open_contacts = [
+        CONTACT_NAMES.get(c, c) for c in WINDOW_SENSORS + DOOR_SENSORS if states.get(c, {}).get("state") == "on"
+    ]
+    if open_contacts:
+        return CHECK_INTERVAL_FLOOR, f"high risk: open {', '.join(open_contacts)}"
+
+    climate = [states.get(t) for t in THERMOSTATS]
+    if any(s and s.get("attributes", {}).get("hvac_action") == "heating" for s in climate):
+        return clamp(CHECK_INTERVAL / 2), "elevated: heating"
+    if stuck_idle_tracker or active_recoveries:
+        return clamp(CHECK_INTERVAL / 2), "elevated: stuck-idle tracked"
+
+    if all(s and s.get("state") == "off" for s in climate):
+        return clamp(max(previous, CHECK_INTERVAL) * IDLE_BACKOFF_FACTOR), "idle: all thermostats off"
+    return clamp(CHECK_INTERVAL), "normal"
+
+
+def perform_safety_check():
+    """
+    Main safety check logic with HYBRID APPROACH:
+    1. CORE SAFETY: Turn off heaters FIRST (must succeed)
+    2. BEST EFFORT: Try to save state (won't block safety action)
+    3. NOTIFICATION: Clearly indicate if manual intervention needed
+    """
+    log("=" * 60)
+    log("Performing safety check...")
+
+    snapshot_size = take_state_snapshot()
+    if snapshot_size:
+        log(f"State snapshot: {snapshot_size} entities (1 request)")
+    global _current_interval
+    try:
+        return _run_safety_checks()
+    finally:
+        _current_interval, reason = choose_check_interval(_state_snapshot, _current_interval)
+        log(f"Next check in {_current_interval}s ({reason})")
+        clear_state_snapshot()
+
+
+def _run_safety_checks():
+    """Evaluate all checks against the current state snapshot."""
+    # Step 1: Get open windows
+    open_windows = timed_check("window", get_open_windows)
+    log(
+        f"Open windows/doors: {len(open_windows)} - {open_windows if open_windows else 'None'}"
+    )
+
+    # Step 2: Get heating thermostats
+    heating = timed_check("heating", get_heating_thermostats)
+    log(
+        f"Heaters actively heating: {len(heating)} - {heating if heating else 'None'}"
+    )
+
+    # Step 3: Check for violation
+    if open_windows and heating:
+        if handle_violation(open_windows, heating, detected_at=time.monotonic()):
+            return "VIOLATION"
+        return "OK"  # the event path's shutoff already covered it — counted there
     else:
         log("Safety check: OK (no window+heating violation)", "INFO")
 
@@ -1197,7 +2264,7 @@ def perform_safety_check():
         # Runs before stuck-idle: clearing a ghost temp may fix the idle state
         log("Checking for ghost external temperatures...")
         try:
-            check_ghost_external_temps()
+            timed_check("ghost_temp", check_ghost_external_temps)
         except Exception as e:
             log(f"Error during ghost temp check: {e}", "ERROR")
 
@@ -1205,7 +2272,7 @@ def perform_safety_check():
         # Only runs when no windows are open (window safety takes priority)
         log("Checking for stuck-idle thermostats...")
         try:
-            check_stuck_idle()
+            timed_check("stuck_idle", check_stuck_idle)
         except Exception as e:
             log(f"Error during stuck-idle check: {e}", "ERROR")
 
@@ -1213,7 +2280,7 @@ def perform_safety_check():
         # Detect degrading valve motors before they seize
         log("Checking valve voltages...")
         try:
-            check_valve_voltages()
+            timed_check("valve_voltage", check_valve_voltages)
         except Exception as e:
             log(f"Error during valve voltage check: {e}", "ERROR")
 
@@ -1221,13 +2288,432 @@ def perform_safety_check():
         # Catches setpoints < 10°C in heat mode (dropped set_temperature)
         log("Checking for anomalous setpoints...")
         try:
-            check_anomalous_setpoints()
+            timed_check("anomalous_setpoint", check_anomalous_setpoints)
         except Exception as e:
             log(f"Error during anomalous setpoint check: {e}", "ERROR")
 
         return "OK"
 
 
+# =============================================================================
+# EVENT-DRIVEN MODE (HA WebSocket API)
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  Poll-only worst case: CHECK_INTERVAL + DOOR_OPEN_DELAY = 7 minutes.   │
+# │                                                                         │
+# │  EVENT_MODE=1 adds a listener thread:                                   │
+# │    auth → subscribe_events(state_changed) → get_states (seed mirror)   │
+# │    → every contact / thermostat change re-evaluates the rule (<1s)     │
+# │                                                                         │
+# │  Doors: opening schedules a timer at last_changed + DOOR_OPEN_DELAY.   │
+# │  Closing cancels it (stale heap entries are ignored on pop).           │
+# │                                                                         │
+# │  ┌─ listener thread ──────────┐     ┌─ main thread ───────────────┐   │
+# │  │ state mirror + door timers │     │ poll loop (consistency      │   │
+# │  │ → handle_violation()       │     │ sweep) → handle_violation() │   │
+# │  └────────────┬───────────────┘     └──────────────┬──────────────┘   │
+# │               └──────── _violation_lock ───────────┘                  │
+# │                                                                         │
+# │  Stdlib-only WebSocket client (no extra deps in the container).       │
+# │  Any error → reconnect with backoff; polling never stops.             │
+# └─────────────────────────────────────────────────────────────────────────┘
+
+EVENT_ENTITIES = set(WINDOW_SENSORS) | set(DOOR_SENSORS) | set(THERMOSTATS)
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+event_violations_total = 0
+
+
+class HAWebSocket:
+    """Minimal RFC 6455 client for the Home Assistant WebSocket API (text frames only)."""
+
+    def __init__(self, base_url, token):
+        parsed = urllib.parse.urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.tls = parsed.scheme == "https"
+        self.token = token
+        self.sock = None
+        self._buf = bytearray()
+        self._next_id = 1
+
+    def connect(self, timeout=30):
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        # Kernel-level liveness too, so a half-open link also errors in blocking reads
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        if self.tls:
+            import ssl
+
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        key = base64.b64encode(os.urandom(16)).decode()
+        request = (
+            f"GET /api/websocket HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Upgrade: websocket\r\n"
+            f"Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            f"Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        sock.sendall(request.encode())
+        self.sock = sock
+
+        # Read handshake response headers
+        while b"\r\n\r\n" not in self._buf:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("WebSocket handshake: connection closed")
+            self._buf += chunk
+        header_end = self._buf.index(b"\r\n\r\n") + 4
+        headers = bytes(self._buf[:header_end]).decode(errors="replace")
+        del self._buf[:header_end]
+        if " 101 " not in headers.split("\r\n", 1)[0]:
+            raise ConnectionError(f"WebSocket handshake failed: {headers.splitlines()[0]}")
+        expected = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        if expected not in headers:
+            raise ConnectionError("WebSocket handshake: bad Sec-WebSocket-Accept")
+
+        # HA auth flow: auth_required → auth → auth_ok
+        msg = self.recv_json(timeout)
+        if not msg or msg.get("type") != "auth_required":
+            raise ConnectionError(f"Unexpected greeting: {msg}")
+        self.send_json({"type": "auth", "access_token": self.token})
+        msg = self.recv_json(timeout)
+        if not msg or msg.get("type") != "auth_ok":
+            raise ConnectionError(f"WebSocket auth failed: {msg}")
+
+    def close(self):
+        if self.sock:
+            try:
+                self._send_frame(0x8, b"")
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def command(self, payload):
+        """Send a command with an auto-assigned id. Returns the id."""
+        msg_id = self._next_id
+        self._next_id += 1
+        self.send_json(dict(payload, id=msg_id))
+        return msg_id
+
+    def send_json(self, obj):
+        self._send_frame(0x1, json.dumps(obj).encode())
+
+    def _send_frame(self, opcode, payload):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header += length.to_bytes(2, "big")
+        else:
+            header.append(0x80 | 127)
+            header += length.to_bytes(8, "big")
+        mask = os.urandom(4)
+        header += mask
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(bytes(header) + masked)
+
+    def _recv_exact(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(max(65536, n - len(self._buf)))
+            if not chunk:
+                raise ConnectionError("WebSocket closed by server")
+            self._buf += chunk
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def recv_json(self, timeout):
+        """Return the next JSON message, or None if nothing arrived within timeout."""
+        # TLS: records already decrypted into the SSL buffer don't make the socket readable
+        if not self._buf and not (self.tls and self.sock.pending()):
+            readable, _, _ = select.select([self.sock], [], [], timeout)
+            if not readable:
+                return None
+
+        message = bytearray()
+        while True:
+            b1, b2 = self._recv_exact(2)
+            fin, opcode = b1 & 0x80, b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                length = int.from_bytes(self._recv_exact(2), "big")
+            elif length == 127:
+                length = int.from_bytes(self._recv_exact(8), "big")
+            payload = self._recv_exact(length)  # server frames are never masked
+
+            if opcode == 0x8:
+                raise ConnectionError("WebSocket close frame received")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if fin:
+                return json.loads(bytes(message))
+
+
+class EventStateMirror:
+    """In-memory mirror of watched entities + door delay timers."""
+
+    def __init__(self):
+        self.states = {}  # {entity_id: state_dict}
+        self._timers = []  # heap of (due_monotonic, entity_id, last_changed)
+
+    def update(self, entity_id, state):
+        """Store new state. Returns True if the violation rule needs re-evaluation."""
+        old = self.states.get(entity_id)
+        if state is None:
+            self.states.pop(entity_id, None)
+            return old is not None
+        self.states[entity_id] = state
+
+        if entity_id in DOOR_SENSORS and state.get("state") == "on":
+            remaining = DOOR_OPEN_DELAY - get_seconds_in_current_state(state)
+            if remaining > 0:
+                heapq.heappush(
+                    self._timers,
+                    (time.monotonic() + remaining, entity_id, state.get("last_changed")),
+                )
+
+        if old is None:
+            return True
+        if entity_id in THERMOSTATS:
+            old_attrs, new_attrs = old.get("attributes", {}), state.get("attributes", {})
+            return old_attrs.get("hvac_action") != new_attrs.get("hvac_action")
+        return old.get("state") != state.get("state")
+
+    def next_timer_in(self):
+        """Seconds until the next door timer fires (None if no timers)."""
+        if not self._timers:
+            return None
+        return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def pop_due_timers(self):
+        """Pop expired door timers. Returns True if any is still valid.
+
+        A timer is stale when the door closed or re-opened since it was
+        scheduled (last_changed no longer matches) — that acts as cancel.
+        """
+        fired = False
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, entity_id, last_changed = heapq.heappop(self._timers)
+            state = self.states.get(entity_id, {})
+            if state.get("state") == "on" and state.get("last_changed") == last_changed:
+                fired = True
+        return fired
+
+    def evaluate(self):
+        """Apply the violation rule to the mirror. Returns (open_contacts, heating)."""
+        open_contacts = []
+        for sensor in WINDOW_SENSORS:
+            if self.states.get(sensor, {}).get("state") == "on":
+                open_contacts.append(CONTACT_NAMES.get(sensor, sensor))
+        for sensor in DOOR_SENSORS:
+            state = self.states.get(sensor, {})
+            if state.get("state") == "on" and get_seconds_in_current_state(state) >= DOOR_OPEN_DELAY:
+                open_contacts.append(CONTACT_NAMES.get(sensor, sensor))
+
+        heating = [
+            THERMOSTAT_NAMES.get(t, t)
+            for t in THERMOSTATS
+            if self.states.get(t, {}).get("attributes", {}).get("hvac_action") == "heating"
+        ]
+        return open_contacts, heating
+
+
+def _evaluate_event_mirror(mirror, trigger):
+    """Run the violation rule on the mirror and act on a violation."""
+    global event_violations_total
+    open_contacts, heating = mirror.evaluate()
+    if not (open_contacts and heating):
+        return
+
+    since_last = time.time() - _last_violation_action
+    if since_last < EVENT_VIOLATION_COOLDOWN:
+        log(
+            f"[event] Violation still reported {since_last:.0f}s after shutoff "
+            f"(< {EVENT_VIOLATION_COOLDOWN}s cooldown) — waiting for TRVs to report off",
+            "INFO",
+        )
+        return
+
+    detected_at = time.monotonic()
+    log(f"[event] Violation detected via {trigger}: open={open_contacts}, heating={heating}", "WARN")
+    thermostat_states = {t: mirror.states[t] for t in THERMOSTATS if t in mirror.states}
+    if not handle_violation(open_contacts, heating, thermostat_states, detected_at):
+        return  # the poll path's shutoff already covered it — counted there
+    event_violations_total += 1
+    metric_inc("watchdog_violations_total", (("source", "event"),))
+
+
+def _run_event_session(ws, mirror):
+    """Subscribe, seed the mirror and process events until the connection drops.
+
+    A half-open TCP link (network drop, HA killed) never delivers a close,
+    so after EVENT_PING_INTERVAL s of silence we send HA's {"type": "ping"};
+    no pong within EVENT_PONG_TIMEOUT → ConnectionError → reconnect.
+    """
+    subscribe_id = ws.command({"type": "subscribe_events", "event_type": "state_changed"})
+    seed_id = ws.command({"type": "get_states"})
+    last_received = time.monotonic()
+    ping_id, ping_sent = None, 0.0
+
+    while True:
+        timeout = mirror.next_timer_in()
+        msg = ws.recv_json(1.0 if timeout is None else min(timeout, 1.0))
+
+        now = time.monotonic()
+        if msg is None:
+            if ping_id is not None and now - ping_sent > EVENT_PONG_TIMEOUT:
+                raise ConnectionError(f"no pong from HA within {EVENT_PONG_TIMEOUT}s")
+            if ping_id is None and now - last_received >= EVENT_PING_INTERVAL:
+                ping_id, ping_sent = ws.command({"type": "ping"}), now
+        else:
+            last_received = now
+            msg_type = msg.get("type")
+            if msg_type == "pong" and msg.get("id") == ping_id:
+                ping_id = None
+            if msg_type == "result" and not msg.get("success", False):
+                raise ConnectionError(f"WebSocket command {msg.get('id')} failed: {msg.get('error')}")
+            if msg_type == "result" and msg.get("id") == seed_id:
+                for state in msg.get("result") or []:
+                    if state.get("entity_id") in EVENT_ENTITIES:
+                        mirror.update(state["entity_id"], state)
+                log(f"[event] State mirror seeded: {len(mirror.states)}/{len(EVENT_ENTITIES)} entities")
+                _evaluate_event_mirror(mirror, "initial state")
+            elif msg_type == "event" and msg.get("id") == subscribe_id:
+                data = msg.get("event", {}).get("data", {})
+                entity_id = data.get("entity_id")
+                if entity_id in EVENT_ENTITIES and mirror.update(entity_id, data.get("new_state")):
+                    _evaluate_event_mirror(mirror, entity_id)
+
+        if mirror.pop_due_timers():
+            _evaluate_event_mirror(mirror, "door delay timer")
+
+
+def run_event_listener():
+    """Listener thread: keep a WebSocket session alive, reconnecting with backoff."""
+    backoff = 5
+    while True:
+        ws = HAWebSocket(HA_URL, HA_TOKEN)
+        try:
+            ws.connect()
+            log("[event] Connected to HA WebSocket API — subscribed to state_changed")
+            backoff = 5
+            _run_event_session(ws, EventStateMirror())
+        except Exception as e:
+            log(f"[event] WebSocket listener error: {e} — reconnecting in {backoff}s (polling continues)", "WARN")
+        finally:
+            ws.close()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, EVENT_RECONNECT_MAX)
+
+
+def start_event_listener():
+    """Start the event listener in a daemon thread."""
+    thread = threading.Thread(target=run_event_listener, name="ha-event-listener", daemon=True)
+    thread.start()
+    return thread
+
+
+# =============================================================================
+# TRACKER PERSISTENCE (write-behind SQLite)
+# =============================================================================
+# ┌─────────────────────────────────────────────────────────────────────────┐
+# │  Container restart used to wipe every tracker:                         │
+# │    - stuck-idle 45-min timer restarted from zero                      │
+# │    - hourly rate limits forgotten → recovery / alert spam after crash  │
+# │                                                                         │
+# │  Now: one SQLite row per tracker (JSON), restored on startup.         │
+# │  persist_trackers() runs after every main-loop step but only compares │
+# │  in memory — the DB is written ONLY when a tracker actually changed.  │
+# │  Steady state (nothing stuck, no alerts) = zero disk I/O.             │
+# │                                                                         │
+# │  DB unavailable → log once, keep running in-memory (never fatal).     │
+# └─────────────────────────────────────────────────────────────────────────┘
+STATE_DB = os.environ.get("STATE_DB", "/data/heater-watchdog.db")
+
+PERSISTED_TRACKERS = {
+    "stuck_idle": stuck_idle_tracker,
+    "recovery": recovery_tracker,
+    "ghost_temp_clear": ghost_temp_clear_tracker,
+    "valve_voltage_alert": valve_voltage_alert_tracker,
+    "valve_forecast_alert": valve_forecast_alert_tracker,
+    "anomalous_setpoint": anomalous_setpoint_tracker,
+}
+
+_state_db = None
+_persisted_json = {}  # {tracker_name: last JSON written} — change detection
+
+
+def open_state_store():
+    """Open STATE_DB and restore all trackers. Returns True if persistence is active."""
+    global _state_db
+    try:
+        os.makedirs(os.path.dirname(STATE_DB) or ".", exist_ok=True)
+        # Default isolation: `with _state_db:` below is one transaction (commit/rollback)
+        _state_db = sqlite3.connect(STATE_DB)
+        _state_db.execute(
+            "CREATE TABLE IF NOT EXISTS trackers (name TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        rows = _state_db.execute("SELECT name, data FROM trackers").fetchall()
+    except (sqlite3.Error, OSError) as e:
+        log(f"State store unavailable ({STATE_DB}): {e} — trackers are in-memory only", "WARN")
+        _state_db = None
+        return False
+
+    for name, data in rows:
+        tracker = PERSISTED_TRACKERS.get(name)
+        if tracker is None:
+            continue
+        try:
+            tracker.clear()
+            tracker.update(json.loads(data))
+            _persisted_json[name] = data
+        except (ValueError, TypeError) as e:
+            log(f"  Ignoring corrupt tracker '{name}': {e}", "WARN")
+            continue
+        if tracker:
+            log(f"  Restored tracker '{name}': {len(tracker)} entities")
+    return True
+
+
+def persist_trackers():
+    """Write changed trackers to STATE_DB (no-op when nothing changed)."""
+    global _state_db
+    if _state_db is None:
+        return
+    changed = []
+    for name, tracker in PERSISTED_TRACKERS.items():
+        # Drop empty rate-limit lists so pruning alone doesn't look like a change
+        data = json.dumps({k: v for k, v in tracker.items() if v != []}, sort_keys=True)
+        if _persisted_json.get(name) != data:
+            changed.append((name, data))
+    if not changed:
+        return
+
+    try:
+        with _state_db:  # all changed trackers commit together, or none do
+            now = time.time()
+            _state_db.executemany(
+                "INSERT OR REPLACE INTO trackers (name, data, updated) VALUES (?, ?, ?)",
+                [(name, data, now) for name, data in changed],
+            )
+    except sqlite3.Error as e:
+        log(f"Failed to persist trackers: {e}", "WARN")
+        return
+    _persisted_json.update(changed)
+
+
 # =============================================================================
 # MAIN LOOP
 # =============================================================================
@@ -1259,16 +2745,30 @@ def test_ha_connection():
 
 def main():
     """Main entry point."""
+    global _last_successful_cycle
     log_banner()
     log("Configuration:")
     log(f"  HA_URL: {HA_URL}")
     log(f"  CHECK_INTERVAL: {CHECK_INTERVAL}s ({CHECK_INTERVAL // 60}min)")
+    if ADAPTIVE_INTERVAL:
+        log(f"  Adaptive interval: {CHECK_INTERVAL_FLOOR}s (contact open) .. {CHECK_INTERVAL_CEILING}s (all TRVs off)")
+        if not CHECK_INTERVAL_MIN <= CHECK_INTERVAL <= CHECK_INTERVAL_MAX:
+            log(f"  CHECK_INTERVAL={CHECK_INTERVAL}s is outside CHECK_INTERVAL_MIN/MAX "
+                f"({CHECK_INTERVAL_MIN}s..{CHECK_INTERVAL_MAX}s) — bounds widened to include it", "WARN")
     log(f"  DOOR_OPEN_DELAY: {DOOR_OPEN_DELAY}s ({DOOR_OPEN_DELAY // 60}min)")
     log(f"  NOTIFY_SERVICE: {NOTIFY_SERVICE}")
     log(f"  Monitoring {len(WINDOW_SENSORS)} window sensors (immediate response)")
     log(f"  Monitoring {len(DOOR_SENSORS)} door sensors ({DOOR_OPEN_DELAY}s delay)")
     log(f"  Monitoring {len(THERMOSTATS)} thermostats")
-    log(f"  Worst-case response time for doors: {CHECK_INTERVAL + DOOR_OPEN_DELAY}s ({(CHECK_INTERVAL + DOOR_OPEN_DELAY) // 60}min)")
+    if EVENT_MODE:
+        log(f"  EVENT_MODE: on (WebSocket state_changed, poll loop = consistency sweep)")
+        log(f"  Worst-case response time for doors: ~{DOOR_OPEN_DELAY}s (event timer)")
+    elif ADAPTIVE_INTERVAL:
+        # Door open → next check at the floor; door may also open right after an idle-ceiling check
+        log(f"  Worst-case response time for doors: {CHECK_INTERVAL_CEILING + DOOR_OPEN_DELAY}s (all-off back-off), "
+            f"{max(CHECK_INTERVAL // 2, CHECK_INTERVAL_FLOOR) + DOOR_OPEN_DELAY + CHECK_INTERVAL_FLOOR}s while heating")
+    else:
+        log(f"  Worst-case response time for doors: {CHECK_INTERVAL + DOOR_OPEN_DELAY}s ({(CHECK_INTERVAL + DOOR_OPEN_DELAY) // 60}min)")
     log(f"  Stuck-idle normal: {STUCK_IDLE_THRESHOLD // 60}min (entry: deficit >= {STUCK_IDLE_DEFICIT}°C, recovery: time-only)")
     log(f"  Stuck-idle urgent: {STUCK_IDLE_URGENT_THRESHOLD // 60}min (entry: deficit >= {STUCK_IDLE_DEFICIT}°C, recovery: deficit >= {STUCK_IDLE_URGENT_DEFICIT}°C)")
     log(f"  Stuck-idle max recoveries/hour: {STUCK_IDLE_MAX_RECOVERIES}")
@@ -1288,6 +2788,16 @@ def main():
             log("Failed to connect after retry. Exiting.", "ERROR")
             return 1
 
+    if open_state_store():
+        log(f"Tracker persistence: {STATE_DB}")
+    log(f"Valve voltage history: {load_valve_history()} samples ({VALVE_HISTORY_DIR})")
+
+    if EVENT_MODE:
+        start_event_listener()
+
+    if start_metrics_server():
+        log(f"Metrics: http://0.0.0.0:{METRICS_PORT}/metrics")
+
     log("")
     log("Starting safety monitoring loop...")
     log("=" * 60)
@@ -1297,29 +2807,56 @@ def main():
     violations_total = 0
     errors_total = 0
     start_time = datetime.now()
+    last_stats = time.monotonic()
+
+    next_check = time.monotonic()
 
     while True:
+        # Recovery steps run between checks (non-blocking state machine)
+        advance_recoveries()
+        persist_trackers()
+
+        if time.monotonic() < next_check:
+            wake_at = next_check
+            recovery_due = next_recovery_due()
+            if recovery_due is not None:
+                wake_at = min(wake_at, recovery_due)
+            time.sleep(max(0.0, wake_at - time.monotonic()))
+            continue
+
+        cycle_start = time.monotonic()
         try:
             result = perform_safety_check()
             checks_total += 1
+            _last_successful_cycle = time.time()
+            metric_inc("watchdog_checks_total", (("result", result.lower()),))
             if result == "VIOLATION":
                 violations_total += 1
+                metric_inc("watchdog_violations_total", (("source", "poll"),))
         except Exception as e:
             log(f"Error during safety check: {e}", "ERROR")
             errors_total += 1
+            metric_inc("watchdog_checks_total", (("result", "error"),))
+        metric_observe("watchdog_cycle_duration_seconds", time.monotonic() - cycle_start)
+
+        # Interval picked by perform_safety_check() from this cycle's snapshot
+        next_check = cycle_start + _current_interval
 
-        # Print stats every 12 checks (1 hour at 5min interval)
-        if checks_total % 12 == 0:
+        # Print stats every hour (check count varies with the adaptive interval)
+        if time.monotonic() - last_stats >= 3600:
+            last_stats = time.monotonic()
             uptime = datetime.now() - start_time
             log("-" * 60)
             log(
                 f"Stats: {checks_total} checks | {violations_total} violations | {errors_total} errors"
             )
+            if EVENT_MODE:
+                log(f"Event-driven violations: {event_violations_total}")
+            for line in ha_stats_lines():
+                log(line)
             log(f"Uptime: {uptime}")
             log("-" * 60)
 
-        time.sleep(CHECK_INTERVAL)
-
 
 if __name__ == "__main__":
     exit(main() or 0)
@@ -0,0 +1,226 @@
+"""Scenario replay benchmark for heater-watchdog.
+
+Runs the real watchdog code against fake-ha.py on a simulated clock, so
+days of watchdog time replay in seconds. For every scenario it reports:
+
+    - cycle latency   real ms per perform_safety_check (p50 / p95 / max)
+                      + simulated seconds (includes injected HA latency)
+    - HA calls/cycle  requests the fake HA received per check (avg / max)
+    - reaction time   sim seconds from the scenario trigger until the
+                      expected outcome ("reaction" block in the scenario)
+
+Usage:
+    python replay-bench.py                          # all scenarios/*.json
+    python replay-bench.py scenarios/trv-stuck-idle.json -v
+    python replay-bench.py --json > results.json    # machine-readable
+
+Exit code 1 if any scenario misses its "reaction.max" or "max_calls_per_cycle"
+budget — run before deploying watchdog changes.
+"""
+
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+fake_ha = _load("fake_ha", "fake-ha.py")
+
+
+class SimTime:
+    """Stand-in for the watchdog's `time` module, driven by a SimClock."""
+
+    def __init__(self, clock):
+        self._clock = clock
+
+    def time(self):
+        return self._clock.now()
+
+    def monotonic(self):
+        return self._clock.elapsed()
+
+    def sleep(self, seconds):
+        self._clock.advance(seconds)
+
+
+def make_sim_datetime(clock):
+    """datetime subclass whose now() follows the SimClock."""
+
+    class SimDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock.now(), tz=tz or timezone.utc)
+
+    return SimDatetime
+
+
+def reaction_reached(fake, until):
+    """Evaluate a scenario's "until" condition against fake HA state."""
+    watchdog = fake_ha.watchdog
+    with fake.lock:
+        if until == "all_off":
+            return all(fake.states[t]["state"] == "off" for t in watchdog.THERMOSTATS)
+        if until == "notification":
+            return bool(fake.notifications())
+        if until.startswith("heating:"):
+            entity_id = until.split(":", 1)[1]
+            return fake.states[entity_id]["attributes"].get("hvac_action") == "heating"
+    raise ValueError(f"Unknown reaction condition: {until}")
+
+
+def run_scenario(path, verbose=False):
+    scenario = fake_ha.load_scenario(path)
+    clock = fake_ha.SimClock(manual=True)
+    fake = fake_ha.FakeHA(scenario, clock)
+    server = fake_ha.start_server(fake)
+
+    # Fresh watchdog module per scenario: trackers, pool and snapshot start clean
+    os.environ["HA_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["HA_TOKEN"] = "fake"
+    watchdog = _load("heater_watchdog_replay", "heater-watchdog.py")
+    watchdog.time = SimTime(clock)
+    watchdog.datetime = make_sim_datetime(clock)
+    if not verbose:
+        watchdog.log = lambda msg, level="INFO": None
+
+    duration = scenario.get("duration", 3600)
+    if "check_interval" in scenario:
+        watchdog.CHECK_INTERVAL = scenario["check_interval"]
+    if "adaptive_interval" in scenario:
+        watchdog.ADAPTIVE_INTERVAL = scenario["adaptive_interval"]
+    watchdog._current_interval = watchdog.CHECK_INTERVAL
+    reaction = scenario.get("reaction")
+
+    cycle_real_ms, cycle_sim_s, calls_per_cycle = [], [], []
+    results = {"OK": 0, "VIOLATION": 0, "ERROR": 0}
+    reaction_time = None
+    next_check = 0.0
+    wall_start = time.perf_counter()
+
+    # Same scheduling as main(): checks every interval, recovery steps in between
+    while clock.elapsed() < duration:
+        fake.tick()
+        watchdog.advance_recoveries()
+
+        if clock.elapsed() >= next_check:
+            calls_before = fake.request_count
+            sim_start = clock.elapsed()
+            real_start = time.perf_counter()
+            try:
+                results[watchdog.perform_safety_check()] += 1
+            except Exception:
+                results["ERROR"] += 1
+            cycle_real_ms.append((time.perf_counter() - real_start) * 1000)
+            next_check = sim_start + watchdog._current_interval
+            cycle_sim_s.append(clock.elapsed() - sim_start)
+            calls_per_cycle.append(fake.request_count - calls_before)
+
+        if reaction and reaction_time is None and clock.elapsed() >= reaction["from"]:
+            if reaction_reached(fake, reaction["until"]):
+                reaction_time = clock.elapsed() - reaction["from"]
+
+        wake_at = next_check
+        for due in (watchdog.next_recovery_due(), fake.next_event_at()):
+            if due is not None and due > clock.elapsed():
+                wake_at = min(wake_at, due)
+        clock.advance_to(min(wake_at, duration))
+
+    wall = time.perf_counter() - wall_start
+    server.shutdown()
+    server.server_close()
+
+    def pct(values, q):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    report = {
+        "scenario": scenario.get("name", os.path.basename(path)),
+        "sim_seconds": duration,
+        "wall_seconds": round(wall, 3),
+        "speedup": round(duration / wall) if wall else None,
+        "cycles": len(cycle_real_ms),
+        "results": results,
+        "cycle_ms": {
+            "p50": round(pct(cycle_real_ms, 0.50), 2),
+            "p95": round(pct(cycle_real_ms, 0.95), 2),
+            "max": round(max(cycle_real_ms, default=0), 2),
+        },
+        "cycle_sim_s_max": round(max(cycle_sim_s, default=0), 1),
+        "calls_per_cycle": {
+            "avg": round(statistics.mean(calls_per_cycle), 1) if calls_per_cycle else 0,
+            "max": max(calls_per_cycle, default=0),
+        },
+        "reaction_s": None if reaction_time is None else round(reaction_time, 1),
+        "notifications": len(fake.notifications()),
+        "failures": [],
+    }
+
+    if reaction:
+        if reaction_time is None:
+            report["failures"].append(f"no reaction ({reaction['until']}) within scenario")
+        elif "max" in reaction and reaction_time > reaction["max"]:
+            report["failures"].append(f"reaction {reaction_time:.0f}s > budget {reaction['max']}s")
+    budget = scenario.get("max_calls_per_cycle")
+    if budget is not None and report["calls_per_cycle"]["max"] > budget:
+        report["failures"].append(
+            f"{report['calls_per_cycle']['max']} HA calls in one cycle > budget {budget}"
+        )
+    return report
+
+
+def print_report(report):
+    status = "PASS" if not report["failures"] else "FAIL"
+    reaction = "-" if report["reaction_s"] is None else f"{report['reaction_s']:.0f}s"
+    print(f"[{status}] {report['scenario']}")
+    print(
+        f"    {report['sim_seconds'] / 3600:.1f}h sim in {report['wall_seconds']:.2f}s "
+        f"({report['speedup']}x) | {report['cycles']} cycles | results {report['results']}"
+    )
+    print(
+        f"    cycle: p50 {report['cycle_ms']['p50']}ms, p95 {report['cycle_ms']['p95']}ms, "
+        f"max {report['cycle_ms']['max']}ms (sim max {report['cycle_sim_s_max']}s)"
+    )
+    print(
+        f"    HA calls/cycle: avg {report['calls_per_cycle']['avg']}, max {report['calls_per_cycle']['max']} "
+        f"| reaction: {reaction} | notifications: {report['notifications']}"
+    )
+    for failure in report["failures"]:
+        print(f"    ✗ {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay heater-watchdog scenarios against fake HA")
+    parser.add_argument("scenarios", nargs="*", help="Scenario files (default: scenarios/*.json)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show watchdog log output")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    paths = args.scenarios or sorted(glob.glob(os.path.join(HERE, "scenarios", "*.json")))
+    reports = [run_scenario(path, args.verbose) for path in paths]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+    return 1 if any(r["failures"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,10 @@
 # - The scraper writes a timestamp to /tmp/scraper-last-activity on each request
 # - This script checks that timestamp and stops the container if too old
 # - Runs every 5 minutes via systemd timer
+# - Prefetch windows (PREFETCH_SCHEDULE in docker-compose.yml): the scraper
+#   publishes its next window to /tmp/scraper-prefetch-window ("start end"
+#   epoch); a stopped container is started once that window opens, and the
+#   scraper stamps the window END as activity (runs until 30 min after it)
 #
 # Integration:
 # - scraper.py calls update_activity() on each /api/transport request
@@ -18,6 +22,7 @@
 set -euo pipefail
 
 ACTIVITY_FILE="/tmp/scraper-last-activity"
+PREFETCH_FILE="/tmp/scraper-prefetch-window"
 INACTIVITY_THRESHOLD=1800  # 30 minutes in seconds
 CONTAINER_NAME="data-scraper"
 
@@ -27,6 +32,15 @@ log() {
 
 # Check if container is running
 if ! docker ps --format '{{.Names}}' | grep -q "^${CONTAINER_NAME}$"; then
+    if [[ -f "$PREFETCH_FILE" ]]; then
+        read -r WINDOW_START WINDOW_END < "$PREFETCH_FILE" || true
+        NOW=$(date +%s)
+        if [[ -n "${WINDOW_END:-}" && $NOW -ge ${WINDOW_START:-0} && $NOW -lt $WINDOW_END ]]; then
+            log "Prefetch window open - starting container"
+            docker start "$CONTAINER_NAME" || true
+            exit 0
+        fi
+    fi
     log "Container not running, nothing to do"
     exit 0
 fi
@@ -47,6 +61,11 @@ LAST_ACTIVITY_INT=${LAST_ACTIVITY%.*}
 # Calculate idle time
 IDLE_TIME=$((NOW - LAST_ACTIVITY_INT))
 
+if [[ $IDLE_TIME -lt 0 ]]; then
+    log "Prefetch window holds container for another $((-IDLE_TIME))s"
+    exit 0
+fi
+
 log "Last activity: ${IDLE_TIME}s ago (threshold: ${INACTIVITY_THRESHOLD}s)"
 
 if [[ $IDLE_TIME -gt $INACTIVITY_THRESHOLD ]]; then